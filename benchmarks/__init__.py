@@ -0,0 +1,3 @@
+"""
+Outils de benchmark et de test de charge du chatbot
+"""
@@ -0,0 +1,62 @@
+"""
+Débit et exactitude du backend d'analyse local (LexiconAnalysisBackend), entraîné
+sur le jeu étiqueté benchmarks/fixtures/labelled_messages.jsonl.
+
+Usage :
+    python benchmarks/bench_analysis_backend.py --messages 20000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.utils import setup_django  # noqa: E402
+
+FIXTURE = Path(__file__).resolve().parent / "fixtures" / "labelled_messages.jsonl"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+
+    setup_django()
+    from chatbot.analysis_backends import LexiconAnalysisBackend, train_model
+
+    with open(FIXTURE, encoding="utf-8") as fixture:
+        examples = [json.loads(line) for line in fixture]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "model.json"
+        path.write_text(json.dumps(train_model(examples), separators=(",", ":")), encoding="utf-8")
+        start = time.perf_counter()
+        backend = LexiconAnalysisBackend(path)
+        load_ms = (time.perf_counter() - start) * 1000
+        size = path.stat().st_size
+
+    scope_correct = sum(backend.analyze(e["message"])["scopeflag"] == e["scopeflag"] for e in examples)
+    word_hits = sum(
+        len({w.lower() for w in backend.analyze(e["message"])["violent_words"]} & {w.lower() for w in e["violent_words"]})
+        for e in examples
+    )
+    word_total = sum(len(e["violent_words"]) for e in examples)
+
+    messages = [examples[i % len(examples)]["message"] for i in range(args.messages)]
+    start = time.perf_counter()
+    for message in messages:
+        backend.analyze(message)
+    elapsed = time.perf_counter() - start
+
+    print(f"modèle : {size} octets, chargé en {load_ms:.1f}ms")
+    print(f"scopeflag : {scope_correct}/{len(examples)} corrects (données d'entraînement)")
+    print(f"mots violents retrouvés : {word_hits}/{word_total}")
+    print(f"débit : {len(messages) / elapsed:,.0f} messages/s")
+
+
+if __name__ == "__main__":
+    main()
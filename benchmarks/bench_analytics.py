@@ -0,0 +1,107 @@
+"""
+Mesure l'entrepôt analytique pseudonymisé (chatbot/analytics.py) : débit de
+l'export puis temps des agrégats (occurrences par employé, mots les plus
+fréquents, distribution des ratios, cooccurrence des thématiques) lus dans les
+colonnes, comparés aux mêmes agrégats calculés par l'ORM sur les tables.
+
+Usage :
+    python benchmarks/bench_analytics.py --rows 1000000 --employees 10000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.utils import setup_django, temporary_database  # noqa: E402
+
+WORDS = ["colère", "rage", "frapper", "détruire", "haine", "menace", "crier", "violence", "humilier", "insulter"]
+
+
+def timed_ms(function, repeat: int = 3):
+    """Meilleur temps de plusieurs exécutions, en millisecondes, et le dernier résultat"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--employees", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--themes-per-employee", type=int, default=4)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db.models import Count
+    from django.utils import timezone
+    from chatbot import analytics
+    from chatbot.models import Employee, EmployeeThemeCounter, PsychologicalTheme, ViolentWord
+
+    with temporary_database(), tempfile.TemporaryDirectory() as directory:
+        rng = random.Random(0)
+        Employee.objects.bulk_create((
+            Employee(first_name=f"Prénom{i}", last_name=f"Nom{i}", birth_date="1990-01-01",
+                     total_words_count=rng.randint(100, 5000), violent_words_count=rng.randint(0, 100))
+            for i in range(args.employees)
+        ), batch_size=5000)
+        employee_ids = list(Employee.objects.values_list("id", flat=True))
+        theme_ids = list(PsychologicalTheme.objects.values_list("id", flat=True))
+        EmployeeThemeCounter.objects.bulk_create((
+            EmployeeThemeCounter(employee_id=employee_id, theme_id=theme_id, count=rng.randint(1, 20))
+            for employee_id in employee_ids
+            for theme_id in rng.sample(theme_ids, rng.randint(0, args.themes_per_employee))
+        ), batch_size=5000)
+        now = timezone.now()
+        step = timedelta(days=args.days) / args.rows
+        for offset in range(0, args.rows, 50000):
+            ViolentWord.objects.bulk_create([
+                ViolentWord(employee_id=rng.choice(employee_ids), word=rng.choice(WORDS),
+                            timestamp=now - timedelta(days=args.days) + step * index)
+                for index in range(offset, min(offset + 50000, args.rows))
+            ], batch_size=5000)
+        print(f"{args.rows} mots violents, {args.employees} employés, "
+              f"{EmployeeThemeCounter.objects.count()} compteurs de thématiques")
+
+        start = time.perf_counter()
+        summary = analytics.export_analytics(directory, pseudonym_key="benchmark")
+        elapsed = time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names)
+        print(f"export : {summary['events']} occurrences en {elapsed:.1f}s "
+              f"({summary['events'] / elapsed:,.0f}/s), {summary['files']} fichiers, {size / 1e6:.1f} Mo")
+
+        store = analytics.AnalyticsStore(directory)
+        queries = {
+            "occurrences par employé": (
+                store.violent_words_by_employee,
+                lambda: dict(ViolentWord.objects.values_list("employee_id").annotate(n=Count("id"))),
+            ),
+            "mots les plus fréquents": (
+                store.word_frequencies,
+                lambda: list(ViolentWord.objects.values_list("word").annotate(n=Count("id")).order_by("-n")[:20]),
+            ),
+            "distribution des ratios": (
+                store.ratio_distribution,
+                lambda: [employee.violent_words_ratio for employee in Employee.objects.all()],
+            ),
+            "cooccurrence des thématiques": (store.theme_cooccurrence, None),
+        }
+        for name, (columnar, orm) in queries.items():
+            columnar_ms, _ = timed_ms(columnar)
+            line = f"{name:<30} colonnes={columnar_ms:8.1f}ms"
+            if orm is not None:
+                orm_ms, _ = timed_ms(orm)
+                line += f"  ORM={orm_ms:8.1f}ms  gain=x{orm_ms / columnar_ms:.1f}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
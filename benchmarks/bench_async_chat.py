@@ -0,0 +1,79 @@
+"""
+Compare le débit de analyze_message (synchrone, pool de workers WSGI) et de
+analyze_message_async (une seule boucle d'événements ASGI) face à un serveur
+OpenAI factice dont la latence simule l'aller-retour du modèle.
+
+Usage :
+    python benchmarks/bench_async_chat.py --requests 200 --latency 0.5 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_openai import FakeOpenAIServer  # noqa: E402
+from benchmarks.utils import setup_django, summarize_latencies  # noqa: E402
+
+MESSAGE = "Je ressens beaucoup de stress au travail à cause de mon manager."
+
+
+def run_sync(services, requests: int, workers: int):
+    def one(_):
+        start = time.perf_counter()
+        services.analyze_message(MESSAGE)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        latencies = list(pool.map(one, range(requests)))
+    return time.perf_counter() - start, latencies
+
+
+def run_async(services, requests: int):
+    async def one():
+        start = time.perf_counter()
+        await services.analyze_message_async(MESSAGE)
+        return time.perf_counter() - start
+
+    async def main():
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one() for _ in range(requests)))
+        return time.perf_counter() - start, latencies
+
+    return asyncio.run(main())
+
+
+def report(label: str, elapsed: float, latencies, requests: int) -> None:
+    stats = summarize_latencies(latencies)
+    print(
+        f"{label:<28} {requests / elapsed:8.1f} req/s  "
+        f"p50={stats['p50_ms']:.0f}ms p95={stats['p95_ms']:.0f}ms p99={stats['p99_ms']:.0f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.5, help="Latence simulée du modèle (s)")
+    parser.add_argument("--workers", type=int, default=4, help="Taille du pool de workers synchrones")
+    args = parser.parse_args()
+
+    with FakeOpenAIServer(latency=args.latency) as server:
+        setup_django(server.base_url)
+        import logging
+        logging.disable(logging.CRITICAL)
+        from chatbot import services
+
+        elapsed, latencies = run_sync(services, args.requests, args.workers)
+        report(f"sync ({args.workers} workers)", elapsed, latencies, args.requests)
+
+        elapsed, latencies = run_async(services, args.requests)
+        report("async (1 event loop)", elapsed, latencies, args.requests)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Mesure la taille de l'historique envoyé au modèle et le temps de construction du
+contexte au fil d'une longue conversation, face à un serveur OpenAI factice, en
+comparaison de l'historique complet (tous les messages renvoyés).
+
+Usage :
+    python benchmarks/bench_conversation.py --turns 300
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_openai import FakeOpenAIServer  # noqa: E402
+from benchmarks.utils import setup_django, temporary_database  # noqa: E402
+
+MESSAGE = "Mon collègue m'ignore en réunion depuis que j'ai pris le projet, et je ne sais plus comment réagir (tour {})."
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=300)
+    args = parser.parse_args()
+
+    with FakeOpenAIServer() as server:
+        setup_django(server.base_url)
+        import logging
+        logging.disable(logging.CRITICAL)
+        from asgiref.sync import sync_to_async
+        from chatbot import conversations, services
+
+        def history_tokens(payload):
+            # Messages entre le prompt système et le message de l'utilisateur
+            return sum(conversations.estimate_tokens(item["content"]) + conversations.MESSAGE_OVERHEAD
+                       for item in payload["messages"][1:-1])
+
+        async def run(conversation_id):
+            naive = 0
+            checkpoints = {1, 10, 50, 100} | {args.turns}
+            for turn in range(1, args.turns + 1):
+                start = time.perf_counter()
+                await sync_to_async(conversations.build_context)(conversation_id)
+                build_ms = (time.perf_counter() - start) * 1000
+
+                message = MESSAGE.format(turn)
+                await services.analyze_message_async(message, conversation_id=conversation_id)
+                analysis_payload = next(
+                    payload for payload in reversed(server.payloads)
+                    if payload["messages"][-1]["content"] == message
+                )
+                if turn in checkpoints:
+                    print(f"turn {turn:5d}  history sent {history_tokens(analysis_payload):5d} tokens  "
+                          f"(full history {naive:7d})  context built in {build_ms:5.2f}ms")
+                naive += conversations.estimate_tokens(message) + conversations.estimate_tokens(server.text_content)
+                naive += 2 * conversations.MESSAGE_OVERHEAD
+
+        with temporary_database():
+            conversation_id = conversations.start_conversation()
+            start = time.perf_counter()
+            asyncio.run(run(conversation_id))
+            print(f"{args.turns} turns in {time.perf_counter() - start:.1f}s, {server.request_count} model calls")
+
+
+if __name__ == "__main__":
+    main()
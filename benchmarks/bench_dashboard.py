@@ -0,0 +1,118 @@
+"""
+Mesure la latence du tableau de bord de l'organisation (/dashboard.json et
+/dashboard/) dans une base SQLite peuplée de milliers d'employés, de millions de
+mots violents et d'un an d'agrégats, cache vide (premier appel après une écriture
+de statistiques) puis cache chaud. Le script échoue (code 1) si une latence p95
+dépasse le budget.
+
+Usage :
+    python benchmarks/bench_dashboard.py --employees 10000 --words 10000000 --budget-ms 100
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.utils import setup_django, summarize_latencies, temporary_database  # noqa: E402
+
+
+def seed(connection, employees: int, words: int, days: int) -> None:
+    """Insère employés, mots violents, compteurs de thématiques et agrégats de l'organisation en SQL"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "WITH RECURSIVE seq(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM seq LIMIT %s) "
+            "INSERT INTO chatbot_employee (first_name, last_name, birth_date, created_at, updated_at, "
+            "total_words_count, violent_words_count) "
+            "SELECT 'Prénom ' || x, 'Nom ' || x, '1990-01-01', datetime('now'), datetime('now'), "
+            "%s / %s, (%s / %s) / 50 FROM seq",
+            [employees, words * 50, employees, words * 50, employees]
+        )
+        cursor.execute(
+            "WITH RECURSIVE seq(x) AS (SELECT 0 UNION ALL SELECT x + 1 FROM seq LIMIT %s) "
+            "INSERT INTO chatbot_violentword (employee_id, word, timestamp) "
+            "SELECT (x %% %s) + 1, 'mot ' || (x %% 50), "
+            "datetime('now', '-' || (x %% (%s * 1440)) || ' minutes') FROM seq",
+            [words, employees, days]
+        )
+        cursor.execute(
+            "INSERT INTO chatbot_employeethemecounter (employee_id, theme_id, count) "
+            "SELECT e.id, t.id, (e.id + t.id) % 7 FROM chatbot_employee e CROSS JOIN chatbot_psychologicaltheme t"
+        )
+        # Un agrégat par jour et par semaine sur la période, pour l'organisation et chaque thématique
+        cursor.execute(
+            "WITH RECURSIVE seq(x) AS (SELECT 0 UNION ALL SELECT x + 1 FROM seq LIMIT %s) "
+            "INSERT INTO chatbot_organisationstatsrollup (period, period_start, messages_count, "
+            "total_words_count, violent_words_count) "
+            "SELECT 'day', date('now', '-' || x || ' days'), 1000 + x, 50000 + x, 1000 + x %% 97 FROM seq "
+            "UNION ALL SELECT 'week', date('now', '-' || (x * 7) || ' days', 'weekday 1', '-7 days'), "
+            "7000, 350000, 7000 FROM seq WHERE x * 7 < %s",
+            [days, days]
+        )
+        cursor.execute(
+            "INSERT INTO chatbot_organisationthemerollup (theme_id, period, period_start, count) "
+            "SELECT t.id, r.period, r.period_start, (t.id * 13 + r.id) % 200 "
+            "FROM chatbot_psychologicaltheme t CROSS JOIN chatbot_organisationstatsrollup r"
+        )
+
+
+def measure(run, repeats: int, before=None):
+    latencies = []
+    for _ in range(repeats):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        response = run()
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+    return summarize_latencies(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--employees", type=int, default=10_000)
+    parser.add_argument("--words", type=int, default=10_000_000, help="Nombre de mots violents")
+    parser.add_argument("--days", type=int, default=365, help="Jours d'historique")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=100.0, help="Latence p95 maximale")
+    args = parser.parse_args()
+
+    setup_django()
+    import logging
+    logging.disable(logging.CRITICAL)
+    from django.test import Client
+    from chatbot.dashboard import invalidate_dashboard
+    from chatbot.themes import initialize_themes
+
+    with temporary_database() as connection:
+        start = time.perf_counter()
+        initialize_themes()
+        seed(connection, args.employees, args.words, args.days)
+        print(f"Seeded {args.employees} employees and {args.words} violent words in {time.perf_counter() - start:.1f}s")
+
+        client = Client()
+        year_ago = (date.today() - timedelta(weeks=52)).isoformat()
+        scenarios = [
+            ("dashboard.json 12 weeks", lambda: client.get("/dashboard.json")),
+            ("dashboard.json 12 weeks/day", lambda: client.get("/dashboard.json", {"period": "day"})),
+            ("dashboard.json 52 weeks", lambda: client.get("/dashboard.json", {"start": year_ago})),
+            ("dashboard page", lambda: client.get("/dashboard/")),
+        ]
+
+        failures = 0
+        print(f"{'scenario':<26}{'cache':>6}{'p50':>10}{'p95':>10}")
+        for label, run in scenarios:
+            for cache_state, before in (("cold", invalidate_dashboard), ("warm", None)):
+                summary = measure(run, args.repeats, before)
+                over = summary["p95_ms"] > args.budget_ms
+                failures += over
+                print(f"{label:<26}{cache_state:>6}{summary['p50_ms']:9.1f}ms{summary['p95_ms']:9.1f}ms"
+                      f"{'  OVER BUDGET' if over else ''}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Mesure la part des messages traités localement par classify_locally et compare
+leur latence à celle des messages transmis au serveur OpenAI factice.
+
+Usage :
+    python benchmarks/bench_fast_path.py --latency 0.3 --repeat 5
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_openai import FakeOpenAIServer  # noqa: E402
+from benchmarks.utils import setup_django, summarize_latencies  # noqa: E402
+
+# Échantillon représentatif du trafic : beaucoup de formules courtes
+MESSAGES = [
+    "Bonjour", "bonjour !", "Merci", "merci beaucoup", "Au revoir", "Bonne journée",
+    "Je suis harcelé par mon collègue", "Je suis stressé", "Il y a du racisme dans mon équipe",
+    "Je ne suis pas stressé mais fatigué", "Comment gérer une réunion difficile avec mon manager ?",
+    "Mon manager me met la pression depuis des semaines et je n'arrive plus à dormir, que faire ?",
+    "J'ai un conflit avec un collègue sur un projet et l'ambiance devient pesante.",
+    "Salut", "ok merci", "Pouvez-vous m'aider à préparer mon entretien d'évaluation ?",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.3, help="Latence simulée du modèle (s)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with FakeOpenAIServer(latency=args.latency) as server:
+        setup_django(server.base_url)
+        import logging
+        logging.disable(logging.CRITICAL)
+        from chatbot import services
+
+        latencies = {"local": [], "llm": []}
+        for _ in range(args.repeat):
+            for message in MESSAGES:
+                start = time.perf_counter()
+                result = services.analyze_message(message, use_cache=False)
+                elapsed = time.perf_counter() - start
+                latencies["llm" if result["route"] == "llm" else "local"].append(elapsed)
+
+        stats = services.get_route_stats()
+        print(f"messages : {stats['total']}  part locale : {stats['local_share']:.0%}  routes : {stats['routes']}")
+        for route, values in latencies.items():
+            if values:
+                summary = summarize_latencies(values)
+                print(f"{route:<6} p50={summary['p50_ms']:.3f}ms p95={summary['p95_ms']:.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Microbenchmark de la détection de mots-clés : l'ancien enchaînement de recherches
+`term in message` (sujets sensibles, signaux de détresse, thématiques) comparé au
+parcours unique de services.scan_message (automate et index des thématiques).
+
+Usage :
+    python benchmarks/bench_keywords.py --words 2000 --extra-themes 200
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.utils import setup_django  # noqa: E402
+
+THEMES = [
+    "Harcèlement", "Dépression", "Burnout", "Stress", "Anxiété", "Conflit", "Discrimination",
+    "Surcharge", "Pression", "Isolement", "Intimidation", "Épuisement", "Mobbing", "Violence",
+    "Maltraitance",
+]
+
+VOCABULARY = (
+    "je suis très fatigué par la situation avec mon manager et les réunions interminables "
+    "cela crée une ambiance lourde dans mon équipe et je ressens du stress le soir quand "
+    "je rentre chez moi sans pouvoir penser à autre chose que ce projet"
+).split()
+
+
+def legacy_scan(services, message: str, themes):
+    """Reproduction de l'ancienne détection, une recherche par terme et par liste"""
+    message_lower = message.lower()
+    results = {
+        "contains_racism": any(term in message_lower for term in ["racisme", "raciste", "discrimination raciale"]),
+        "contains_harassment": any(term in message_lower for term in ["harcèlement", "harcelé", "harceler"]),
+        "contains_discrimination": any(term in message_lower for term in ["discrimination", "discriminé", "discriminer"]),
+        "contains_stress": any(term in message_lower for term in ["stress", "anxiété", "pression", "burnout", "épuisement"]),
+        "contains_conflict": any(term in message_lower for term in ["conflit", "tension", "dispute", "désaccord"])
+    }
+    results["contains_any_sensitive"] = any(term in message_lower for term in services.SENSITIVE_WORKPLACE_TOPICS)
+    results["contains_workplace_context"] = any(keyword in message_lower for keyword in services.WORKPLACE_KEYWORDS)
+    # analyze_message recalculait les signaux deux fois (résultat principal et secours)
+    signals = [signal for signal in services.DISTRESS_SIGNALS if signal.lower() in message.lower()]
+    signals = [signal for signal in services.DISTRESS_SIGNALS if signal.lower() in message.lower()]
+    detected = [name for theme_id, name in themes if name.lower() in message_lower]
+    return results, signals, detected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, default=2000, help="Longueur du message long (en mots)")
+    parser.add_argument("--extra-themes", type=int, default=0, help="Thématiques supplémentaires synthétiques")
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+    from chatbot import services
+    from chatbot.theme_index import ThemeIndex
+
+    themes = list(enumerate(THEMES, start=1))
+    themes += [(len(themes) + i + 1, f"thematique{i}") for i in range(args.extra_themes)]
+    automaton = services._build_keyword_automaton()
+    index = ThemeIndex((theme_id, name, "") for theme_id, name in themes)
+
+    random.seed(0)
+    messages = {
+        "court": "Bonjour, je me sens harcelé par mon manager et cela me stresse beaucoup.",
+        "long": " ".join(random.choice(VOCABULARY) for _ in range(args.words)),
+    }
+
+    print(f"{len(themes)} thématiques")
+    for label, message in messages.items():
+        legacy = timeit.timeit(lambda: legacy_scan(services, message, themes), number=args.number) / args.number
+        single = timeit.timeit(lambda: services.scan_message(message, automaton, index), number=args.number) / args.number
+        print(
+            f"{label:<6} ({len(message):>6} car.)  ancien={legacy * 1e6:9.1f}µs  "
+            f"automate={single * 1e6:9.1f}µs  gain=x{legacy / single:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
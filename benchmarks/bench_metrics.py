@@ -0,0 +1,68 @@
+"""
+Mesure le coût de l'instrumentation (chatbot/metrics.py) : incrément d'un
+compteur, observation d'un histogramme et chronométrage d'une étape, par appel,
+seul puis depuis plusieurs threads simultanés, ainsi que le rendu de /metrics.
+
+Usage :
+    python benchmarks/bench_metrics.py --calls 1000000 --threads 8
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.utils import setup_django  # noqa: E402
+
+
+def per_call_ns(operation, calls: int, threads: int) -> float:
+    """Durée moyenne d'une opération (ns), chaque thread en exécutant calls"""
+    def work():
+        for _ in range(calls):
+            operation()
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - start) / (calls * threads) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=1_000_000, help="Appels par thread")
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    setup_django()
+    from chatbot import metrics
+
+    def span():
+        with metrics.STAGE_SECONDS.time("keyword_scan"):
+            pass
+
+    operations = [
+        ("counter inc", lambda: metrics.CACHE_REQUESTS.inc(label="hit")),
+        ("histogram observe", lambda: metrics.STAGE_SECONDS.observe(0.004, "json_parse")),
+        ("span", span),
+    ]
+    print(f"{'operation':<20}{'1 thread':>12}{f'{args.threads} threads':>14}")
+    for label, operation in operations:
+        single = per_call_ns(operation, args.calls, 1)
+        shared = per_call_ns(operation, args.calls // args.threads, args.threads)
+        print(f"{label:<20}{single:10.0f}ns{shared:12.0f}ns")
+
+    expected = args.calls + (args.calls // args.threads) * args.threads
+    assert metrics.CACHE_REQUESTS.value("hit") == expected, "lost increments"
+
+    start = time.perf_counter()
+    body = metrics.render()
+    print(f"render /metrics: {(time.perf_counter() - start) * 1000:.2f}ms ({len(body.splitlines())} lines)")
+
+
+if __name__ == "__main__":
+    main()
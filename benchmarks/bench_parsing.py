@@ -0,0 +1,70 @@
+"""
+Microbenchmark du décodage des réponses JSON du modèle (chatbot/parsing.py) :
+coût de parse_analysis comparé à json.loads sur une sortie valide et sur une sortie
+tronquée, et part des troncatures réparées localement (sans requête de secours)
+lorsque la sortie est coupée à chaque position possible.
+
+Usage :
+    python benchmarks/bench_parsing.py --words 8 --number 20000
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.utils import setup_django  # noqa: E402
+
+RESPONSE = (
+    "Je comprends que la situation avec votre manager soit difficile à vivre. Pouvez-vous me dire "
+    "depuis combien de temps ces tensions durent, et si vous avez pu en parler à quelqu'un ?"
+)
+WORDS = ["harcèle", "menace", "rage", "humilie", "crie", "frapper", "détruire", "haine", "colère", "insulte"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, default=8, help="Mots violents dans la sortie")
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    setup_django()
+    from chatbot import parsing
+
+    content = json.dumps({
+        "response": RESPONSE,
+        "violent_words": (WORDS * (args.words // len(WORDS) + 1))[:args.words],
+        "scopeflag": False
+    }, ensure_ascii=False)
+    truncated = content[:len(content) * 3 // 4]
+
+    def per_call_us(function, text):
+        return timeit.timeit(lambda: function(text), number=args.number) / args.number * 1e6
+
+    print(f"sortie de {len(content)} caractères, {args.words} mots violents")
+    print(f"valide    json.loads={per_call_us(json.loads, content):6.1f}µs  "
+          f"parse_analysis={per_call_us(parsing.parse_analysis, content):6.1f}µs")
+    print(f"tronquée  parse_analysis={per_call_us(parsing.parse_analysis, truncated):6.1f}µs "
+          f"(réparée, json.loads échoue)")
+
+    # Coupure à chaque position après l'ouverture de l'objet
+    response_end = content.index(RESPONSE) + len(RESPONSE) + 1
+    recovered = with_analysis = 0
+    positions = range(1, len(content))
+    for position in positions:
+        try:
+            analysis = parsing.parse_analysis(content[:position])
+        except parsing.ParseError:
+            continue
+        recovered += 1
+        with_analysis += "violent_words" in analysis.model_fields_set
+    after_response = len(content) - response_end
+    print(f"troncatures réparées : {recovered}/{len(positions)} positions "
+          f"({recovered}/{after_response} après la fin de la réponse), "
+          f"dont {with_analysis} avec des mots violents")
+
+
+if __name__ == "__main__":
+    main()
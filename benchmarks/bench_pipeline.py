@@ -0,0 +1,109 @@
+"""
+Mesure les percentiles de latence de analyze_message_async face à un serveur
+OpenAI factice dont une partie des appels combinés (réponse + analyse) est lente.
+
+Le mode « serial » reproduit l'ancien comportement (attente de l'appel combiné,
+puis réponse seule en cas d'échec) ; le mode « pipeline » utilise les échéances
+et la requête de secours parallèle de CHATBOT_PIPELINE.
+
+Usage :
+    python benchmarks/bench_pipeline.py --requests 200 --latency 0.3 --slow-share 0.1 --slow-latency 4
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_openai import FakeOpenAIServer, is_json_request  # noqa: E402
+from benchmarks.utils import setup_django, summarize_latencies  # noqa: E402
+
+# Messages distincts : la passerelle regrouperait les appels identiques simultanés
+MESSAGE = "Je ressens beaucoup de stress au travail à cause de mon manager (#{})."
+
+
+def make_latency(latency: float, slow_share: float, slow_latency: float, seed: int):
+    """Latence des appels : les appels combinés sont lents avec la probabilité slow_share"""
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def delay(payload: dict) -> float:
+        if not is_json_request(payload):
+            return latency
+        with lock:
+            slow = rng.random() < slow_share
+        return slow_latency if slow else latency
+
+    return delay
+
+
+async def run(services, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    partial = 0
+
+    async def one(index: int):
+        nonlocal partial
+        async with semaphore:
+            start = time.perf_counter()
+            result = await services.analyze_message_async(MESSAGE.format(index), use_cache=False)
+            partial += result["partial"]
+            return time.perf_counter() - start
+
+    latencies = await asyncio.gather(*(one(index) for index in range(requests)))
+    return latencies, partial
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.3, help="Latence normale du modèle (s)")
+    parser.add_argument("--slow-share", type=float, default=0.1, help="Part des appels combinés lents")
+    parser.add_argument("--slow-latency", type=float, default=4.0, help="Latence des appels lents (s)")
+    parser.add_argument("--hedge-delay", type=float, default=0.6)
+    parser.add_argument("--analysis-timeout", type=float, default=1.5)
+    parser.add_argument("--reply-timeout", type=float, default=3.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    latency = make_latency(args.latency, args.slow_share, args.slow_latency, args.seed)
+    with FakeOpenAIServer(latency=latency) as server:
+        setup_django(server.base_url)
+        import logging
+        logging.disable(logging.CRITICAL)
+        from django.test import override_settings
+        from chatbot import services
+
+        modes = {
+            "serial": {'HEDGE_DELAY': 3600, 'REPLY_TIMEOUT': 3600, 'ANALYSIS_TIMEOUT': 3600},
+            "pipeline": {
+                'HEDGE_DELAY': args.hedge_delay,
+                'REPLY_TIMEOUT': args.reply_timeout,
+                'ANALYSIS_TIMEOUT': args.analysis_timeout,
+            },
+        }
+
+        async def compare():
+            # Une seule boucle : le pool de connexions du client AsyncOpenAI y est lié
+            for label, pipeline in modes.items():
+                server.latency = make_latency(args.latency, args.slow_share, args.slow_latency, args.seed)
+                calls = server.request_count
+                with override_settings(CHATBOT_PIPELINE=pipeline):
+                    latencies, partial = await run(services, args.requests, args.concurrency)
+                stats = summarize_latencies(latencies)
+                print(
+                    f"{label:<10} p50={stats['p50_ms']:.0f}ms p95={stats['p95_ms']:.0f}ms "
+                    f"p99={stats['p99_ms']:.0f}ms  partial={partial}/{args.requests}  "
+                    f"api_calls={server.request_count - calls}"
+                )
+
+        with override_settings(CHATBOT_FAST_PATH={'ENABLED': False}):
+            asyncio.run(compare())
+
+
+if __name__ == "__main__":
+    main()
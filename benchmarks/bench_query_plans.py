@@ -0,0 +1,91 @@
+"""
+Vérifie par EXPLAIN QUERY PLAN que la page d'accueil, la page de statistiques,
+l'API stats.json et la commande reset_violent_stats ne font ni parcours complet
+ni tri temporaire sur les tables volumineuses, dans une base SQLite peuplée de
+millions de mots violents. Le script échoue (code 1) si un problème est détecté.
+
+Usage :
+    python benchmarks/bench_query_plans.py --rows 2000000 --employees 1000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.utils import plan_problems, setup_django, temporary_database  # noqa: E402
+
+
+def seed(connection, rows: int, employees: int) -> None:
+    """Insère les employés, les mots violents et les compteurs de thématiques en SQL"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "WITH RECURSIVE seq(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM seq LIMIT %s) "
+            "INSERT INTO chatbot_employee (first_name, last_name, birth_date, created_at, updated_at, "
+            "total_words_count, violent_words_count) "
+            "SELECT 'Prénom ' || x, 'Nom ' || x, '1990-01-01', datetime('now'), datetime('now'), 0, 0 FROM seq",
+            [employees]
+        )
+        cursor.execute(
+            "WITH RECURSIVE seq(x) AS (SELECT 0 UNION ALL SELECT x + 1 FROM seq LIMIT %s) "
+            "INSERT INTO chatbot_violentword (employee_id, word, timestamp) "
+            "SELECT (x %% %s) + 1, 'mot ' || (x %% 50), datetime('2025-01-01', '+' || (x %% 525600) || ' minutes') FROM seq",
+            [rows, employees]
+        )
+        cursor.execute(
+            "INSERT INTO chatbot_employeethemecounter (employee_id, theme_id, count) "
+            "SELECT e.id, t.id, 1 FROM chatbot_employee e CROSS JOIN chatbot_psychologicaltheme t"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000, help="Nombre de mots violents")
+    parser.add_argument("--employees", type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+    import logging
+    logging.disable(logging.CRITICAL)
+    from django.core.management import call_command
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from chatbot.themes import initialize_themes
+
+    with temporary_database() as connection:
+        start = time.perf_counter()
+        initialize_themes()
+        seed(connection, args.rows, args.employees)
+        print(f"Seeded {args.rows} violent words for {args.employees} employees in {time.perf_counter() - start:.1f}s")
+
+        client = Client()
+        employee_id = args.employees // 2
+        scenarios = [
+            ("index", lambda: client.get("/"), ["chatbot_employee"]),
+            ("employee_stats", lambda: client.get(f"/employee/{employee_id}/"),
+             ["chatbot_violentword", "chatbot_employeethemecounter", "chatbot_employeestatsrollup"]),
+            ("stats.json", lambda: client.get(f"/employee/{employee_id}/stats.json", {"period": "week"}),
+             ["chatbot_employeestatsrollup", "chatbot_employeethemerollup"]),
+            ("reset_violent_stats", lambda: call_command("reset_violent_stats", stdout=open(os.devnull, "w")),
+             ["chatbot_violentword"]),
+        ]
+
+        failures = 0
+        for label, run, tables in scenarios:
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                run()
+                elapsed = time.perf_counter() - start
+            problems = plan_problems(connection, queries.captured_queries, tables)
+            status = "ok" if not problems else "FULL SCAN"
+            print(f"{label:<22} {elapsed * 1000:9.1f}ms  {len(queries):3d} queries  {status}")
+            for sql, detail in problems:
+                print(f"    {detail}: {sql[:160]}")
+            failures += len(problems)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+Test de charge par rejeu : envoie les messages d'une trace JSONL à /chat/ à un débit
+cible (boucle ouverte : un envoi tous les 1/rps secondes, sans attendre les réponses)
+et mesure les latences p50/p95/p99, le débit, les requêtes SQL et les appels au
+modèle par message, avec comparaison à une référence enregistrée.
+
+Par défaut l'application est servie dans le processus (handler ASGI de Django, base
+SQLite temporaire) face au serveur OpenAI factice : requêtes SQL et appels au modèle
+sont comptés. Avec --url, les messages sont envoyés à un serveur déjà démarré (par
+exemple face à `python -m benchmarks.fake_openai`) et seules les latences sont mesurées.
+
+Chaque ligne de la trace contient "message" (ou "body", comme requests.jsonl) et
+optionnellement "employee" (libellé : un employé est créé par libellé) et
+"conversation" (libellé : les tours sont envoyés dans l'ordre, chacun après la
+réponse au précédent, dans une conversation démarrée par le premier).
+
+Les références sont enregistrées dans benchmarks/baselines/<nom>.json ; --compare
+termine en erreur si un indicateur se dégrade au-delà de la tolérance. Les latences
+dépendent de la machine, les requêtes SQL et appels au modèle par message non.
+
+Usage :
+    python benchmarks/bench_replay.py --rps 20 --latency 0.3 --repeat 4
+    python benchmarks/bench_replay.py --save-baseline default
+    python benchmarks/bench_replay.py --compare default --tolerance 0.25
+    python benchmarks/bench_replay.py --url http://127.0.0.1:8000/chat/ --rps 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_openai import FakeOpenAIServer  # noqa: E402
+from benchmarks.utils import setup_django, summarize_latencies, temporary_database  # noqa: E402
+
+DEFAULT_TRACE = Path(__file__).resolve().parent / "fixtures" / "chat_trace.jsonl"
+BASELINES_DIR = Path(__file__).resolve().parent / "baselines"
+
+# Indicateurs comparés à la référence, avec le sens d'une dégradation (True : une hausse)
+COMPARED = {
+    "p50_ms": True,
+    "p95_ms": True,
+    "p99_ms": True,
+    "throughput_rps": False,
+    "error_rate": True,
+    "db_queries_per_message": True,
+    "llm_calls_per_message": True,
+}
+
+Sender = Callable[[Dict[str, str]], Awaitable[Tuple[int, Dict]]]
+
+
+def load_trace(path, repeat: int = 1) -> List[Dict]:
+    """
+    Lit une trace JSONL, répétée repeat fois (chaque répétition a ses propres conversations)
+
+    Returns:
+        List[Dict]: Éléments "message", "employee" et "conversation" (None si absents)
+    """
+    items = []
+    with open(path, encoding="utf-8") as trace_file:
+        for line in trace_file:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            message = entry.get("message") or entry.get("body")
+            if message:
+                items.append({
+                    "message": message,
+                    "employee": entry.get("employee"),
+                    "conversation": entry.get("conversation"),
+                })
+    return [
+        {**item, "conversation": None if item["conversation"] is None else (round_, item["conversation"])}
+        for round_ in range(repeat)
+        for item in items
+    ]
+
+
+class QueryCounter:
+    """
+    Compte les requêtes SQL exécutées par toutes les connexions (execute_wrapper)
+
+    Les connexions ouvertes après install() sont instrumentées par le signal
+    connection_created ; parmi celles déjà ouvertes, seule celle du thread courant l'est.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def _attach(self, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+            self._connections.append(connection)
+
+    def __enter__(self) -> "QueryCounter":
+        from django.db import connections
+        from django.db.backends.signals import connection_created
+
+        connection_created.connect(self._on_connection_created)
+        for connection in connections.all(initialized_only=True):
+            self._attach(connection)
+        return self
+
+    def _on_connection_created(self, sender, connection, **kwargs):
+        self._attach(connection)
+
+    def __exit__(self, *exc_info):
+        from django.db.backends.signals import connection_created
+
+        connection_created.disconnect(self._on_connection_created)
+        for connection in self._connections:
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+
+async def replay(items: List[Dict], send: Sender, rps: float, employees: Dict = None) -> Dict:
+    """
+    Envoie les éléments de la trace à débit constant et mesure chaque réponse
+
+    Args:
+        items (List[Dict]): Éléments de la trace (voir load_trace)
+        send (Sender): Envoi d'un formulaire à /chat/, retourne (statut HTTP, corps JSON)
+        rps (float): Débit cible en messages par seconde
+        employees (Dict, optional): ID de l'employé de chaque libellé
+
+    Returns:
+        Dict: "latencies" (secondes), "errors" et "elapsed" (secondes)
+    """
+    employees = employees or {}
+    latencies = []
+    errors = 0
+    conversation_ids = {}
+    previous_turns = {}
+
+    async def one(item: Dict, previous_turn: asyncio.Task = None) -> None:
+        nonlocal errors
+        if previous_turn is not None:
+            await previous_turn
+        fields = {"message": item["message"]}
+        if item["employee"] is not None:
+            fields["employee_id"] = str(employees[item["employee"]])
+        if item["conversation"] is not None:
+            fields["conversation_id"] = str(conversation_ids.get(item["conversation"], "new"))
+
+        start = time.perf_counter()
+        try:
+            status, body = await send(fields)
+        except Exception:
+            status, body = 0, {}
+        latencies.append(time.perf_counter() - start)
+        if status != 200:
+            errors += 1
+        elif item["conversation"] is not None and body.get("conversation_id"):
+            conversation_ids.setdefault(item["conversation"], body["conversation_id"])
+
+    start = time.perf_counter()
+    tasks = []
+    for index, item in enumerate(items):
+        delay = start + index / rps - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        key = item["conversation"]
+        task = asyncio.create_task(one(item, previous_turns.get(key) if key is not None else None))
+        if key is not None:
+            previous_turns[key] = task
+        tasks.append(task)
+    await asyncio.gather(*tasks)
+    return {"latencies": latencies, "errors": errors, "elapsed": time.perf_counter() - start}
+
+
+def build_report(run: Dict, rps: float, queries: int = None, llm_calls: int = None) -> Dict:
+    """Indicateurs d'un rejeu (requêtes SQL et appels au modèle None s'ils ne sont pas mesurés)"""
+    messages = len(run["latencies"])
+    report = {
+        "messages": messages,
+        "target_rps": rps,
+        "throughput_rps": messages / run["elapsed"] if run["elapsed"] else 0.0,
+        "error_rate": run["errors"] / messages if messages else 0.0,
+        **summarize_latencies(run["latencies"]),
+        "db_queries_per_message": queries / messages if queries is not None and messages else None,
+        "llm_calls_per_message": llm_calls / messages if llm_calls is not None and messages else None,
+    }
+    return {key: round(value, 3) if isinstance(value, float) else value for key, value in report.items()}
+
+
+def asgi_sender() -> Sender:
+    """Envoi à l'application servie dans le processus (handler ASGI de Django)"""
+    from django.test import AsyncClient
+
+    client = AsyncClient()
+
+    async def send(fields):
+        response = await client.post("/chat/", fields)
+        return response.status_code, json.loads(response.content or b"{}")
+
+    return send
+
+
+def http_sender(url: str, concurrency: int) -> Sender:
+    """Envoi HTTP à un serveur déjà démarré (un thread par requête en cours)"""
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    def post(fields):
+        request = urllib.request.Request(url, data=urllib.parse.urlencode(fields).encode("utf-8"))
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                return response.status, json.loads(response.read() or b"{}")
+        except urllib.error.HTTPError as e:
+            return e.code, {}
+
+    async def send(fields):
+        return await asyncio.get_running_loop().run_in_executor(executor, post, fields)
+
+    return send
+
+
+def replay_in_process(items: List[Dict], rps: float, server: FakeOpenAIServer) -> Dict:
+    """
+    Rejoue la trace sur l'application du processus, avec la base Django courante
+
+    Les statistiques différées (stats_buffer) sont écrites à la fin, pour que leurs
+    requêtes soient comptées.
+
+    Returns:
+        Dict: Rapport (voir build_report)
+    """
+    from asgiref.sync import async_to_sync
+    from chatbot import stats_buffer
+    from chatbot.models import Employee
+
+    labels = sorted({item["employee"] for item in items if item["employee"] is not None}, key=str)
+    employees = {
+        label: Employee.objects.create(first_name="Replay", last_name=str(label), birth_date="1990-01-01").id
+        for label in labels
+    }
+
+    llm_calls = server.request_count
+    with QueryCounter() as queries:
+        # async_to_sync : le code synchrone des vues s'exécute dans ce thread (même connexion)
+        run = async_to_sync(replay)(items, asgi_sender(), rps, employees)
+        if stats_buffer.is_enabled():
+            stats_buffer.get_buffer().flush()
+    return build_report(run, rps, queries.count, server.request_count - llm_calls)
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float) -> List[Tuple[str, float, float, bool]]:
+    """
+    Compare un rapport à une référence
+
+    Returns:
+        List[Tuple[str, float, float, bool]]: (indicateur, référence, valeur, dégradation
+        au-delà de la tolérance relative) pour chaque indicateur mesuré des deux côtés
+    """
+    rows = []
+    for key, higher_is_worse in COMPARED.items():
+        reference, value = baseline.get(key), report.get(key)
+        if reference is None or value is None:
+            continue
+        change = value - reference if higher_is_worse else reference - value
+        rows.append((key, reference, value, change > tolerance * max(abs(reference), 1e-9)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trace", default=str(DEFAULT_TRACE), help="Trace JSONL à rejouer")
+    parser.add_argument("--repeat", type=int, default=1, help="Nombre de passages sur la trace")
+    parser.add_argument("--rps", type=float, default=20.0, help="Débit cible (messages par seconde)")
+    parser.add_argument("--latency", type=float, default=0.3, help="Latence simulée du modèle (s)")
+    parser.add_argument("--invalid-json-rate", type=float, default=0.0, help="Part des réponses JSON invalides")
+    parser.add_argument("--url", help="URL de /chat/ d'un serveur déjà démarré (sinon dans le processus)")
+    parser.add_argument("--concurrency", type=int, default=256, help="Requêtes HTTP simultanées au plus (--url)")
+    parser.add_argument("--save-baseline", metavar="NAME", help="Enregistre le rapport comme référence")
+    parser.add_argument("--compare", metavar="NAME", help="Compare le rapport à une référence")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Dégradation relative tolérée")
+    args = parser.parse_args()
+
+    items = load_trace(args.trace, args.repeat)
+    options = {
+        "trace": os.path.basename(args.trace), "repeat": args.repeat, "rps": args.rps,
+        "latency": args.latency, "invalid_json_rate": args.invalid_json_rate, "url": bool(args.url),
+    }
+
+    if args.url:
+        report = build_report(asyncio.run(replay(items, http_sender(args.url, args.concurrency), args.rps)), args.rps)
+    else:
+        with FakeOpenAIServer(latency=args.latency, invalid_json_rate=args.invalid_json_rate, seed=0) as server:
+            setup_django(server.base_url)
+            import logging
+            logging.disable(logging.CRITICAL)
+            with temporary_database():
+                report = replay_in_process(items, args.rps, server)
+
+    for key, value in report.items():
+        print(f"{key:<24} {'n/a' if value is None else value}")
+
+    status = 0
+    if args.compare:
+        baseline = json.loads((BASELINES_DIR / f"{args.compare}.json").read_text(encoding="utf-8"))
+        if baseline["options"] != options:
+            print(f"warning: baseline recorded with different options {baseline['options']}")
+        print(f"\ncomparison with baseline {args.compare!r} (tolerance {args.tolerance:.0%})")
+        for key, reference, value, regressed in compare(report, baseline["report"], args.tolerance):
+            print(f"{key:<24} {reference:>10} -> {value:<10} {'REGRESSION' if regressed else 'ok'}")
+            status = status or int(regressed)
+    if args.save_baseline:
+        BASELINES_DIR.mkdir(exist_ok=True)
+        path = BASELINES_DIR / f"{args.save_baseline}.json"
+        path.write_text(json.dumps({"options": options, "report": report}, indent=2) + "\n", encoding="utf-8")
+        print(f"\nbaseline saved to {path}")
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Mesure l'archivage des mots violents (commande archive_violent_words) sur une table
+volumineuse : débit, mémoire Python maximale selon la taille de la table, et temps
+de la page employé (mots violents récents) avant et après l'archivage.
+
+Usage :
+    python benchmarks/bench_retention.py --rows 1000000 --days 730
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.utils import setup_django, temporary_database  # noqa: E402
+
+WORDS = ["colère", "rage", "frapper", "détruire", "haine", "menace", "crier", "violence"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--employees", type=int, default=500)
+    parser.add_argument("--days", type=int, default=730, help="Ancienneté maximale des mots générés")
+    parser.add_argument("--keep", type=int, default=90, help="Jours conservés")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import DatabaseError, connection
+    from django.utils import timezone
+    from chatbot import retention
+    from chatbot.models import Employee, ViolentWord
+
+    def employee_page_ms(employee_id):
+        start = time.perf_counter()
+        for _ in range(20):
+            list(ViolentWord.objects.filter(employee_id=employee_id).order_by('-timestamp')[:10])
+        return (time.perf_counter() - start) / 20 * 1000
+
+    def table_pages():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM dbstat WHERE name = 'chatbot_violentword'")
+            return cursor.fetchone()[0]
+
+    with temporary_database(), tempfile.TemporaryDirectory() as archive_dir:
+        random.seed(0)
+        Employee.objects.bulk_create(
+            Employee(first_name=f"Prénom{i}", last_name=f"Nom{i}", birth_date="1990-01-01")
+            for i in range(args.employees)
+        )
+        employee_ids = list(Employee.objects.values_list("id", flat=True))
+        now = timezone.now()
+        step = timedelta(days=args.days) / args.rows
+        for offset in range(0, args.rows, 50000):
+            # Insertion chronologique : les clés suivent les dates, comme en production
+            ViolentWord.objects.bulk_create([
+                ViolentWord(employee_id=random.choice(employee_ids), word=random.choice(WORDS),
+                            timestamp=now - timedelta(days=args.days) + step * index)
+                for index in range(offset, min(offset + 50000, args.rows))
+            ], batch_size=5000)
+
+        try:
+            pages = table_pages()
+        except DatabaseError:
+            # Table virtuelle dbstat absente de cette compilation de SQLite
+            pages = None
+        print(f"{args.rows} mots violents sur {args.days} jours"
+              + (f" ({pages} pages SQLite)" if pages else ""))
+        before_ms = employee_page_ms(employee_ids[0])
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        summary = retention.archive_violent_words(args.keep, args.batch_size, archive_dir)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        archive_bytes = sum(
+            os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(archive_dir) for name in names
+        )
+        print(f"archivés {summary['rows']} mots en {elapsed:.1f}s ({summary['rows'] / elapsed:,.0f} lignes/s), "
+              f"{summary['files']} fichiers, {archive_bytes / 1e6:.1f} Mo compressés")
+        print(f"mémoire Python maximale {peak / 1e6:.1f} Mo (lots de {args.batch_size})")
+        print(f"restant en base {ViolentWord.objects.count()} mots")
+        print(f"page employé : {before_ms:.2f}ms avant, {employee_page_ms(employee_ids[0]):.2f}ms après")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Test de charge des écritures concurrentes sur SQLite : plusieurs processus (comme
+des workers gunicorn/uvicorn) envoient en parallèle des requêtes /chat/ avec
+employee_id, face à un serveur OpenAI factice. Chaque requête écrit les
+statistiques de l'employé dans la même base fichier : par défaut sans le tampon
+d'écriture différée (une transaction par requête, le cas le plus disputé), avec
+--write-behind une transaction par écriture du tampon de chaque processus.
+
+Le profil "default" correspond à la configuration SQLite par défaut de Django
+(journal rollback, transactions DEFERRED, connexion par requête), "production" à
+settings.CHATBOT_SQLITE_PRODUCTION. Le script affiche le nombre d'erreurs "database is locked" et
+le débit d'écriture, et échoue (code 1) si le profil de production en produit.
+
+Usage :
+    python benchmarks/bench_sqlite_concurrency.py --processes 4 --threads 8 --requests 2000
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_openai import FakeOpenAIServer  # noqa: E402
+from benchmarks.utils import setup_django  # noqa: E402
+
+MESSAGE = "Je ressens beaucoup de stress au travail à cause de mon manager."
+
+# Configuration SQLite par défaut de Django, pour comparaison
+DEFAULT_PROFILE = {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False, "OPTIONS": {}}
+
+
+def use_database(name: str, profile: dict) -> None:
+    """Pointe la connexion par défaut du processus vers la base du test, avec le profil donné"""
+    from django.db import connection
+    connection.close()
+    connection.settings_dict.update({"NAME": name, **profile})
+
+
+def prepare(name: str, profile: dict, employees: int) -> None:
+    """Crée la base (migrations, thématiques, employés)"""
+    from django.core.management import call_command
+    from django.db import connection
+    from chatbot.models import Employee
+    from chatbot.themes import initialize_themes
+
+    use_database(name, profile)
+    call_command("migrate", verbosity=0)
+    initialize_themes()
+    Employee.objects.bulk_create([
+        Employee(first_name=f"Prénom {i}", last_name=f"Nom {i}", birth_date="1990-01-01")
+        for i in range(employees)
+    ])
+    connection.close()
+
+
+def worker(name: str, profile: dict, requests: int, threads: int, employee_ids: list, offset: int,
+           write_behind: bool, results) -> None:
+    """Processus de charge : requêtes /chat/ réparties sur un pool de threads"""
+    from django.conf import settings
+    from django.db import close_old_connections, connections
+    from django.test import Client
+    from chatbot import stats_buffer
+
+    use_database(name, profile)
+    settings.CHATBOT_STATS_BUFFER = {**stats_buffer.get_config(), "ENABLED": write_behind}
+
+    def one(index: int):
+        client = Client(raise_request_exception=False)
+        response = client.post("/chat/", {
+            "message": f"{MESSAGE} #{offset + index}",
+            "employee_id": str(employee_ids[index % len(employee_ids)]),
+            "cache": "0",
+        })
+        # Fin de requête comme dans un worker (le client de test ne le fait pas) : fermeture selon CONN_MAX_AGE
+        close_old_connections()
+        if response.status_code == 200:
+            return None
+        if response.get("Content-Type") == "application/json":
+            return response.json().get("error") or f"HTTP {response.status_code}"
+        return f"HTTP {response.status_code}"
+
+    def run_thread(indexes):
+        try:
+            return [one(index) for index in indexes]
+        finally:
+            connections.close_all()
+
+    batches = [range(start, requests, threads) for start in range(threads)]
+    errors = []
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            errors = [error for batch in pool.map(run_thread, batches) for error in batch]
+        if write_behind:
+            stats_buffer.get_buffer().stop()
+    finally:
+        # Toujours répondre au processus principal, même si un thread a échoué
+        results.put(errors)
+
+
+def run_profile(label: str, profile: dict, args, directory: str) -> int:
+    from django.db import connection
+    from django.db.models import Sum
+    from chatbot.models import Employee, EmployeeStatsRollup
+
+    name = os.path.join(directory, f"{label}.sqlite3")
+    prepare(name, profile, args.employees)
+    use_database(name, profile)
+    employee_ids = list(Employee.objects.values_list("id", flat=True))
+    connection.close()
+
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    per_process = args.requests // args.processes
+    processes = [
+        context.Process(target=worker, args=(name, profile, per_process, args.threads, employee_ids,
+                                             index * per_process, args.write_behind, results))
+        for index in range(args.processes)
+    ]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    errors = [error for _ in processes for error in results.get()]
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+
+    use_database(name, profile)
+    written = EmployeeStatsRollup.objects.filter(period="day").aggregate(total=Sum("messages_count"))["total"] or 0
+    connection.close()
+
+    failed = [error for error in errors if error]
+    locked = sum("locked" in error for error in failed)
+    print(
+        f"{label:<11} {len(errors):6d} requests  {locked:5d} locked  {len(failed) - locked:5d} other errors  "
+        f"{written:6d} writes  {written / elapsed:8.1f} writes/s"
+    )
+    return locked
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8, help="Requêtes simultanées par processus")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--employees", type=int, default=20, help="Peu d'employés : lignes très disputées")
+    parser.add_argument("--latency", type=float, default=0.01, help="Latence simulée du modèle (s)")
+    parser.add_argument("--write-behind", action="store_true", help="Écriture différée des statistiques")
+    parser.add_argument("--profile", choices=["default", "production", "both"], default="both")
+    args = parser.parse_args()
+
+    with FakeOpenAIServer(latency=args.latency) as server:
+        setup_django(server.base_url)
+        import logging
+        logging.disable(logging.CRITICAL)
+        from django.conf import settings
+        from django.test.utils import setup_test_environment
+        setup_test_environment()
+
+        production = {**DEFAULT_PROFILE, **settings.CHATBOT_SQLITE_PRODUCTION}
+        profiles = {"default": DEFAULT_PROFILE, "production": production}
+        labels = ["default", "production"] if args.profile == "both" else [args.profile]
+
+        locked = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for label in labels:
+                locked[label] = run_profile(label, profiles[label], args, directory)
+
+    sys.exit(1 if locked.get("production") else 0)
+
+
+if __name__ == "__main__":
+    main()
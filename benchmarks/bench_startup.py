@@ -0,0 +1,66 @@
+"""
+Mesure le temps de démarrage : commande `manage.py check` et démarrage d'un
+worker (application WSGI chargée et URLconf importée, donc vues et services),
+chacun dans un nouveau processus Python. Avec --baseline, les mêmes mesures sont
+faites sur une révision git antérieure (extraite dans un répertoire temporaire)
+pour comparer avant et après.
+
+Usage :
+    python benchmarks/bench_startup.py --repeats 10 --baseline HEAD~1
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.utils import BASE_DIR  # noqa: E402
+
+# Démarrage d'un worker : application WSGI et URLconf (import des vues et des services)
+WORKER_BOOT = """
+from wellbeing_chatbot.wsgi import application
+from django.urls import get_resolver
+get_resolver().url_patterns
+"""
+
+
+def run(command, project: Path) -> float:
+    """Durée (s) d'une commande lancée dans un nouveau processus depuis le projet"""
+    env = {**os.environ, "OPENAI_API_KEY": "benchmark", "PYTHONDONTWRITEBYTECODE": "1"}
+    start = time.perf_counter()
+    subprocess.run(command, cwd=project, env=env, check=True, capture_output=True)
+    return time.perf_counter() - start
+
+
+def measure(project: Path, repeats: int) -> dict:
+    """Durées médianes (ms) de manage.py check et du démarrage d'un worker"""
+    check = [run([sys.executable, "manage.py", "check"], project) for _ in range(repeats)]
+    boot = [run([sys.executable, "-c", WORKER_BOOT], project) for _ in range(repeats)]
+    return {"check": statistics.median(check) * 1000, "worker boot": statistics.median(boot) * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--baseline", help="Révision git à comparer (par exemple HEAD~1)")
+    args = parser.parse_args()
+
+    results = {"current": measure(BASE_DIR, args.repeats)}
+    if args.baseline:
+        with tempfile.TemporaryDirectory() as directory:
+            archive = subprocess.run(["git", "archive", args.baseline], cwd=BASE_DIR, check=True, capture_output=True)
+            subprocess.run(["tar", "-x", "-C", directory], input=archive.stdout, check=True)
+            results[args.baseline] = measure(Path(directory), args.repeats)
+
+    print(f"{'revision':<12}{'check':>12}{'worker boot':>14}")
+    for label, timings in results.items():
+        print(f"{label:<12}{timings['check']:10.0f}ms{timings['worker boot']:12.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Microbenchmark de la détection des thématiques avec beaucoup de thématiques et de
+synonymes : l'ancienne détection (lecture des thématiques en base à chaque message
+puis recherche `nom in message` de chaque terme) comparée à l'index en mémoire de
+theme_index, pour des messages de longueurs croissantes.
+
+Usage :
+    python benchmarks/bench_theme_index.py --themes 500 --synonyms 10
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.utils import setup_django, temporary_database  # noqa: E402
+
+VOCABULARY = (
+    "je suis très fatigué par la situation avec mon manager et les réunions interminables "
+    "cela crée une ambiance lourde dans mon équipe et je me sens harcelé et épuisé le soir"
+).split()
+
+
+def random_word(rng: random.Random) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(6, 12)))
+
+
+def legacy_detect(PsychologicalTheme, message: str):
+    """Reproduction de l'ancienne détection, étendue aux synonymes"""
+    message_lower = message.lower()
+    detected = []
+    for theme in PsychologicalTheme.objects.all():
+        terms = [theme.name, *theme.synonyms.split(",")]
+        if any(term.strip().lower() in message_lower for term in terms if term.strip()):
+            detected.append((theme.id, theme.name))
+    return detected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--themes", type=int, default=500, help="Thématiques synthétiques ajoutées aux thématiques par défaut")
+    parser.add_argument("--synonyms", type=int, default=10, help="Synonymes par thématique synthétique")
+    parser.add_argument("--number", type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    from chatbot import theme_index, themes
+    from chatbot.models import PsychologicalTheme
+
+    rng = random.Random(0)
+    with temporary_database():
+        themes.initialize_themes()
+        PsychologicalTheme.objects.bulk_create(
+            PsychologicalTheme(
+                name=f"thematique {random_word(rng)}",
+                synonyms=", ".join(
+                    " ".join(random_word(rng) for _ in range(rng.randint(1, 3))) for _ in range(args.synonyms)
+                )
+            )
+            for _ in range(args.themes)
+        )
+        theme_index.invalidate_theme_index()
+
+        start = time.perf_counter()
+        index = theme_index.get_theme_index()
+        build_ms = (time.perf_counter() - start) * 1000
+        print(f"{PsychologicalTheme.objects.count()} thématiques, {len(index)} expressions, "
+              f"index chargé en {build_ms:.1f}ms")
+
+        for words in (20, 200, 2000):
+            message = " ".join(rng.choice(VOCABULARY) for _ in range(words - 3)) + " harcelé et épuisé"
+            assert {name for _, name in index.find(message)} >= {"Harcèlement", "Épuisement"}
+            legacy = timeit.timeit(lambda: legacy_detect(PsychologicalTheme, message), number=args.number) / args.number
+            indexed = timeit.timeit(lambda: index.find(message), number=args.number) / args.number
+            print(
+                f"{words:>5} mots  ancien={legacy * 1e6:10.1f}µs  index={indexed * 1e6:8.1f}µs "
+                f"({indexed * 1e6 / words:.2f}µs/mot)  gain=x{legacy / indexed:.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Compare les versions des prompts (chatbot/prompts.py) sur le jeu étiqueté
+benchmarks/fixtures/labelled_messages.jsonl : tokens estimés par message (appel
+combiné, réponse seule, analyse seule des mots violents) et, avec --live, exactitude
+du scopeflag et rappel/précision des mots violents de l'appel combiné.
+
+Sans --live, aucun appel n'est fait : seules les tailles des requêtes sont
+calculées. Avec --live, les messages sont envoyés au modèle configuré
+(OPENAI_API_KEY, et OPENAI_BASE_URL pour un autre fournisseur compatible).
+
+Usage :
+    python benchmarks/eval_prompts.py
+    python benchmarks/eval_prompts.py --live --versions v1 v2 --repeat 3
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.utils import setup_django  # noqa: E402
+
+FIXTURE = Path(__file__).resolve().parent / "fixtures" / "labelled_messages.jsonl"
+
+
+def score(examples: List[Dict], predictions: List[Dict], fold_text) -> Dict[str, float]:
+    """
+    Exactitude du scopeflag et rappel/précision des mots violents
+
+    Un mot prédit correspond à un mot attendu si l'un contient l'autre (casse et
+    accents ignorés) : "harcèle" est compté pour "me harcèle".
+    """
+    def matches(word, others):
+        word = fold_text(word)
+        return any(word in fold_text(other) or fold_text(other) in word for other in others)
+
+    expected = sum(len(example["violent_words"]) for example in examples)
+    predicted = sum(len(prediction["violent_words"]) for prediction in predictions)
+    found = sum(
+        sum(matches(word, prediction["violent_words"]) for word in example["violent_words"])
+        for example, prediction in zip(examples, predictions)
+    )
+    correct = sum(
+        sum(matches(word, example["violent_words"]) for word in prediction["violent_words"])
+        for example, prediction in zip(examples, predictions)
+    )
+    return {
+        "scopeflag_accuracy": sum(
+            prediction["scopeflag"] == example["scopeflag"] for example, prediction in zip(examples, predictions)
+        ) / len(examples),
+        "violent_words_recall": found / expected if expected else 1.0,
+        "violent_words_precision": correct / predicted if predicted else 1.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--versions", nargs="+", help="Versions comparées (par défaut toutes)")
+    parser.add_argument("--live", action="store_true", help="Interroger le modèle réel pour mesurer l'exactitude")
+    parser.add_argument("--repeat", type=int, default=1, help="Passages par version (--live, le modèle n'est pas déterministe)")
+    args = parser.parse_args()
+
+    with open(FIXTURE, encoding="utf-8") as fixture:
+        examples = [json.loads(line) for line in fixture if line.strip()]
+
+    setup_django()
+    import logging
+    logging.disable(logging.CRITICAL)
+    from chatbot import llm, prompts
+    from chatbot.keyword_matcher import fold_text
+
+    versions = args.versions or list(prompts.PROMPTS)
+    print(f"{len(examples)} messages étiquetés")
+    for version in versions:
+        prompt_set = prompts.get_prompts(version)
+        sizes = {
+            "combined": [prompts.token_report(prompts.analysis_messages(e["message"], prompts=prompt_set))
+                         for e in examples],
+            "reply": [prompts.token_report(prompts.reply_messages(e["message"], prompts=prompt_set))
+                      for e in examples],
+            "violent_words": [prompts.token_report(prompts.violent_words_messages(e["message"], prompts=prompt_set))
+                              for e in examples],
+        }
+        line = "  ".join(
+            f"{kind}={statistics.fmean(report['total'] for report in reports):.0f}"
+            for kind, reports in sizes.items()
+        )
+        prefix = sizes["combined"][0]["instructions"]
+        print(f"{version:<4} tokens/message  {line}  (préfixe fixe {prefix})")
+
+        if not args.live:
+            continue
+        runs = []
+        for _ in range(args.repeat):
+            predictions = []
+            for example in examples:
+                content = llm.get_gateway().complete(
+                    prompts.analysis_messages(example["message"], prompts=prompt_set),
+                    model=prompts.MODEL,
+                    temperature=0.7,
+                    response_format={"type": "json_object"}
+                )
+                try:
+                    data = json.loads(content)
+                except ValueError:
+                    data = {}
+                predictions.append({
+                    "violent_words": [w for w in data.get("violent_words") or [] if isinstance(w, str)],
+                    "scopeflag": bool(data.get("scopeflag", False)),
+                })
+            runs.append(score(examples, predictions, fold_text))
+        print("     " + "  ".join(
+            f"{key}={statistics.fmean(run[key] for run in runs):.2f}" for key in runs[0]
+        ))
+    if not args.live:
+        print("exactitude non mesurée : relancer avec --live (modèle réel)")
+
+
+if __name__ == "__main__":
+    main()
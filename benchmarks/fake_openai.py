@@ -0,0 +1,237 @@
+"""
+Serveur local compatible avec l'API OpenAI, utilisé par les benchmarks et les tests
+
+Il répond à /v1/chat/completions après une latence configurable, sans jamais
+contacter OpenAI. Les clients sont pointés dessus via OPENAI_BASE_URL ou base_url.
+
+Il peut aussi être lancé seul, pour un serveur Django démarré à part (tests de charge
+avec benchmarks/bench_replay.py --url) :
+    python -m benchmarks.fake_openai --port 8001 --latency 0.5 --invalid-json-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 uvicorn wellbeing_chatbot.asgi:application
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Les benchmarks ouvrent des centaines de connexions simultanées
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # Client qui abandonne la requête (échéance dépassée) : rien à signaler
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+DEFAULT_JSON_CONTENT = {
+    "response": "Je comprends, pouvez-vous m'en dire plus sur votre situation au travail ?",
+    "violent_words": ["stress"],
+    "scopeflag": False
+}
+
+DEFAULT_TEXT_CONTENT = "Je comprends, pouvez-vous m'en dire plus sur votre situation au travail ?"
+
+
+def is_json_request(payload: dict) -> bool:
+    """Indique si la requête demande une réponse en mode response_format=json_object"""
+    return (payload.get("response_format") or {}).get("type") == "json_object"
+
+
+class FakeOpenAIServer:
+    """
+    Serveur HTTP multi-thread qui imite l'endpoint chat.completions d'OpenAI
+
+    Args:
+        latency (float | Callable[[dict], float]): Délai en secondes avant chaque réponse
+            (ou avant le premier token), ou fonction du corps de la requête qui le retourne
+        json_content (dict, optional): Contenu renvoyé en mode response_format=json_object
+        text_content (str, optional): Contenu renvoyé pour les appels en texte libre
+        token_delay (float): Délai entre deux morceaux lorsque le client demande stream=True
+        chunk_size (int): Nombre de caractères par morceau diffusé
+        invalid_json_rate (float): Part des réponses JSON tronquées (sortie invalide du modèle)
+        port (int): Port d'écoute (0 pour un port libre choisi par le système)
+        seed (int, optional): Graine du tirage des réponses invalides
+    """
+
+    def __init__(self, latency: float = 0.0, json_content: dict = None, text_content: str = None,
+                 token_delay: float = 0.0, chunk_size: int = 4, invalid_json_rate: float = 0.0,
+                 port: int = 0, seed: int = None):
+        self.latency = latency
+        self.invalid_json_rate = invalid_json_rate
+        self._random = random.Random(seed)
+        self.token_delay = token_delay
+        self.chunk_size = chunk_size
+        self.json_content = json_content if json_content is not None else DEFAULT_JSON_CONTENT
+        self.text_content = text_content if text_content is not None else DEFAULT_TEXT_CONTENT
+        self.request_count = 0
+        # Corps des dernières requêtes reçues, pour les vérifications des tests
+        self.payloads = deque(maxlen=100)
+        self._failures = []
+        self._lock = threading.Lock()
+        self._httpd = _Server(("127.0.0.1", port), self._make_handler())
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}/v1"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                with server._lock:
+                    server.request_count += 1
+                    server.payloads.append(payload)
+                    failure = server._failures.pop(0) if server._failures else None
+                if failure is not None:
+                    server.send_failure(self, *failure)
+                    return
+                delay = server.latency(payload) if callable(server.latency) else server.latency
+                if delay:
+                    time.sleep(delay)
+                server.handle_completion(self, payload)
+
+        return Handler
+
+    def fail_next(self, count: int, status: int = 429, retry_after: float = None) -> None:
+        """
+        Fait échouer les prochaines requêtes (429 = limite de débit atteinte)
+
+        Args:
+            count (int): Nombre de requêtes à faire échouer
+            status (int): Code HTTP renvoyé
+            retry_after (float, optional): Valeur de l'en-tête Retry-After en secondes
+        """
+        with self._lock:
+            self._failures.extend([(status, retry_after)] * count)
+
+    def send_failure(self, handler: BaseHTTPRequestHandler, status: int, retry_after: float = None) -> None:
+        body = json.dumps({
+            "error": {"message": "Simulated failure", "type": "fake_error", "code": str(status)}
+        }).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(body)))
+        if retry_after is not None:
+            handler.send_header("Retry-After", str(retry_after))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def completion_content(self, payload: dict) -> str:
+        """Contenu de la réponse selon le format demandé par le client"""
+        if is_json_request(payload):
+            content = json.dumps(self.json_content, ensure_ascii=False)
+            if self.invalid_json_rate and self._random.random() < self.invalid_json_rate:
+                # Sortie coupée au milieu de l'objet, comme une réponse interrompue
+                return content[:len(content) // 2]
+            return content
+        return self.text_content
+
+    def handle_completion(self, handler: BaseHTTPRequestHandler, payload: dict) -> None:
+        content = self.completion_content(payload)
+        if payload.get("stream"):
+            self.stream_completion(handler, payload, content)
+            return
+        body = json.dumps({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "gpt-3.5-turbo"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        }).encode("utf-8")
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def stream_completion(self, handler: BaseHTTPRequestHandler, payload: dict, content: str) -> None:
+        """Diffuse le contenu en chunks chat.completion.chunk, au format SSE d'OpenAI"""
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+
+        def send(data: str) -> None:
+            raw = f"data: {data}\n\n".encode("utf-8")
+            handler.wfile.write(f"{len(raw):x}\r\n".encode("ascii") + raw + b"\r\n")
+            handler.wfile.flush()
+
+        pieces = [content[i:i + self.chunk_size] for i in range(0, len(content), self.chunk_size)]
+        for index, piece in enumerate(pieces):
+            if index and self.token_delay:
+                time.sleep(self.token_delay)
+            send(json.dumps({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": payload.get("model", "gpt-3.5-turbo"),
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+            }))
+        send(json.dumps({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": payload.get("model", "gpt-3.5-turbo"),
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+        }))
+        send("[DONE]")
+        handler.wfile.write(b"0\r\n\r\n")
+        handler.wfile.flush()
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.5, help="Délai avant chaque réponse (s)")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Délai entre deux morceaux diffusés (s)")
+    parser.add_argument("--invalid-json-rate", type=float, default=0.0, help="Part des réponses JSON tronquées")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(latency=args.latency, token_delay=args.token_delay,
+                              invalid_json_rate=args.invalid_json_rate, port=args.port)
+    print(f"Fake OpenAI server listening on {server.base_url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
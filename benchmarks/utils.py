@@ -0,0 +1,98 @@
+"""
+Fonctions communes aux scripts de benchmark
+"""
+import os
+import statistics
+import sys
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django(openai_base_url: str = None) -> None:
+    """
+    Configure Django pour un script lancé hors de manage.py
+
+    Args:
+        openai_base_url (str, optional): URL du serveur OpenAI factice à utiliser
+    """
+    if str(BASE_DIR) not in sys.path:
+        sys.path.insert(0, str(BASE_DIR))
+    if openai_base_url:
+        os.environ["OPENAI_BASE_URL"] = openai_base_url
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "wellbeing_chatbot.settings")
+
+    import django
+    django.setup()
+
+
+@contextmanager
+def temporary_database():
+    """
+    Base SQLite temporaire (fichier, migrations appliquées) pour un benchmark
+
+    À utiliser après setup_django ; la base est supprimée à la sortie du bloc.
+    """
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    connection.settings_dict["TEST"]["NAME"] = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def summarize_latencies(latencies: List[float]) -> Dict[str, float]:
+    """Retourne les percentiles p50/p95/p99 (en millisecondes) d'une série de latences"""
+    ordered = sorted(latencies)
+
+    def percentile(p: float) -> float:
+        index = min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))
+        return ordered[index] * 1000
+
+    return {
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+    }
+
+
+def query_plan(connection, sql: str) -> List[str]:
+    """Étapes du plan d'exécution SQLite (EXPLAIN QUERY PLAN) d'une requête"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def plan_problems(connection, queries: List[Dict], tables: List[str]) -> List[Tuple[str, str]]:
+    """
+    Repère les parcours complets et les tris temporaires sur les tables surveillées
+
+    Args:
+        connection: Connexion Django (SQLite)
+        queries (List[Dict]): Requêtes capturées (CaptureQueriesContext.captured_queries)
+        tables (List[str]): Tables qui doivent être lues par index
+
+    Returns:
+        List[Tuple[str, str]]: (requête, étape du plan) pour chaque problème détecté
+    """
+    problems = []
+    for query in queries:
+        sql = query["sql"]
+        if not sql.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "INSERT")):
+            continue
+        watched = [table for table in tables if f'"{table}"' in sql]
+        if not watched:
+            continue
+        for detail in query_plan(connection, sql):
+            if any(detail.startswith(f"SCAN {table}") for table in watched) or detail.startswith("USE TEMP B-TREE"):
+                problems.append((sql, detail))
+    return problems
@@ -0,0 +1,245 @@
+"""
+Backends d'analyse des messages : extraction des mots violents et du scopeflag
+
+OpenAIAnalysisBackend délègue l'analyse au modèle (dans l'appel combiné de
+services.analyze_message). LexiconAnalysisBackend l'effectue localement, sans
+réseau, à partir d'un modèle compact (lexique de n-grammes et classifieur linéaire
+du hors-sujet) entraîné sur des analyses journalisées avec la commande
+train_analysis_model. Le modèle n'est alors utilisé que pour la réponse.
+
+Configuration (settings.CHATBOT_ANALYSIS_BACKEND) :
+    BACKEND  Chemin de la classe du backend
+    OPTIONS  Arguments passés au constructeur (path pour LexiconAnalysisBackend)
+    LOG      Fichier JSONL où journaliser les analyses du modèle (données d'entraînement)
+"""
+import json
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .keyword_matcher import fold_text
+
+_WORD = re.compile(r'\w+')
+
+
+class AnalysisBackend:
+    """
+    Interface des backends d'analyse
+
+    combined_with_reply indique que l'analyse est produite par le même appel au
+    modèle que la réponse (format JSON, voir prompts.PromptSet.analysis) ; sinon services
+    demande une réponse seule au modèle et appelle analyze() localement.
+    """
+
+    combined_with_reply = False
+
+    def analyze(self, message: str) -> Dict:
+        """
+        Analyse un message
+
+        Args:
+            message (str): Le message à analyser
+
+        Returns:
+            Dict: "violent_words" (List[str]) et "scopeflag" (bool, True = hors sujet)
+
+        Raises:
+            Exception: Si l'analyse n'est pas disponible (modèle injoignable) ; l'appelant
+                n'enregistre alors pas les statistiques du message
+        """
+        raise NotImplementedError
+
+    async def aanalyze(self, message: str) -> Dict:
+        """Version asynchrone de analyze (par défaut analyze, sans entrée-sortie pour un backend local)"""
+        return self.analyze(message)
+
+
+class OpenAIAnalysisBackend(AnalysisBackend):
+    """Analyse par le modèle OpenAI (comportement historique)"""
+
+    combined_with_reply = True
+
+    def analyze(self, message: str) -> Dict:
+        from . import llm, prompts
+
+        analysis_text = llm.get_gateway().complete(
+            prompts.violent_words_messages(message),
+            model="gpt-3.5-turbo",
+            temperature=0.3
+        )
+        return self._parse(analysis_text)
+
+    async def aanalyze(self, message: str) -> Dict:
+        from . import llm, prompts
+
+        analysis_text = await llm.get_gateway().acomplete(
+            prompts.violent_words_messages(message),
+            model="gpt-3.5-turbo",
+            temperature=0.3
+        )
+        return self._parse(analysis_text)
+
+    @staticmethod
+    def _parse(analysis_text: str) -> Dict:
+        """Mots violents de la réponse du modèle (un par ligne, ou AUCUN)"""
+        analysis_text = analysis_text.strip()
+        if "AUCUN" in analysis_text:
+            violent_words = []
+        else:
+            # Diviser la réponse en lignes et nettoyer
+            violent_words = [word.strip() for word in analysis_text.split('\n') if word.strip()]
+
+        return {"violent_words": violent_words, "scopeflag": False}
+
+
+class LexiconAnalysisBackend(AnalysisBackend):
+    """
+    Analyse locale à partir d'un modèle entraîné par train_analysis_model
+
+    Les mots violents sont les n-grammes du message présents dans le lexique ; le
+    scopeflag est prédit par une régression logistique sur les mots du message.
+
+    Args:
+        path (str): Chemin du fichier JSON du modèle
+    """
+
+    def __init__(self, path: str):
+        with open(path, encoding="utf-8") as model_file:
+            model = json.load(model_file)
+        self.lexicon = model["lexicon"]
+        self.max_ngram = model["max_ngram"]
+        self.scope_weights = model["scope"]["weights"]
+        self.scope_bias = model["scope"]["bias"]
+
+    def analyze(self, message: str) -> Dict:
+        matches = list(_WORD.finditer(message))
+        tokens = [fold_text(match.group()) for match in matches]
+
+        violent_words = []
+        seen = set()
+        for start in range(len(tokens)):
+            for size in range(min(self.max_ngram, len(tokens) - start), 0, -1):
+                ngram = " ".join(tokens[start:start + size])
+                if ngram in self.lexicon and ngram not in seen:
+                    seen.add(ngram)
+                    # Restituer l'expression telle qu'écrite dans le message
+                    violent_words.append(message[matches[start].start():matches[start + size - 1].end()])
+                    break
+
+        score = self.scope_bias + sum(self.scope_weights.get(token, 0.0) for token in set(tokens))
+        return {"violent_words": violent_words, "scopeflag": score > 0}
+
+
+def tokenize(message: str) -> List[str]:
+    """Mots du message, sans casse ni accents"""
+    return [fold_text(word) for word in _WORD.findall(message)]
+
+
+def train_model(examples: Iterable[Dict], max_ngram: int = 3, min_count: int = 2, min_precision: float = 0.5,
+                epochs: int = 10, learning_rate: float = 0.1, l2: float = 1e-4) -> Dict:
+    """
+    Entraîne un modèle pour LexiconAnalysisBackend à partir d'analyses journalisées
+
+    Args:
+        examples (Iterable[Dict]): Analyses avec "message", "violent_words" et "scopeflag"
+        max_ngram (int): Longueur maximale des expressions du lexique
+        min_count (int): Nombre minimal de messages où l'expression a été signalée
+        min_precision (float): Part minimale des occurrences de l'expression signalées comme violentes
+        epochs (int): Nombre de passes de la régression logistique du scopeflag
+        learning_rate (float): Pas de la descente de gradient
+        l2 (float): Régularisation des poids
+
+    Returns:
+        Dict: Modèle sérialisable en JSON
+    """
+    labelled = Counter()
+    occurrences = Counter()
+    scope_examples = []
+    for example in examples:
+        tokens = tokenize(example["message"])
+        ngrams = {
+            " ".join(tokens[start:start + size])
+            for size in range(1, max_ngram + 1)
+            for start in range(len(tokens) - size + 1)
+        }
+        occurrences.update(ngrams)
+        for word in example.get("violent_words", []):
+            ngram = " ".join(tokenize(word))
+            if ngram in ngrams and len(ngram.split()) <= max_ngram:
+                labelled[ngram] += 1
+        scope_examples.append((set(tokens), 1.0 if example.get("scopeflag") else 0.0))
+
+    lexicon = {
+        ngram: round(count / occurrences[ngram], 3)
+        for ngram, count in labelled.items()
+        if count >= min_count and count / occurrences[ngram] >= min_precision
+    }
+
+    # Régression logistique par descente de gradient stochastique
+    weights = defaultdict(float)
+    bias = 0.0
+    for _ in range(epochs):
+        for tokens, label in scope_examples:
+            score = bias + sum(weights[token] for token in tokens)
+            prediction = 1.0 / (1.0 + math.exp(-max(min(score, 30.0), -30.0)))
+            gradient = prediction - label
+            bias -= learning_rate * gradient
+            for token in tokens:
+                weights[token] -= learning_rate * (gradient + l2 * weights[token])
+
+    return {
+        "version": 1,
+        "max_ngram": max_ngram,
+        "lexicon": lexicon,
+        "scope": {
+            "bias": round(bias, 4),
+            "weights": {token: round(weight, 4) for token, weight in weights.items() if abs(weight) >= 1e-3}
+        }
+    }
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_log_lock = threading.Lock()
+
+
+def get_config() -> Dict:
+    """Configuration du backend d'analyse, OpenAI par défaut"""
+    return {
+        'BACKEND': 'chatbot.analysis_backends.OpenAIAnalysisBackend',
+        'OPTIONS': {},
+        'LOG': None,
+        **getattr(settings, 'CHATBOT_ANALYSIS_BACKEND', {})
+    }
+
+
+def get_analysis_backend() -> AnalysisBackend:
+    """Retourne le backend configuré, instancié (et son modèle chargé) une seule fois"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                config = get_config()
+                _backend = import_string(config['BACKEND'])(**config['OPTIONS'])
+    return _backend
+
+
+def log_analysis(message: str, violent_words: List[str], scopeflag: bool) -> None:
+    """
+    Journalise une analyse du modèle pour l'entraînement du backend local
+
+    Désactivé par défaut : le fichier contient le texte des messages (sans
+    identifiant d'employé) et doit être traité comme une donnée personnelle.
+    """
+    path = get_config()['LOG']
+    if not path:
+        return
+    line = json.dumps({"message": message, "violent_words": violent_words, "scopeflag": scopeflag}, ensure_ascii=False)
+    with _log_lock:
+        with open(path, "a", encoding="utf-8") as log_file:
+            log_file.write(line + "\n")
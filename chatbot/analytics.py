@@ -0,0 +1,383 @@
+"""
+Entrepôt analytique pseudonymisé des mots violents et des thématiques
+
+Les analyses RH ne lisent pas les tables Employee, ViolentWord et
+EmployeeThemeCounter : export_analytics copie les nouvelles occurrences de mots
+violents (clés supérieures au dernier export) dans des fichiers colonnes en ajout
+seul, partitionnés par jour de détection, puis ajoute une photographie des
+compteurs de chaque employé (mots, mots violents, thématiques).
+
+Les employés n'y figurent que sous un pseudonyme : les 8 premiers octets d'un
+HMAC-SHA256 de leur ID, calculé avec PSEUDONYM_KEY. Le même employé garde le même
+pseudonyme d'un export à l'autre, sans que l'ID puisse en être retrouvé sans la clé.
+La clé est obligatoire et distincte de SECRET_KEY, qui figure dans les sources.
+
+Chaque colonne est un tableau d'entiers de taille fixe (module array, ordre des
+octets de la machine), lu d'un bloc par numpy.fromfile, sans base ni instanciation
+de modèles. Les agrégats sont vectorisés avec NumPy : les occurrences référencent
+les mots et les pseudonymes par des codes denses (4 octets), comptés en une passe
+par numpy.bincount.
+
+Disposition du dossier :
+    state.json                                 Dernière clé exportée, dictionnaires des mots et des pseudonymes
+    events/day=AAAA-MM-JJ/part-<id>.employee   Code du pseudonyme de l'employé (I) par occurrence
+    events/day=AAAA-MM-JJ/part-<id>.word       Code du mot violent (I)
+    snapshots/<horodatage>/employees.*         pseudo (q), total_words (q), violent_words (q)
+    snapshots/<horodatage>/themes.*            pseudo (q), theme (q), count (q), et themes.json
+
+L'export doit précéder l'archivage des mots violents (voir retention) : les
+occurrences supprimées de la base avant d'avoir été exportées n'y figureront pas.
+
+Configuration (settings.CHATBOT_ANALYTICS) :
+    DIR            Dossier de l'entrepôt
+    PSEUDONYM_KEY  Clé des pseudonymes, obligatoire pour l'export (variable
+                   d'environnement CHATBOT_PSEUDONYM_KEY)
+    BATCH_SIZE     Occurrences lues par requête lors de l'export
+"""
+import hashlib
+import hmac
+import json
+import os
+from array import array
+from collections import Counter
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+
+from .models import Employee, EmployeeThemeCounter, PsychologicalTheme, ViolentWord
+
+DEFAULTS = {
+    'DIR': None,
+    'PSEUDONYM_KEY': None,
+    'BATCH_SIZE': 50000,
+}
+
+# Colonnes de chaque table : nom -> code de type du module array
+EVENT_COLUMNS = {"employee": "I", "word": "I"}
+EMPLOYEE_COLUMNS = {"pseudo": "q", "total_words": "q", "violent_words": "q"}
+THEME_COLUMNS = {"pseudo": "q", "theme": "q", "count": "q"}
+
+
+def get_config() -> Dict:
+    """Retourne la configuration de l'entrepôt analytique, complétée par les valeurs par défaut"""
+    return {**DEFAULTS, **getattr(settings, 'CHATBOT_ANALYTICS', {})}
+
+
+class Pseudonymizer:
+    """
+    Pseudonymes stables des employés (HMAC-SHA256 de l'ID, tronqué à 63 bits)
+
+    Args:
+        key (str, optional): Clé secrète (par défaut PSEUDONYM_KEY)
+
+    Raises:
+        ImproperlyConfigured: Si aucune clé n'est fournie ni configurée
+    """
+
+    def __init__(self, key: str = None):
+        key = key or get_config()['PSEUDONYM_KEY']
+        if not key:
+            raise ImproperlyConfigured(
+                "CHATBOT_ANALYTICS['PSEUDONYM_KEY'] is not set (CHATBOT_PSEUDONYM_KEY environment variable)"
+            )
+        self._key = key.encode("utf-8")
+        self._cache: Dict[int, int] = {}
+
+    def __call__(self, employee_id: int) -> int:
+        pseudo = self._cache.get(employee_id)
+        if pseudo is None:
+            digest = hmac.new(self._key, str(employee_id).encode("ascii"), hashlib.sha256).digest()
+            # 63 bits : la valeur tient dans un entier signé (code de type q)
+            pseudo = self._cache[employee_id] = int.from_bytes(digest[:8], "little") >> 1
+        return pseudo
+
+
+def _write_columns(directory: Path, stem: str, columns: Dict[str, array]) -> None:
+    """Écrit les colonnes d'une table sous des noms temporaires, puis les renomme"""
+    for name, values in columns.items():
+        path = directory / f"{stem}.{name}"
+        temporary = path.with_name(path.name + ".tmp")
+        with open(temporary, "wb") as column_file:
+            values.tofile(column_file)
+        os.replace(temporary, path)
+
+
+def _read_column(path, typecode: str) -> np.ndarray:
+    """
+    Colonne lue d'un bloc dans un tableau NumPy
+
+    Les codes de type du module array (I, q) sont aussi ceux de NumPy. Les fichiers
+    de partition sont petits et nombreux : une lecture directe coûte moins qu'une
+    projection en mémoire (numpy.memmap) par fichier.
+    """
+    return np.fromfile(path, dtype=typecode)
+
+
+def _read_table(directory, stem: str, columns: Dict[str, str]) -> Dict:
+    return {name: _read_column(os.path.join(directory, f"{stem}.{name}"), typecode) for name, typecode in columns.items()}
+
+
+def _load_state(root: Path) -> Dict:
+    try:
+        with open(root / "state.json", encoding="utf-8") as state_file:
+            return json.load(state_file)
+    except FileNotFoundError:
+        return {"last_violent_word_id": 0, "words": [], "pseudonyms": []}
+
+
+def _save_state(root: Path, state: Dict) -> None:
+    temporary = root / "state.json.tmp"
+    with open(temporary, "w", encoding="utf-8") as state_file:
+        json.dump(state, state_file, ensure_ascii=False)
+    os.replace(temporary, root / "state.json")
+
+
+def _export_events(root: Path, state: Dict, pseudonymize: Pseudonymizer, batch_size: int) -> Tuple[int, int]:
+    """Ajoute les occurrences postérieures au dernier export, lot par lot"""
+    codes = {word: code for code, word in enumerate(state["words"])}
+    employee_codes = {pseudo: code for code, pseudo in enumerate(state["pseudonyms"])}
+    rows = files = 0
+    while True:
+        batch = list(
+            ViolentWord.objects.filter(id__gt=state["last_violent_word_id"])
+            .order_by('id')
+            .values_list('id', 'employee_id', 'word', 'timestamp')[:batch_size]
+        )
+        if not batch:
+            return rows, files
+
+        partitions: Dict[date, Tuple[int, array, array]] = {}
+        for word_id, employee_id, word, timestamp in batch:
+            day = timezone.localdate(timestamp) if timezone.is_aware(timestamp) else timestamp.date()
+            if day not in partitions:
+                partitions[day] = (word_id, array(EVENT_COLUMNS["employee"]), array(EVENT_COLUMNS["word"]))
+            _, employees, words = partitions[day]
+            code = codes.get(word)
+            if code is None:
+                code = codes[word] = len(state["words"])
+                state["words"].append(word)
+            pseudo = pseudonymize(employee_id)
+            employee_code = employee_codes.get(pseudo)
+            if employee_code is None:
+                employee_code = employee_codes[pseudo] = len(state["pseudonyms"])
+                state["pseudonyms"].append(pseudo)
+            employees.append(employee_code)
+            words.append(code)
+
+        for day, (first_id, employees, words) in partitions.items():
+            directory = root / "events" / f"day={day.isoformat()}"
+            directory.mkdir(parents=True, exist_ok=True)
+            _write_columns(directory, f"part-{first_id:012d}", {"employee": employees, "word": words})
+        # Le point de reprise n'avance qu'une fois les fichiers du lot écrits
+        state["last_violent_word_id"] = batch[-1][0]
+        _save_state(root, state)
+        rows += len(batch)
+        files += len(partitions)
+
+
+def _export_snapshot(root: Path, pseudonymize: Pseudonymizer) -> Path:
+    """Ajoute une photographie des compteurs des employés et de leurs thématiques"""
+    employees = {name: array(typecode) for name, typecode in EMPLOYEE_COLUMNS.items()}
+    for employee_id, total_words, violent_words in Employee.objects.order_by().values_list(
+        'id', 'total_words_count', 'violent_words_count'
+    ).iterator(chunk_size=10000):
+        employees["pseudo"].append(pseudonymize(employee_id))
+        employees["total_words"].append(total_words)
+        employees["violent_words"].append(violent_words)
+
+    themes = {name: array(typecode) for name, typecode in THEME_COLUMNS.items()}
+    for employee_id, theme_id, count in EmployeeThemeCounter.objects.filter(count__gt=0).order_by(
+        'employee_id'
+    ).values_list('employee_id', 'theme_id', 'count').iterator(chunk_size=10000):
+        themes["pseudo"].append(pseudonymize(employee_id))
+        themes["theme"].append(theme_id)
+        themes["count"].append(count)
+
+    name = timezone.now().strftime("%Y-%m-%dT%H%M%S.%f")
+    temporary = root / "snapshots" / f".{name}.tmp"
+    temporary.mkdir(parents=True)
+    _write_columns(temporary, "employees", employees)
+    _write_columns(temporary, "themes", themes)
+    with open(temporary / "themes.json", "w", encoding="utf-8") as names_file:
+        json.dump(dict(PsychologicalTheme.objects.values_list('id', 'name')), names_file, ensure_ascii=False)
+    # Le dossier n'apparaît sous son nom définitif qu'une fois complet
+    path = root / "snapshots" / name
+    os.replace(temporary, path)
+    return path
+
+
+def export_analytics(directory=None, batch_size: int = None, pseudonym_key: str = None) -> Dict:
+    """
+    Ajoute à l'entrepôt les nouvelles occurrences de mots violents et une photographie des compteurs
+
+    Args:
+        directory (optional): Dossier de l'entrepôt (par défaut DIR)
+        batch_size (int, optional): Occurrences lues par requête (par défaut BATCH_SIZE)
+        pseudonym_key (str, optional): Clé des pseudonymes (par défaut PSEUDONYM_KEY)
+
+    Returns:
+        Dict: "events" (occurrences ajoutées), "files" (partitions écrites) et "snapshot" (dossier)
+
+    Raises:
+        ValueError: Si aucun dossier n'est configuré ou batch_size n'est pas positif
+        ImproperlyConfigured: Si aucune clé des pseudonymes n'est configurée
+    """
+    config = get_config()
+    directory = directory or config['DIR']
+    batch_size = batch_size or config['BATCH_SIZE']
+    if not directory:
+        raise ValueError("No analytics directory configured")
+    if batch_size < 1:
+        raise ValueError("Batch size must be positive")
+
+    pseudonymize = Pseudonymizer(pseudonym_key)
+    root = Path(directory)
+    root.mkdir(parents=True, exist_ok=True)
+    rows, files = _export_events(root, _load_state(root), pseudonymize, batch_size)
+    snapshot = _export_snapshot(root, pseudonymize)
+    return {"events": rows, "files": files, "snapshot": snapshot}
+
+
+def _quantile(ordered: np.ndarray, q: float) -> float:
+    if not len(ordered):
+        return 0.0
+    return float(ordered[min(int(q * len(ordered)), len(ordered) - 1)])
+
+
+class AnalyticsStore:
+    """
+    Lecture et agrégats de l'entrepôt analytique, sans accès à la base
+
+    Args:
+        directory (optional): Dossier de l'entrepôt (par défaut DIR)
+    """
+
+    def __init__(self, directory=None):
+        self.root = Path(directory or get_config()['DIR'])
+        state = _load_state(self.root)
+        self.words: List[str] = state["words"]
+        self.pseudonyms: List[int] = state["pseudonyms"]
+        self._pseudonyms = np.array(self.pseudonyms, dtype=np.int64)
+
+    def event_partitions(self, start: date = None, end: date = None, columns=tuple(EVENT_COLUMNS)) -> Iterator[Dict]:
+        """
+        Colonnes des partitions d'occurrences dont le jour est dans [start, end]
+
+        Args:
+            start (date, optional): Premier jour inclus
+            end (date, optional): Dernier jour inclus
+            columns: Colonnes lues ("employee", "word")
+
+        Yields:
+            Dict: Colonnes demandées d'un fichier de partition
+        """
+        wanted = {name: EVENT_COLUMNS[name] for name in columns}
+        events = self.root / "events"
+        # os.listdir plutôt que Path.glob : un dossier par jour, parcourus à chaque requête
+        for partition in sorted(os.listdir(events) if events.is_dir() else []):
+            day = date.fromisoformat(partition[len("day="):])
+            if (start and day < start) or (end and day > end):
+                continue
+            # Chemins en str : une requête ouvre des centaines de fichiers
+            directory = os.path.join(events, partition)
+            for name in sorted(os.listdir(directory)):
+                if name.endswith(".word"):
+                    yield _read_table(directory, name[:-len(".word")], wanted)
+
+    def latest_snapshot(self) -> Optional[Path]:
+        """Dossier de la dernière photographie des compteurs (None si aucune)"""
+        snapshots = sorted(path for path in (self.root / "snapshots").glob("[!.]*") if path.is_dir())
+        return snapshots[-1] if snapshots else None
+
+    def _count_codes(self, column: str, codes: int, start: date = None, end: date = None) -> np.ndarray:
+        """Occurrences de chaque code d'une colonne des partitions de la période"""
+        parts = [columns[column] for columns in self.event_partitions(start, end, (column,))]
+        if not parts:
+            return np.zeros(codes, dtype=np.int64)
+        return np.bincount(np.concatenate(parts), minlength=codes)
+
+    def violent_words_by_employee(self, start: date = None, end: date = None) -> Counter:
+        """Nombre d'occurrences par pseudonyme sur la période"""
+        counts = self._count_codes("employee", len(self.pseudonyms), start, end)
+        codes = np.flatnonzero(counts)
+        return Counter(dict(zip(self._pseudonyms[codes].tolist(), counts[codes].tolist())))
+
+    def word_frequencies(self, start: date = None, end: date = None, limit: int = 20) -> List[Tuple[str, int]]:
+        """Mots violents les plus fréquents sur la période"""
+        counts = self._count_codes("word", len(self.words), start, end)
+        top = np.argsort(-counts, kind="stable")[:limit]
+        return [(self.words[code], int(counts[code])) for code in top.tolist() if counts[code]]
+
+    def ratio_distribution(self, bins: int = 10, upper: float = 0.1) -> Dict:
+        """
+        Distribution des ratios de mots violents (voir Employee.violent_words_ratio)
+        parmi les employés de la dernière photographie qui ont écrit au moins un mot
+
+        Args:
+            bins (int): Nombre d'intervalles de l'histogramme entre 0 et upper
+            upper (float): Borne haute de l'histogramme (les ratios supérieurs sont
+                comptés dans le dernier intervalle)
+
+        Returns:
+            Dict: "employees", "mean", "p50", "p90", "p99" et "histogram" (bornes et effectifs)
+        """
+        snapshot = self.latest_snapshot()
+        if snapshot is None:
+            return {"employees": 0, "mean": 0.0, "p50": 0.0, "p90": 0.0, "p99": 0.0, "histogram": []}
+        columns = _read_table(snapshot, "employees", EMPLOYEE_COLUMNS)
+        total = columns["total_words"]
+        written = total > 0
+        ratios = np.sort(columns["violent_words"][written] / total[written])
+        edges = upper * np.arange(1, bins) / bins
+        histogram = np.bincount(np.minimum(np.searchsorted(edges, ratios, side="right"), bins - 1), minlength=bins)
+        return {
+            "employees": len(ratios),
+            "mean": round(float(ratios.mean()), 4) if len(ratios) else 0.0,
+            "p50": round(_quantile(ratios, 0.5), 4),
+            "p90": round(_quantile(ratios, 0.9), 4),
+            "p99": round(_quantile(ratios, 0.99), 4),
+            "histogram": [
+                {"from": round(upper * index / bins, 4), "employees": int(histogram[index])}
+                for index in range(bins)
+            ],
+        }
+
+    def theme_cooccurrence(self, limit: int = 20) -> List[Tuple[str, str, int]]:
+        """
+        Paires de thématiques détectées chez un même employé, par nombre d'employés
+
+        Les lignes de la photographie forment une matrice employés x thématiques (1 si
+        la thématique a été détectée) : le produit de sa transposée par elle-même
+        donne en une opération le nombre d'employés de chaque paire.
+
+        Returns:
+            List[Tuple[str, str, int]]: (thématique, thématique, employés) par effectif décroissant
+        """
+        snapshot = self.latest_snapshot()
+        if snapshot is None:
+            return []
+        columns = _read_table(snapshot, "themes", THEME_COLUMNS)
+        with open(snapshot / "themes.json", encoding="utf-8") as names_file:
+            names = {int(theme_id): name for theme_id, name in json.load(names_file).items()}
+
+        pseudos, rows = np.unique(columns["pseudo"], return_inverse=True)
+        theme_ids, cols = np.unique(columns["theme"], return_inverse=True)
+        matrix = np.zeros((len(pseudos), len(theme_ids)), dtype=np.int32)
+        matrix[rows, cols] = 1
+        cooccurrence = matrix.T @ matrix
+
+        first, second = np.triu_indices(len(theme_ids), k=1)
+        employees = cooccurrence[first, second]
+        top = np.argsort(-employees, kind="stable")[:limit]
+        theme_ids = theme_ids.tolist()
+        return [
+            (names.get(theme_ids[first[pair]], str(theme_ids[first[pair]])),
+             names.get(theme_ids[second[pair]], str(theme_ids[second[pair]])),
+             int(employees[pair]))
+            for pair in top.tolist() if employees[pair]
+        ]
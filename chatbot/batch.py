@@ -0,0 +1,243 @@
+"""
+Analyse par lots de messages au format JSONL (/chat/batch/ et analyze_messages)
+
+Chaque ligne est un objet JSON dont le texte est dans "message" (ou "body", comme
+dans requests.jsonl), avec optionnellement "employee_id" et un identifiant ("id"
+ou "request_id"). Les appels au modèle sont lancés en parallèle avec une
+concurrence bornée. Les erreurs transitoires (limite de débit, connexion, erreur
+serveur) sont réessayées avec un recul exponentiel qui respecte l'en-tête
+Retry-After, et une limite de débit suspend tous les appels du lot.
+
+Les statistiques des employés ne sont écrites que sur demande (write_stats) :
+elles s'ajoutent alors aux compteurs existants (employés, thématiques, agrégats),
+agrégées puis écrites en une transaction par tranche. Ré-analyser des messages
+déjà comptés les compterait deux fois ; sans write_stats, seuls les résultats de
+l'analyse sont renvoyés.
+
+Configuration (settings.CHATBOT_BATCH) :
+    CONCURRENCY       Nombre maximal d'appels simultanés au modèle
+    MAX_RETRIES       Nombre de réessais d'un message
+    RETRY_BASE_DELAY  Délai initial du recul exponentiel (secondes)
+    CHUNK_SIZE        Messages par tranche (écriture des statistiques, point de reprise)
+    MAX_ITEMS         Nombre maximal de lignes acceptées par /chat/batch/
+"""
+import asyncio
+import json
+import logging
+import random
+import sys
+from typing import AsyncIterator, Dict, Iterable, List, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import llm, services, theme_index
+from .stats_buffer import StatsBuffer
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'CONCURRENCY': 8,
+    'MAX_RETRIES': 4,
+    'RETRY_BASE_DELAY': 1.0,
+    'CHUNK_SIZE': 200,
+    'MAX_ITEMS': 1000,
+}
+
+def get_config() -> Dict:
+    """Retourne la configuration des lots, complétée par les valeurs par défaut"""
+    return {**DEFAULTS, **getattr(settings, 'CHATBOT_BATCH', {})}
+
+
+def parse_line(line: str, line_number: int) -> Dict:
+    """
+    Lit une ligne JSONL
+
+    Args:
+        line (str): Ligne du fichier
+        line_number (int): Numéro de la ligne (à partir de 1)
+
+    Returns:
+        Dict: "line", "id", "message" et "employee_id"
+
+    Raises:
+        ValueError: Si la ligne n'est pas un objet JSON avec un message
+        TypeError: Si employee_id n'est ni un entier ni une chaîne de chiffres
+    """
+    item = json.loads(line)
+    if not isinstance(item, dict):
+        raise ValueError("Objet JSON attendu")
+    message = item.get("message", item.get("body"))
+    if not isinstance(message, str) or not message.strip():
+        raise ValueError('Champ "message" manquant')
+    employee_id = item.get("employee_id")
+    if employee_id in (None, ""):
+        employee_id = None
+    elif isinstance(employee_id, str) and employee_id.isascii() and employee_id.isdigit():
+        employee_id = int(employee_id)
+    elif not isinstance(employee_id, int) or isinstance(employee_id, bool):
+        raise TypeError(f"employee_id invalide : {employee_id!r}")
+    return {
+        "line": line_number,
+        "id": item.get("id", item.get("request_id", line_number)),
+        "message": message,
+        "employee_id": employee_id
+    }
+
+
+class BatchAnalyzer:
+    """
+    Analyse des tranches de messages en parallèle et écrit, sur demande, leurs statistiques
+
+    Args:
+        concurrency (int): Nombre maximal d'appels simultanés au modèle
+        max_retries (int): Nombre de réessais d'un message en cas d'erreur transitoire
+        retry_base_delay (float): Délai initial du recul exponentiel (secondes)
+        use_cache (bool): Utiliser le cache de complétions
+        write_stats (bool): Ajouter les statistiques des messages aux compteurs des employés
+    """
+
+    def __init__(self, concurrency: int = 8, max_retries: int = 4, retry_base_delay: float = 1.0,
+                 use_cache: bool = True, write_stats: bool = False):
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.use_cache = use_cache
+        self.write_stats = write_stats
+        self.processed = 0
+        self.failed = 0
+        self.retries = 0
+        # Tampon non démarré : les statistiques sont écrites explicitement à chaque tranche
+        self._stats = StatsBuffer(max_pending=sys.maxsize)
+        self._semaphore = None
+        self._resume_at = 0.0
+        self._themes = None
+
+    @classmethod
+    def from_settings(cls, **overrides) -> 'BatchAnalyzer':
+        """Crée un analyseur selon settings.CHATBOT_BATCH"""
+        config = get_config()
+        options = {
+            'concurrency': config['CONCURRENCY'],
+            'max_retries': config['MAX_RETRIES'],
+            'retry_base_delay': config['RETRY_BASE_DELAY'],
+        }
+        options.update({key: value for key, value in overrides.items() if value is not None})
+        return cls(**options)
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        response = getattr(error, "response", None)
+        if response is not None:
+            try:
+                return float(response.headers.get("retry-after"))
+            except (TypeError, ValueError):
+                pass
+        return self.retry_base_delay * 2 ** attempt * random.uniform(0.5, 1.0)
+
+    async def _complete(self, message: str, scan: Dict) -> Dict:
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            # Limite de débit atteinte par un autre message du lot : attendre avant d'appeler
+            pause = self._resume_at - loop.time()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            try:
+                async with self._semaphore:
+                    return await services.complete_llm_result_async(message, scan, self.use_cache)
+            except llm.retryable_errors() as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._retry_delay(e, attempt)
+                if llm.is_rate_limit(e):
+                    self._resume_at = max(self._resume_at, loop.time() + delay)
+                logger.warning(f"Retrying message after {type(e).__name__} in {delay:.2f}s")
+                self.retries += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def analyze_item(self, item: Dict) -> Dict:
+        """
+        Analyse un message et, avec write_stats, ajoute ses statistiques à la tranche en cours
+
+        Returns:
+            Dict: "line", "id" et "result", ou "error" si l'analyse a échoué
+        """
+        message = item["message"]
+        try:
+            scan = services.scan_message(message, themes=self._themes)
+            result = await services.aclassify_locally(message, scan)
+            if result is None:
+                result = await self._complete(message, scan)
+        except Exception as e:
+            logger.error(f"Batch analysis failed for line {item['line']}: {str(e)}")
+            self.failed += 1
+            return {"line": item["line"], "id": item["id"], "error": str(e)}
+
+        stats = None
+        if self.write_stats and item["employee_id"]:
+            stats = services.stats_for_message(result, message, scan)
+        if stats is not None:
+            self._stats.add(item["employee_id"], *stats)
+        self.processed += 1
+        return {"line": item["line"], "id": item["id"], "result": result}
+
+    async def analyze_chunk(self, lines: List[Tuple[int, str]]) -> List[Dict]:
+        """
+        Analyse une tranche de lignes puis écrit ses statistiques (avec write_stats) en une transaction
+
+        Args:
+            lines (List[Tuple[int, str]]): Numéros et contenus des lignes
+
+        Returns:
+            List[Dict]: Résultats, dans l'ordre des lignes
+
+        Raises:
+            RuntimeError: Si les statistiques n'ont pas pu être écrites
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._themes = await theme_index.aget_theme_index()
+
+        entries = {}
+        items = []
+        for line_number, line in lines:
+            try:
+                items.append(parse_line(line, line_number))
+            except (TypeError, ValueError) as e:
+                self.failed += 1
+                entries[line_number] = {"line": line_number, "error": str(e)}
+
+        for entry in await asyncio.gather(*(self.analyze_item(item) for item in items)):
+            entries[entry["line"]] = entry
+
+        await sync_to_async(self._stats.flush)()
+        if self._stats.pending_messages:
+            raise RuntimeError("Impossible d'écrire les statistiques du lot")
+        return [entries[line_number] for line_number in sorted(entries)]
+
+
+async def analyze_lines(lines: Iterable[str], analyzer: BatchAnalyzer, chunk_size: int,
+                        start: int = 0) -> AsyncIterator[Tuple[List[Dict], int]]:
+    """
+    Analyse des lignes JSONL par tranches
+
+    Args:
+        lines (Iterable[str]): Lignes à analyser, à partir de la ligne start
+        analyzer (BatchAnalyzer): Analyseur du lot
+        chunk_size (int): Nombre de messages par tranche
+        start (int): Nombre de lignes déjà traitées (reprise)
+
+    Yields:
+        Tuple[List[Dict], int]: Résultats de la tranche et nombre total de lignes traitées
+    """
+    chunk = []
+    consumed = yielded = start
+    for consumed, line in enumerate(lines, start + 1):
+        if line.strip():
+            chunk.append((consumed, line))
+        if len(chunk) >= chunk_size:
+            yield await analyzer.analyze_chunk(chunk), consumed
+            chunk, yielded = [], consumed
+    if consumed > yielded:
+        yield (await analyzer.analyze_chunk(chunk) if chunk else []), consumed
@@ -0,0 +1,208 @@
+"""
+Cache des complétions OpenAI pour les messages répétés ou quasi identiques
+
+La clé combine le message normalisé (casse, accents, ponctuation et espaces
+ignorés) et une empreinte des prompts : modifier un prompt ou changer de version
+(voir prompts.py) invalide donc naturellement les entrées existantes.
+
+Configuration (settings.CHATBOT_COMPLETION_CACHE) :
+    BACKEND  Chemin de la classe du cache (MemoryCompletionCache, SQLiteCompletionCache)
+    OPTIONS  Arguments passés au constructeur (max_entries, ttl, path...)
+"""
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .keyword_matcher import fold_text
+
+_PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+def normalize_message(message: str) -> str:
+    """
+    Normalise un message pour que les variantes triviales partagent la même entrée
+
+    Args:
+        message (str): Message de l'utilisateur
+
+    Returns:
+        str: Message sans casse, accents, ponctuation ni espaces superflus
+    """
+    return " ".join(_PUNCTUATION.sub(" ", fold_text(message)).split())
+
+
+def prompt_hash(*prompts: str) -> str:
+    """Empreinte des prompts utilisés pour produire une complétion"""
+    return hashlib.sha256("\0".join(prompts).encode("utf-8")).hexdigest()
+
+
+def make_key(message: str, prompts_hash: str) -> str:
+    """Clé de cache d'un message pour une version donnée des prompts"""
+    return hashlib.sha256(f"{prompts_hash}\0{normalize_message(message)}".encode("utf-8")).hexdigest()
+
+
+class BaseCompletionCache:
+    """
+    Interface commune des caches de complétions, avec compteurs de succès et d'échecs
+
+    Args:
+        max_entries (int): Nombre maximal d'entrées conservées (éviction LRU)
+        ttl (float): Durée de vie d'une entrée en secondes (None = illimitée)
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        """Retourne la complétion associée à la clé, ou None"""
+        content = self._get(key)
+        if content is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return content
+
+    def set(self, key: str, content: str) -> None:
+        """Enregistre une complétion"""
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        """Vide le cache"""
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def _get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def stats(self) -> Dict:
+        """Compteurs d'utilisation du cache"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0,
+            "size": len(self),
+        }
+
+
+class MemoryCompletionCache(BaseCompletionCache):
+    """Cache en mémoire du processus (LRU + TTL)"""
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600):
+        super().__init__(max_entries, ttl)
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            content, created = entry
+            if self._expired(created):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return content
+
+    def set(self, key: str, content: str) -> None:
+        with self._lock:
+            self._entries[key] = (content, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCompletionCache(BaseCompletionCache):
+    """
+    Cache persistant dans un fichier SQLite, partagé entre les workers d'une machine
+
+    Args:
+        path (str): Chemin du fichier SQLite
+        max_entries (int): Nombre maximal d'entrées conservées (éviction LRU)
+        ttl (float): Durée de vie d'une entrée en secondes (None = illimitée)
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000, ttl: float = 86400):
+        super().__init__(max_entries, ttl)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, timeout=5, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS completion_cache ("
+            "key TEXT PRIMARY KEY, content TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS completion_cache_accessed ON completion_cache (accessed)")
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT content, created FROM completion_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            content, created = row
+            if self._expired(created):
+                self._db.execute("DELETE FROM completion_cache WHERE key = ?", (key,))
+                return None
+            self._db.execute("UPDATE completion_cache SET accessed = ? WHERE key = ?", (time.time(), key))
+            return content
+
+    def set(self, key: str, content: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO completion_cache (key, content, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, content, now, now)
+            )
+            # Éviction des entrées les moins récemment utilisées au-delà de la capacité
+            self._db.execute(
+                "DELETE FROM completion_cache WHERE key IN ("
+                "SELECT key FROM completion_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM completion_cache")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM completion_cache").fetchone()[0]
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[BaseCompletionCache]:
+    """Retourne le cache configuré (None si settings.CHATBOT_COMPLETION_CACHE est absent)"""
+    global _cache
+    if _cache is None:
+        config = getattr(settings, 'CHATBOT_COMPLETION_CACHE', None)
+        if not config:
+            return None
+        with _cache_lock:
+            if _cache is None:
+                _cache = import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+    return _cache
@@ -0,0 +1,221 @@
+"""
+Mémoire des conversations : contexte envoyé au modèle dans un budget de tokens
+
+Chaque tour enregistre le message de l'utilisateur et la réponse, avec leur
+taille estimée localement. Le contexte d'un tour contient le résumé glissant des
+échanges anciens puis les messages les plus récents qui tiennent dans le budget.
+Les messages sortis de la fenêtre sont intégrés au résumé par lots (un appel de
+résumé lorsque leur taille atteint SUMMARY_TRIGGER_TOKENS), chaque message n'étant
+résumé qu'une fois : la taille du prompt reste bornée quelle que soit la longueur
+de la conversation.
+
+Configuration (settings.CHATBOT_CONVERSATION) :
+    TOKEN_BUDGET            Taille maximale de l'historique envoyé (résumé compris)
+    SUMMARY_MAX_TOKENS      Taille maximale du résumé
+    SUMMARY_TRIGGER_TOKENS  Taille des messages hors fenêtre déclenchant un résumé
+    MAX_MESSAGES            Nombre maximal de messages non résumés lus par tour
+"""
+import re
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+from . import metrics
+from .models import Conversation, Message
+
+DEFAULTS = {
+    'TOKEN_BUDGET': 1200,
+    'SUMMARY_MAX_TOKENS': 250,
+    'SUMMARY_TRIGGER_TOKENS': 300,
+    'MAX_MESSAGES': 200,
+}
+
+# Tokens ajoutés par le format de chat pour chaque message (rôle, séparateurs)
+MESSAGE_OVERHEAD = 4
+
+# Mots (lettres, chiffres) ou signes isolés
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+
+SUMMARY_PROMPT = """Vous tenez à jour le résumé d'une conversation entre un employé et un assistant de soutien psychologique en entreprise.
+À partir du résumé précédent et des nouveaux échanges, rédigez un nouveau résumé en français, à la troisième personne, en {max_words} mots au maximum.
+Conservez la situation professionnelle décrite, les émotions exprimées, les thématiques abordées et les conseils déjà donnés. N'ajoutez aucune information absente des échanges."""
+
+
+def get_config() -> Dict:
+    """Retourne la configuration de la mémoire des conversations, complétée par les valeurs par défaut"""
+    return {**DEFAULTS, **getattr(settings, 'CHATBOT_CONVERSATION', {})}
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estime le nombre de tokens d'un texte sans tokenizer
+
+    Approximation des tokenizers BPE : un token par signe de ponctuation et
+    environ quatre caractères par token dans les mots.
+
+    Args:
+        text (str): Texte à estimer
+
+    Returns:
+        int: Nombre de tokens estimé
+    """
+    return sum((len(piece) + 3) // 4 for piece in _TOKEN_PIECES.findall(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Tronque un texte (au mot près) pour que son estimation ne dépasse pas max_tokens"""
+    used = 0
+    for match in _TOKEN_PIECES.finditer(text):
+        used += (len(match.group()) + 3) // 4
+        if used > max_tokens:
+            return text[:match.start()].rstrip()
+    return text
+
+
+def start_conversation(employee_id: int = None) -> int:
+    """Crée une conversation et retourne son ID"""
+    return Conversation.objects.create(employee_id=employee_id).id
+
+
+def build_context(conversation_id: int) -> Dict:
+    """
+    Construit l'historique à envoyer au modèle pour le prochain tour
+
+    Les messages non résumés sont lus du plus récent au plus ancien et retenus
+    tant qu'ils tiennent dans le budget, après le résumé. Les plus anciens, hors
+    fenêtre, sont à intégrer au résumé (voir summary_messages et save_summary).
+    Si plus de MAX_MESSAGES messages restent à résumer, les messages hors fenêtre
+    sont les MAX_MESSAGES plus anciens : le résumé les intègre dans l'ordre, sans
+    en sauter aucun.
+
+    Args:
+        conversation_id (int): ID de la conversation
+
+    Returns:
+        Dict: "messages" (historique au format chat, résumé compris), "tokens"
+        (taille estimée), "overflow" (messages hors fenêtre, du plus ancien au plus
+        récent), "summarize" (résumé à mettre à jour), "summary" et "summarized_until"
+
+    Raises:
+        Conversation.DoesNotExist: Si la conversation n'existe pas
+    """
+    config = get_config()
+    with metrics.STAGE_SECONDS.time("conversation_read"):
+        summary, summary_tokens, summarized_until = Conversation.objects.values_list(
+            "summary", "summary_tokens", "summarized_until"
+        ).get(id=conversation_id)
+
+        rows = list(Message.objects.filter(
+            conversation_id=conversation_id, id__gt=summarized_until
+        ).order_by("-id").values_list("id", "role", "content", "tokens")[:config['MAX_MESSAGES']])
+
+        used = summary_tokens + MESSAGE_OVERHEAD if summary else 0
+        recent = []
+        overflow = []
+        for row in rows:
+            cost = row[3] + MESSAGE_OVERHEAD
+            if overflow or used + cost > config['TOKEN_BUDGET']:
+                overflow.append(row)
+            else:
+                recent.append(row)
+                used += cost
+        overflow.reverse()
+
+        if len(rows) == config['MAX_MESSAGES']:
+            # Des messages plus anciens n'ont pas été lus : résumer d'abord ceux qui
+            # suivent summarized_until, pour que le résumé n'en saute aucun
+            window_start = recent[-1][0] if recent else rows[0][0] + 1
+            overflow = list(Message.objects.filter(
+                conversation_id=conversation_id, id__gt=summarized_until, id__lt=window_start
+            ).order_by("id").values_list("id", "role", "content", "tokens")[:config['MAX_MESSAGES']])
+
+    messages = [{"role": "system", "content": f"Résumé des échanges précédents : {summary}"}] if summary else []
+    messages.extend({"role": role, "content": content} for _, role, content, _ in reversed(recent))
+    return {
+        "conversation_id": conversation_id,
+        "messages": messages,
+        "tokens": used,
+        "overflow": [{"id": row[0], "role": row[1], "content": row[2]} for row in overflow],
+        "summarize": sum(row[3] for row in overflow) >= config['SUMMARY_TRIGGER_TOKENS'],
+        "summary": summary,
+        "summarized_until": summarized_until
+    }
+
+
+def record_turn(conversation_id: int, message: str, reply: str) -> None:
+    """Enregistre le message de l'utilisateur et la réponse de l'assistant (une requête)"""
+    with metrics.STAGE_SECONDS.time("conversation_write"):
+        Message.objects.bulk_create([
+            Message(conversation_id=conversation_id, role=Message.ROLE_USER, content=message,
+                    tokens=estimate_tokens(message)),
+            Message(conversation_id=conversation_id, role=Message.ROLE_ASSISTANT, content=reply,
+                    tokens=estimate_tokens(reply)),
+        ])
+
+
+def summary_messages(context: Dict) -> List[Dict]:
+    """Messages de l'appel de résumé : résumé précédent et échanges sortis de la fenêtre"""
+    max_tokens = get_config()['SUMMARY_MAX_TOKENS']
+    exchanges = "\n".join(
+        f"{'Employé' if item['role'] == Message.ROLE_USER else 'Assistant'} : {item['content']}"
+        for item in context["overflow"]
+    )
+    return [
+        {"role": "system", "content": SUMMARY_PROMPT.format(max_words=max_tokens * 3 // 4)},
+        {"role": "user", "content": f"Résumé précédent : {context['summary'] or '(aucun)'}\n\nNouveaux échanges :\n{exchanges}"}
+    ]
+
+
+def save_summary(context: Dict, summary: str) -> bool:
+    """
+    Enregistre le nouveau résumé et marque les messages hors fenêtre comme résumés
+
+    Le résumé n'est pas enregistré si un autre tour l'a mis à jour entre-temps.
+
+    Args:
+        context (Dict): Contexte retourné par build_context
+        summary (str): Nouveau résumé (tronqué à SUMMARY_MAX_TOKENS)
+
+    Returns:
+        bool: True si le résumé a été enregistré
+    """
+    summary = truncate_to_tokens(summary.strip(), get_config()['SUMMARY_MAX_TOKENS'])
+    return bool(Conversation.objects.filter(
+        id=context["conversation_id"], summarized_until=context["summarized_until"]
+    ).update(
+        summary=summary,
+        summary_tokens=estimate_tokens(summary),
+        summarized_until=context["overflow"][-1]["id"]
+    ))
+
+
+def resolve_conversation(value: Optional[str], employee_id: int = None) -> Optional[int]:
+    """
+    Conversation désignée par le paramètre conversation_id d'une requête
+
+    Une conversation n'est reprise que par l'employé qui l'a démarrée : celle d'un
+    autre employé est traitée comme inexistante, sans quoi son historique et son
+    résumé seraient transmis au modèle. Sans employé, la mémoire n'est pas disponible.
+
+    Args:
+        value (Optional[str]): "new" pour démarrer une conversation, ou son ID
+        employee_id (int, optional): Employé qui envoie le message
+
+    Returns:
+        Optional[int]: ID de la conversation, ou None si la mémoire n'est pas demandée
+
+    Raises:
+        ValueError: Si la valeur n'est ni "new" ni un ID, ou sans employé
+        Conversation.DoesNotExist: Si la conversation n'existe pas ou appartient à un autre employé
+    """
+    if not value:
+        return None
+    if employee_id is None:
+        raise ValueError("conversation_id requires an identified employee")
+    if value == "new":
+        return start_conversation(employee_id)
+    if not value.isdigit():
+        raise ValueError(f"Invalid conversation_id: {value}")
+    if not Conversation.objects.filter(id=int(value), employee_id=employee_id).exists():
+        raise Conversation.DoesNotExist(f"Conversation {value} not found")
+    return int(value)
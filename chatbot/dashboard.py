@@ -0,0 +1,142 @@
+"""
+Tableau de bord de l'organisation : fréquence des thématiques et ratio de mots
+violents dans le temps, tous employés confondus
+
+Les séries sont lues dans les agrégats de l'organisation (voir rollups), puis le
+résultat est mis en cache. Chaque écriture de statistiques incrémente une
+version incluse dans les clés du cache : les tableaux calculés avant l'écriture
+ne sont plus lus. Avec plusieurs workers, utiliser un cache partagé (CACHES).
+
+Configuration (settings.CHATBOT_DASHBOARD) :
+    CACHE_TIMEOUT  Durée de conservation d'un tableau de bord en cache (secondes)
+"""
+import time
+from datetime import date
+from typing import Dict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum
+
+from . import rollups
+from .models import Employee, EmployeeThemeCounter, OrganisationStatsRollup, OrganisationThemeRollup, PsychologicalTheme
+
+VERSION_KEY = "chatbot:dashboard:version"
+
+
+def get_config() -> Dict:
+    """Configuration du tableau de bord, complétée par les valeurs par défaut"""
+    return {
+        'CACHE_TIMEOUT': 300,
+        **getattr(settings, 'CHATBOT_DASHBOARD', {})
+    }
+
+
+def _version() -> int:
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Valeur initiale horodatée : une version évincée du cache ne réutilise jamais d'anciennes clés
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate_dashboard() -> None:
+    """Rend obsolètes tous les tableaux de bord en cache (appelé après chaque écriture de statistiques)"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns(), None)
+
+
+def compute_dashboard(period: str, start: date, end: date) -> Dict:
+    """
+    Calcule le tableau de bord à partir des agrégats (cinq requêtes groupées)
+
+    Args:
+        period (str): "day" ou "week"
+        start (date): Premier jour de l'intervalle
+        end (date): Dernier jour de l'intervalle
+
+    Returns:
+        Dict: Totaux des employés, série du ratio de mots violents, carte des
+        thématiques par période et occurrences cumulées par thématique
+
+    Raises:
+        ValueError: Si la période est inconnue ou l'intervalle invalide ou trop long
+    """
+    starts = rollups.period_starts(period, start, end)
+    index = {day: position for position, day in enumerate(starts)}
+    window = {"period": period, "period_start__gte": starts[0], "period_start__lte": end}
+
+    points = {
+        row[0]: row[1:]
+        for row in OrganisationStatsRollup.objects.filter(**window).values_list(
+            "period_start", "messages_count", "total_words_count", "violent_words_count"
+        )
+    }
+    series = []
+    for day in starts:
+        messages, total_words, violent_words = points.get(day, (0, 0, 0))
+        series.append({
+            "period_start": day.isoformat(),
+            "messages": messages,
+            "total_words": total_words,
+            "violent_words": violent_words,
+            "violent_words_ratio": round(violent_words / total_words, 4) if total_words else 0
+        })
+
+    themes = dict(PsychologicalTheme.objects.order_by("name").values_list("id", "name"))
+    heatmap = {theme_id: [0] * len(starts) for theme_id in themes}
+    for day, theme_id, count in OrganisationThemeRollup.objects.filter(**window).values_list(
+            "period_start", "theme_id", "count"):
+        if theme_id in heatmap:
+            heatmap[theme_id][index[day]] = count
+
+    totals = Employee.objects.aggregate(
+        count=Count("id"),
+        total_words=Sum("total_words_count"),
+        violent_words=Sum("violent_words_count")
+    )
+    total_words = totals["total_words"] or 0
+    violent_words = totals["violent_words"] or 0
+
+    # Count("id") plutôt que Count("employee_id") : la requête reste servie par l'index (theme, count)
+    theme_totals = sorted(
+        (
+            {"name": themes[row["theme_id"]], "occurrences": row["occurrences"], "employees": row["employees"]}
+            for row in EmployeeThemeCounter.objects.filter(count__gt=0).values("theme_id").annotate(
+                occurrences=Sum("count"), employees=Count("id")
+            )
+            if row["theme_id"] in themes
+        ),
+        key=lambda theme: -theme["occurrences"]
+    )
+
+    return {
+        "period": period,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "employees": {
+            "count": totals["count"],
+            "total_words": total_words,
+            "violent_words": violent_words,
+            "violent_words_ratio": round(violent_words / total_words, 4) if total_words else 0
+        },
+        "series": series,
+        "heatmap": {
+            "periods": [day.isoformat() for day in starts],
+            "themes": [{"name": name, "counts": heatmap[theme_id]} for theme_id, name in themes.items()]
+        },
+        "themes": theme_totals
+    }
+
+
+def get_dashboard(period: str, start: date, end: date) -> Dict:
+    """Tableau de bord de l'intervalle, servi depuis le cache tant qu'aucune statistique n'a été écrite"""
+    key = f"chatbot:dashboard:{_version()}:{period}:{start.isoformat()}:{end.isoformat()}"
+    dashboard = cache.get(key)
+    if dashboard is None:
+        dashboard = compute_dashboard(period, start, end)
+        cache.set(key, dashboard, get_config()['CACHE_TIMEOUT'])
+    return dashboard
@@ -0,0 +1,84 @@
+"""
+Identité de l'employé qui utilise le chatbot, conservée dans la session
+
+L'employé est résolu une seule fois par session, au premier chargement de la page
+d'accueil, puis son ID est lu dans la session à chaque message : ni la page ni
+/chat/ ne recherchent l'employé en base. Sans authentification, chaque nouvelle
+session reçoit l'employé de démonstration, dont l'ID est gardé en mémoire par
+processus (get_or_create au premier besoin, oublié à sa suppression).
+
+La session est enregistrée en base (moteur par défaut) : le navigateur n'en
+détient que la clé et ne peut pas choisir l'employé.
+
+Configuration (settings.CHATBOT_IDENTITY) :
+    DEMO_EMPLOYEE  Champs de l'employé attribué aux nouvelles sessions (None pour aucun)
+"""
+from typing import Dict, Optional
+
+from django.conf import settings
+
+from .models import Employee
+
+SESSION_KEY = "chatbot_employee_id"
+
+DEFAULTS = {
+    'DEMO_EMPLOYEE': {'first_name': "Utilisateur", 'last_name': "Test", 'birth_date': "1990-01-01"},
+}
+
+# ID de l'employé de démonstration, par jeu de champs configuré
+_demo_employees: Dict[tuple, int] = {}
+
+
+def get_config() -> Dict:
+    """Retourne la configuration de l'identité, complétée par les valeurs par défaut"""
+    return {**DEFAULTS, **getattr(settings, 'CHATBOT_IDENTITY', {})}
+
+
+def demo_employee_id() -> Optional[int]:
+    """ID de l'employé de démonstration, créé si nécessaire (None s'il est désactivé)"""
+    fields = get_config()['DEMO_EMPLOYEE']
+    if not fields:
+        return None
+    key = tuple(sorted(fields.items()))
+    employee_id = _demo_employees.get(key)
+    if employee_id is None:
+        lookup = {name: fields[name] for name in ('first_name', 'last_name')}
+        defaults = {name: value for name, value in fields.items() if name not in lookup}
+        employee, _ = Employee.objects.get_or_create(**lookup, defaults=defaults)
+        employee_id = _demo_employees[key] = employee.id
+    return employee_id
+
+
+def forget_employee(employee_id: int) -> None:
+    """Oublie un employé supprimé (voir signals.py)"""
+    for key, cached_id in list(_demo_employees.items()):
+        if cached_id == employee_id:
+            del _demo_employees[key]
+
+
+def session_employee_id(request) -> Optional[int]:
+    """
+    Employé de la session, attribué à la première visite
+
+    Args:
+        request: Requête dont la session porte l'identité
+
+    Returns:
+        Optional[int]: ID de l'employé, ou None sans employé de démonstration
+    """
+    employee_id = request.session.get(SESSION_KEY)
+    if employee_id is None:
+        employee_id = demo_employee_id()
+        if employee_id is not None:
+            request.session[SESSION_KEY] = employee_id
+    return employee_id
+
+
+async def asession_employee_id(request) -> Optional[int]:
+    """
+    Employé de la session, sans en attribuer (vues asynchrones)
+
+    Returns:
+        Optional[int]: ID de l'employé, ou None si la session n'en a pas encore
+    """
+    return await request.session.aget(SESSION_KEY)
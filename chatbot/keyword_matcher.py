@@ -0,0 +1,99 @@
+"""
+Recherche de mots-clés en une seule passe sur le message (automate d'Aho–Corasick)
+"""
+import re
+import unicodedata
+from collections import deque
+from typing import Dict, FrozenSet, Hashable, Iterable, List, Set, Tuple
+
+# Diacritiques combinants produits par la décomposition NFKD (é -> e + accent aigu)
+_COMBINING_MARKS = re.compile('[\u0300-\u036f]')
+
+
+def fold_text(text: str) -> str:
+    """
+    Normalise le texte pour la comparaison : minuscules et suppression des accents
+
+    Args:
+        text (str): Texte à normaliser
+
+    Returns:
+        str: Texte sans casse ni accents ("Épuisé" -> "epuise")
+    """
+    return _COMBINING_MARKS.sub('', unicodedata.normalize('NFKD', text.casefold()))
+
+
+class KeywordAutomaton:
+    """
+    Automate d'Aho–Corasick déterminisé sur un ensemble de mots-clés étiquetés
+
+    Chaque terme est associé à une étiquette ; search() retourne en un seul parcours
+    du texte l'ensemble des étiquettes dont au moins un terme apparaît (en sous-chaîne,
+    comme le faisait `term in message`). Le coût est linéaire en la longueur du texte
+    et indépendant du nombre de termes.
+
+    Args:
+        patterns (Iterable[Tuple[str, Hashable]]): Couples (terme, étiquette)
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, Hashable]]):
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[Set[Hashable]] = [set()]
+
+        # Construction du trie des termes normalisés
+        for term, label in patterns:
+            state = 0
+            for char in fold_text(term):
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    goto.append({})
+                    outputs.append(set())
+                    next_state = len(goto) - 1
+                    goto[state][char] = next_state
+                state = next_state
+            if state:
+                outputs[state].add(label)
+
+        # Liens d'échec calculés en largeur, puis fusion des sorties et des transitions
+        # pour obtenir un automate déterministe (une seule transition par caractère)
+        fail = [0] * len(goto)
+        transitions: List[Dict[str, int]] = [dict(goto[0])] + [None] * (len(goto) - 1)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            fallback = transitions[fail[state]]
+            outputs[state] |= outputs[fail[state]]
+            merged = dict(fallback)
+            for char, next_state in goto[state].items():
+                fail[next_state] = fallback.get(char, 0)
+                merged[char] = next_state
+                queue.append(next_state)
+            transitions[state] = merged
+
+        self._transitions = transitions
+        self._outputs: List[FrozenSet[Hashable]] = [frozenset(labels) for labels in outputs]
+        self._accepting = frozenset(state for state, labels in enumerate(outputs) if labels)
+
+    def search(self, text: str) -> Set[Hashable]:
+        """
+        Retourne les étiquettes des termes présents dans le texte
+
+        Args:
+            text (str): Texte à analyser (la casse et les accents sont ignorés)
+
+        Returns:
+            Set[Hashable]: Étiquettes détectées
+        """
+        transitions = self._transitions
+        accepting = self._accepting
+        state = 0
+        hits = set()
+        for char in fold_text(text):
+            state = transitions[state].get(char, 0)
+            if state in accepting:
+                hits.add(state)
+
+        labels = set()
+        for state in hits:
+            labels |= self._outputs[state]
+        return labels
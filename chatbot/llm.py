@@ -0,0 +1,502 @@
+"""
+Passerelle d'accès au modèle : clients OpenAI partagés, réessais, disjoncteur,
+limitation de débit et regroupement des requêtes identiques
+
+Le fichier .env, la bibliothèque openai et les clients ne sont chargés qu'au
+premier appel au modèle : les commandes de gestion, les tests et le démarrage des
+workers n'en paient pas le coût. Chaque processus utilise un client synchrone et
+un client asynchrone uniques, dont le pool de connexions HTTP (keep-alive) est
+réutilisé d'une requête à l'autre.
+
+Les appels passent par la passerelle (get_gateway) :
+    - les erreurs transitoires (limite de débit, connexion, erreur serveur) sont
+      réessayées avec un recul exponentiel à gigue complète, qui respecte l'en-tête
+      Retry-After ;
+    - après FAILURE_THRESHOLD échecs consécutifs, le disjoncteur s'ouvre : les appels
+      échouent aussitôt (CircuitOpenError) pendant RESET_TIMEOUT secondes, et les
+      services répondent avec les réponses modèles locales ; un seul appel d'essai
+      est ensuite autorisé pour refermer le circuit ;
+    - un seau à jetons limite le débit à RATE_LIMIT appels par seconde (rafales de
+      RATE_BURST) ; un appel qui devrait attendre plus de MAX_RATE_WAIT secondes
+      échoue (RateLimitedError) ;
+    - les appels identiques (mêmes messages et paramètres) simultanés sont regroupés
+      en un seul appel au modèle, dont tous reçoivent le résultat.
+
+Configuration (settings.CHATBOT_LLM_GATEWAY) :
+    MAX_RETRIES        Nombre de réessais d'un appel
+    RETRY_BASE_DELAY   Délai initial du recul exponentiel (secondes)
+    RETRY_MAX_DELAY    Délai maximal entre deux essais (secondes)
+    FAILURE_THRESHOLD  Échecs consécutifs ouvrant le disjoncteur
+    RESET_TIMEOUT      Durée d'ouverture du disjoncteur (secondes)
+    RATE_LIMIT         Appels par seconde (None : pas de limitation)
+    RATE_BURST         Taille du seau à jetons
+    MAX_RATE_WAIT      Attente maximale d'un jeton (secondes)
+    COALESCE           Regroupe les appels identiques simultanés
+"""
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import AsyncIterator, Callable, Dict, List
+
+from django.conf import settings
+
+from . import metrics
+
+DEFAULTS = {
+    'MAX_RETRIES': 2,
+    'RETRY_BASE_DELAY': 0.5,
+    'RETRY_MAX_DELAY': 8.0,
+    'FAILURE_THRESHOLD': 5,
+    'RESET_TIMEOUT': 30.0,
+    'RATE_LIMIT': None,
+    'RATE_BURST': 20,
+    'MAX_RATE_WAIT': 5.0,
+    'COALESCE': True,
+}
+
+_lock = threading.Lock()
+_environment_loaded = False
+_client = None
+_async_client = None
+_gateway = None
+
+
+class CircuitOpenError(Exception):
+    """Appel refusé sans contacter le modèle : le disjoncteur est ouvert"""
+
+
+class RateLimitedError(Exception):
+    """Appel refusé : le quota local d'appels ne serait pas disponible à temps"""
+
+
+def get_config() -> Dict:
+    """Retourne la configuration de la passerelle, complétée par les valeurs par défaut"""
+    return {**DEFAULTS, **getattr(settings, 'CHATBOT_LLM_GATEWAY', {})}
+
+
+def load_environment() -> None:
+    """Charge les variables du fichier .env (une seule fois par processus)"""
+    global _environment_loaded
+    if not _environment_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _environment_loaded = True
+
+
+def get_client() -> 'openai.OpenAI':
+    """Client OpenAI synchrone du processus (créé au premier appel, réessais laissés à la passerelle)"""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                load_environment()
+                from openai import OpenAI
+                _client = OpenAI(max_retries=0)
+    return _client
+
+
+def get_async_client() -> 'openai.AsyncOpenAI':
+    """
+    Client OpenAI asynchrone du processus (créé au premier appel)
+
+    Ses connexions sont liées à la boucle d'événements qui les a ouvertes : le
+    worker ASGI n'en utilise qu'une.
+    """
+    global _async_client
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                load_environment()
+                from openai import AsyncOpenAI
+                _async_client = AsyncOpenAI(max_retries=0)
+    return _async_client
+
+
+def retryable_errors() -> tuple:
+    """Erreurs pour lesquelles un nouvel essai a des chances d'aboutir"""
+    import openai
+    return (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError,
+            CircuitOpenError, RateLimitedError)
+
+
+def is_rate_limit(error: Exception) -> bool:
+    """Indique si l'erreur est un dépassement de la limite de débit de l'API (HTTP 429)"""
+    import openai
+    return isinstance(error, openai.RateLimitError)
+
+
+def _is_provider_failure(error: Exception) -> bool:
+    """Erreur révélant une API indisponible ou surchargée (comptée par le disjoncteur)"""
+    import openai
+    return isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError))
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur : ouvert après failure_threshold échecs consécutifs, il refuse les
+    appels pendant reset_timeout secondes puis laisse passer un seul appel d'essai
+
+    Args:
+        failure_threshold (int): Échecs consécutifs ouvrant le circuit
+        reset_timeout (float): Durée d'ouverture en secondes
+        clock (Callable[[], float]): Horloge monotone (remplacée dans les tests)
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """"closed", "open" ou "half_open" (appel d'essai autorisé ou en cours)"""
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.clock() - self.opened_at >= self.reset_timeout else "open"
+
+    def before_call(self) -> bool:
+        """
+        Autorise un appel ou lève CircuitOpenError
+
+        Returns:
+            bool: True si l'appel est l'appel d'essai du circuit semi-ouvert
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return False
+            if self._trial or self.clock() - self.opened_at < self.reset_timeout:
+                metrics.LLM_REJECTED.inc(label="circuit_open")
+                raise CircuitOpenError("Model API circuit is open after repeated failures")
+            self._trial = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self._trial = False
+
+    def release(self) -> None:
+        """Libère l'appel d'essai sans conclure (appel annulé)"""
+        with self._lock:
+            self._trial = False
+
+
+class TokenBucket:
+    """
+    Seau à jetons : rate jetons par seconde, au plus burst en réserve
+
+    Les jetons sont réservés à l'avance : les appelants en attente sont servis dans
+    l'ordre de leurs demandes.
+    """
+
+    def __init__(self, rate: float, burst: int, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = float(burst)
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait: float) -> float:
+        """
+        Réserve un jeton
+
+        Returns:
+            float: Attente en secondes avant de pouvoir appeler
+
+        Raises:
+            RateLimitedError: Si l'attente dépasserait max_wait
+        """
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = max(0.0, (1 - self.tokens) / self.rate)
+            if wait > max_wait:
+                metrics.LLM_REJECTED.inc(label="rate_limited")
+                raise RateLimitedError(f"Local model quota exhausted for {wait:.1f}s")
+            self.tokens -= 1
+            return wait
+
+
+class _Flight:
+    """Appel asynchrone partagé par les appelants d'un même prompt"""
+
+    __slots__ = ('task', 'waiters')
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class LLMGateway:
+    """
+    Point de passage de tous les appels chat.completions (voir le module)
+
+    Les paramètres correspondent aux clés de settings.CHATBOT_LLM_GATEWAY.
+    """
+
+    def __init__(self, max_retries: int = 2, retry_base_delay: float = 0.5, retry_max_delay: float = 8.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0, rate_limit: float = None,
+                 rate_burst: int = 20, max_rate_wait: float = 5.0, coalesce: bool = True):
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.max_rate_wait = max_rate_wait
+        self.coalesce = coalesce
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.bucket = TokenBucket(rate_limit, rate_burst) if rate_limit else None
+        self._flights: Dict[str, Future] = {}
+        self._async_flights: Dict[str, _Flight] = {}
+        self._flights_lock = threading.Lock()
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """Délai avant le prochain essai : Retry-After, sinon recul exponentiel à gigue complète"""
+        response = getattr(error, "response", None)
+        if response is not None:
+            try:
+                return min(float(response.headers.get("retry-after")), self.retry_max_delay)
+            except (TypeError, ValueError):
+                pass
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+
+    def _should_retry(self, error: Exception, attempt: int, max_retries: int) -> bool:
+        if attempt >= max_retries or isinstance(error, (CircuitOpenError, RateLimitedError)):
+            return False
+        return _is_provider_failure(error)
+
+    def _after_failure(self, error: Exception) -> None:
+        metrics.LLM_ATTEMPTS.inc(label="error")
+        if _is_provider_failure(error):
+            self.breaker.record_failure()
+        else:
+            # Erreur du client (requête invalide...) : l'API a répondu, elle est disponible
+            self.breaker.record_success()
+
+    @staticmethod
+    def _flight_key(messages: List[Dict], params: Dict) -> str:
+        payload = json.dumps({"messages": messages, **params}, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def complete(self, messages: List[Dict], max_retries: int = None, **params) -> str:
+        """
+        Complétion synchrone (contenu du premier choix)
+
+        Args:
+            messages (List[Dict]): Messages au format chat
+            max_retries (int, optional): Réessais de cet appel (MAX_RETRIES par défaut)
+            **params: Paramètres de chat.completions.create (model, temperature...)
+
+        Returns:
+            str: Contenu de la réponse
+
+        Raises:
+            CircuitOpenError, RateLimitedError, ou l'erreur d'OpenAI du dernier essai
+        """
+        retries = self.max_retries if max_retries is None else max_retries
+        if not self.coalesce:
+            return self._complete(messages, params, retries)
+
+        key = self._flight_key(messages, params)
+        with self._flights_lock:
+            future = self._flights.get(key)
+            leader = future is None
+            if leader:
+                future = self._flights[key] = Future()
+        if not leader:
+            metrics.LLM_COALESCED.inc()
+            return future.result()
+        try:
+            content = self._complete(messages, params, retries)
+            future.set_result(content)
+            return content
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._flights_lock:
+                del self._flights[key]
+
+    def _complete(self, messages: List[Dict], params: Dict, max_retries: int) -> str:
+        attempt = 0
+        while True:
+            # Jeton réservé avant l'autorisation du disjoncteur : l'appel d'essai n'est pas
+            # retenu pendant l'attente, qui peut échouer ou être interrompue
+            if self.bucket is not None:
+                time.sleep(self.bucket.reserve(self.max_rate_wait))
+            trial = self.breaker.before_call()
+            try:
+                response = get_client().chat.completions.create(messages=messages, **params)
+            except BaseException as e:
+                if not isinstance(e, Exception):
+                    if trial:
+                        self.breaker.release()
+                    raise
+                self._after_failure(e)
+                if not self._should_retry(e, attempt, max_retries):
+                    raise
+                metrics.LLM_RETRIES.inc()
+                time.sleep(self._retry_delay(e, attempt))
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            metrics.LLM_ATTEMPTS.inc(label="success")
+            return response.choices[0].message.content
+
+    async def acomplete(self, messages: List[Dict], max_retries: int = None, **params) -> str:
+        """
+        Version asynchrone de complete
+
+        Un appel regroupé n'est annulé que lorsque tous ses appelants l'ont été.
+        """
+        retries = self.max_retries if max_retries is None else max_retries
+        if not self.coalesce:
+            return await self._acomplete(messages, params, retries)
+
+        key = self._flight_key(messages, params)
+        loop = asyncio.get_running_loop()
+        flight = self._async_flights.get(key)
+        if flight is None or flight.task.get_loop() is not loop:
+            flight = self._async_flights[key] = _Flight(loop.create_task(self._acomplete(messages, params, retries)))
+            flight.task.add_done_callback(lambda task: self._forget_flight(key, flight))
+        else:
+            metrics.LLM_COALESCED.inc()
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                flight.task.cancel()
+
+    def _forget_flight(self, key: str, flight: _Flight) -> None:
+        if self._async_flights.get(key) is flight:
+            del self._async_flights[key]
+        if not flight.task.cancelled():
+            # Exception déjà transmise aux appelants : ne pas la signaler comme non récupérée
+            flight.task.exception()
+
+    async def _acomplete(self, messages: List[Dict], params: Dict, max_retries: int) -> str:
+        attempt = 0
+        while True:
+            # Jeton réservé avant l'autorisation du disjoncteur (voir _complete)
+            if self.bucket is not None:
+                await asyncio.sleep(self.bucket.reserve(self.max_rate_wait))
+            trial = self.breaker.before_call()
+            try:
+                response = await get_async_client().chat.completions.create(messages=messages, **params)
+            except BaseException as e:
+                if not isinstance(e, Exception):
+                    if trial:
+                        self.breaker.release()
+                    raise
+                self._after_failure(e)
+                if not self._should_retry(e, attempt, max_retries):
+                    raise
+                metrics.LLM_RETRIES.inc()
+                await asyncio.sleep(self._retry_delay(e, attempt))
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            metrics.LLM_ATTEMPTS.inc(label="success")
+            return response.choices[0].message.content
+
+    async def astream(self, messages: List[Dict], max_retries: int = None, **params) -> AsyncIterator[str]:
+        """
+        Complétion diffusée : morceaux de texte du premier choix
+
+        Seule l'ouverture du flux est réessayée ; une erreur pendant la diffusion est
+        propagée (une partie du texte a déjà été transmise). Les flux ne sont pas regroupés.
+        Un flux abandonné (client déconnecté, tâche annulée) est fermé, et l'appel d'essai
+        du disjoncteur libéré s'il n'a pas conclu.
+        """
+        retries = self.max_retries if max_retries is None else max_retries
+        attempt = 0
+        # Appel d'essai du circuit semi-ouvert en cours, pas encore conclu
+        trial = False
+        stream = None
+        try:
+            while True:
+                if self.bucket is not None:
+                    await asyncio.sleep(self.bucket.reserve(self.max_rate_wait))
+                trial = self.breaker.before_call()
+                try:
+                    stream = await get_async_client().chat.completions.create(messages=messages, stream=True, **params)
+                    break
+                except Exception as e:
+                    trial = False
+                    self._after_failure(e)
+                    if not self._should_retry(e, attempt, retries):
+                        raise
+                    metrics.LLM_RETRIES.inc()
+                    await asyncio.sleep(self._retry_delay(e, attempt))
+                    attempt += 1
+
+            try:
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    text = chunk.choices[0].delta.content or ""
+                    if text:
+                        yield text
+            except Exception as e:
+                trial = False
+                self._after_failure(e)
+                raise
+            trial = False
+            self.breaker.record_success()
+            metrics.LLM_ATTEMPTS.inc(label="success")
+        finally:
+            # GeneratorExit ou CancelledError : l'essai n'a ni réussi ni échoué
+            if trial:
+                self.breaker.release()
+            if stream is not None:
+                await stream.close()
+
+
+def get_gateway() -> LLMGateway:
+    """Retourne la passerelle du processus, configurée par settings.CHATBOT_LLM_GATEWAY"""
+    global _gateway
+    if _gateway is None:
+        with _lock:
+            if _gateway is None:
+                config = get_config()
+                _gateway = LLMGateway(
+                    max_retries=config['MAX_RETRIES'],
+                    retry_base_delay=config['RETRY_BASE_DELAY'],
+                    retry_max_delay=config['RETRY_MAX_DELAY'],
+                    failure_threshold=config['FAILURE_THRESHOLD'],
+                    reset_timeout=config['RESET_TIMEOUT'],
+                    rate_limit=config['RATE_LIMIT'],
+                    rate_burst=config['RATE_BURST'],
+                    max_rate_wait=config['MAX_RATE_WAIT'],
+                    coalesce=config['COALESCE']
+                )
+    return _gateway
+
+
+def reset_clients() -> None:
+    """
+    Oublie les clients et la passerelle créés (recréés au prochain appel, par
+    exemple après un fork ou un changement de configuration)
+    """
+    global _client, _async_client, _gateway
+    with _lock:
+        _client = _async_client = _gateway = None
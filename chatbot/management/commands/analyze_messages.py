@@ -0,0 +1,100 @@
+import json
+import os
+import time
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+from chatbot import batch
+
+
+class Command(BaseCommand):
+    help = 'Analyze a JSONL file of messages in bulk (backfill), resuming from the last checkpoint.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='JSONL file with a "message" (or "body") field and optional "employee_id"')
+        parser.add_argument('--output', help='JSONL file receiving the analysis of each line')
+        parser.add_argument('--checkpoint', help='Checkpoint file (defaults to <input>.checkpoint)')
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and start from the first line')
+        parser.add_argument('--concurrency', type=int, help='Maximum number of concurrent model calls')
+        parser.add_argument('--max-retries', type=int, help='Retries per message on transient API errors')
+        parser.add_argument('--chunk-size', type=int, help='Messages per chunk (statistics write and checkpoint)')
+        parser.add_argument('--no-cache', action='store_true', help='Bypass the completion cache')
+        parser.add_argument('--write-stats', action='store_true',
+                            help='Add the statistics of each message to the employee, theme and rollup counters. '
+                                 'They are added to the existing counts: do not use it to re-score messages '
+                                 'that were already counted.')
+
+    def read_checkpoint(self, path):
+        try:
+            with open(path, encoding='utf-8') as checkpoint_file:
+                return json.load(checkpoint_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Cannot read checkpoint {path}: {e}')
+
+    def write_checkpoint(self, path, state):
+        # Écriture atomique : un arrêt pendant l'écriture ne corrompt pas le point de reprise
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as checkpoint_file:
+            json.dump(state, checkpoint_file)
+        os.replace(temporary, path)
+
+    def handle(self, *args, **options):
+        input_path = options['input']
+        checkpoint_path = options['checkpoint'] or f'{input_path}.checkpoint'
+        config = batch.get_config()
+        chunk_size = options['chunk_size'] or config['CHUNK_SIZE']
+
+        state = None if options['restart'] else self.read_checkpoint(checkpoint_path)
+        state = state or {'lines': 0, 'processed': 0, 'failed': 0}
+        if state['lines']:
+            self.stdout.write(f'Resuming after line {state["lines"]} of {input_path}.')
+
+        analyzer = batch.BatchAnalyzer.from_settings(
+            concurrency=options['concurrency'],
+            max_retries=options['max_retries'],
+            use_cache=not options['no_cache'],
+            write_stats=options['write_stats']
+        )
+
+        try:
+            input_file = open(input_path, encoding='utf-8')
+        except OSError as e:
+            raise CommandError(f'Cannot read {input_path}: {e}')
+        output_file = None
+        if options['output']:
+            output_file = open(options['output'], 'a' if state['lines'] else 'w', encoding='utf-8')
+
+        start = time.perf_counter()
+
+        async def run():
+            lines = (line for index, line in enumerate(input_file) if index >= state['lines'])
+            async for entries, consumed in batch.analyze_lines(lines, analyzer, chunk_size, start=state['lines']):
+                if output_file is not None:
+                    output_file.writelines(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries)
+                    output_file.flush()
+                state.update({
+                    'lines': consumed,
+                    'processed': state['processed'] + sum('result' in entry for entry in entries),
+                    'failed': state['failed'] + sum('error' in entry for entry in entries),
+                })
+                self.write_checkpoint(checkpoint_path, state)
+
+                elapsed = time.perf_counter() - start
+                rate = analyzer.processed / elapsed if elapsed else 0
+                self.stdout.write(f'{consumed} lines read, {analyzer.processed} analyzed ({rate:.1f} messages/sec)')
+
+        try:
+            async_to_sync(run)()
+        finally:
+            input_file.close()
+            if output_file is not None:
+                output_file.close()
+
+        elapsed = time.perf_counter() - start
+        rate = analyzer.processed / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Analyzed {analyzer.processed} messages in {elapsed:.1f}s ({rate:.1f} messages/sec), '
+            f'{analyzer.failed} failed, {analyzer.retries} retries. Checkpoint: {checkpoint_path}.'
+        ))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from chatbot import retention
+
+
+class Command(BaseCommand):
+    help = ('Archive violent word occurrences older than the retention period to compressed JSONL files '
+            'partitioned by day, then delete them in batches (the rollups already count them).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Days of violent words kept in the database')
+        parser.add_argument('--batch-size', type=int, help='Violent words archived and deleted per transaction')
+        parser.add_argument('--archive-dir', help='Directory receiving the day=YYYY-MM-DD/part-*.jsonl.gz files')
+        parser.add_argument('--no-export', action='store_true', help='Delete without writing archive files')
+
+    def handle(self, *args, **options):
+        config = retention.get_config()
+        export = not options['no_export']
+        archive_dir = options['archive_dir'] or config['ARCHIVE_DIR']
+        if export and not archive_dir:
+            raise CommandError('No archive directory: set CHATBOT_RETENTION["ARCHIVE_DIR"], '
+                               'pass --archive-dir or use --no-export.')
+
+        def progress(rows):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{rows} violent words archived...')
+
+        try:
+            summary = retention.archive_violent_words(
+                days=options['days'],
+                batch_size=options['batch_size'],
+                archive_dir=archive_dir,
+                export=export,
+                progress=progress
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        destination = f' to {archive_dir}' if export else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived and deleted {summary["rows"]} violent words detected before '
+            f'{summary["cutoff"]:%Y-%m-%d} ({summary["days"]} days, {summary["files"]} files){destination}.'
+        ))
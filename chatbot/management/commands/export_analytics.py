@@ -0,0 +1,36 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from chatbot import analytics
+
+
+class Command(BaseCommand):
+    help = ('Append new violent word occurrences and a snapshot of the employee and theme counters to the '
+            'pseudonymized columnar analytics store.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help='Analytics store directory (CHATBOT_ANALYTICS["DIR"] by default)')
+        parser.add_argument('--batch-size', type=int, help='Violent words read per query')
+        parser.add_argument('--report', action='store_true',
+                            help='Print the ratio distribution and the most frequent theme pairs after the export')
+
+    def handle(self, *args, **options):
+        try:
+            summary = analytics.export_analytics(directory=options['dir'], batch_size=options['batch_size'])
+        except (ValueError, ImproperlyConfigured) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {summary["events"]} violent words ({summary["files"]} partition files) '
+            f'and snapshot {summary["snapshot"].name}.'
+        ))
+        if not options['report']:
+            return
+
+        store = analytics.AnalyticsStore(options['dir'])
+        ratios = store.ratio_distribution()
+        self.stdout.write(
+            f'Violent word ratio over {ratios["employees"]} employees: mean {ratios["mean"]:.2%}, '
+            f'p50 {ratios["p50"]:.2%}, p90 {ratios["p90"]:.2%}, p99 {ratios["p99"]:.2%}'
+        )
+        for first, second, employees in store.theme_cooccurrence(limit=10):
+            self.stdout.write(f'  {first} + {second}: {employees} employees')
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from chatbot import stats_buffer
+
+
+class Command(BaseCommand):
+    help = 'Force the write-behind statistics buffers of running workers to flush to the database.'
+
+    def handle(self, *args, **options):
+        if not stats_buffer.is_enabled():
+            self.stdout.write('Write-behind statistics buffer is disabled; statistics are already written synchronously.')
+            return
+
+        # Signal the running workers through the trigger file, then flush this process' own buffer
+        # without starting a background writer thread in the command
+        stats_buffer.request_flush()
+        flushed = stats_buffer.get_buffer(start=False).flush()
+        self.stdout.write(self.style.SUCCESS(
+            f'Requested a statistics flush from all workers (flushed {flushed} pending messages locally).'
+        ))
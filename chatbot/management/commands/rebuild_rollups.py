@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from chatbot.dashboard import invalidate_dashboard
+from chatbot.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = ('Recompute the violent word counts of the daily and weekly rollups from the stored violent words, '
+            'then the organisation rollups from the employee rollups.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employee', type=int, help='Only rebuild the rollups of this employee')
+
+    def handle(self, *args, **options):
+        written = rebuild_rollups(options['employee'])
+        invalidate_dashboard()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {written} rollup rows from violent word occurrences '
+            '(word and message counts are not stored per message and were kept).'
+        ))
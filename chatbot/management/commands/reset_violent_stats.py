@@ -1,12 +1,30 @@
 from django.core.management.base import BaseCommand
-from chatbot.models import Employee, ViolentWord
+from django.db.models import Max, Min
+from chatbot.dashboard import invalidate_dashboard
+from chatbot.models import Employee, EmployeeStatsRollup, OrganisationStatsRollup, ViolentWord
+from chatbot.retention import raw_delete_range
 
 class Command(BaseCommand):
     help = 'Reset all violent word statistics and occurrences for all employees.'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50000, help='Violent words deleted per transaction')
+
     def handle(self, *args, **options):
-        # Delete all violent word occurrences
-        ViolentWord.objects.all().delete()
+        # Delete all violent word occurrences by primary key ranges: each batch is an
+        # index search with a short write lock instead of one scan of the whole table,
+        # and a plain DELETE statement that never loads the rows
+        # Two separate aggregates so that SQLite reads each bound straight from the primary key
+        low = ViolentWord.objects.aggregate(low=Min('id'))['low']
+        high = ViolentWord.objects.aggregate(high=Max('id'))['high']
+        deleted = 0
+        if low is not None:
+            batch_size = options['batch_size']
+            for start in range(low, high + 1, batch_size):
+                deleted += raw_delete_range(ViolentWord, start, start + batch_size - 1)
         # Reset stats for all employees
         updated = Employee.objects.all().update(violent_words_count=0, total_words_count=0)
-        self.stdout.write(self.style.SUCCESS(f'Reset violent word stats for {updated} employees and deleted all violent word occurrences.'))
+        EmployeeStatsRollup.objects.all().update(violent_words_count=0, total_words_count=0)
+        OrganisationStatsRollup.objects.all().update(violent_words_count=0, total_words_count=0)
+        invalidate_dashboard()
+        self.stdout.write(self.style.SUCCESS(f'Reset violent word stats for {updated} employees and deleted {deleted} violent word occurrences.'))
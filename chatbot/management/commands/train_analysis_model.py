@@ -0,0 +1,42 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from chatbot.analysis_backends import train_model
+
+
+class Command(BaseCommand):
+    help = 'Train the local analysis model (violent-word lexicon and scope classifier) from logged analyses.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='JSONL file with "message", "violent_words" and "scopeflag" fields')
+        parser.add_argument('--output', default='analysis_model.json', help='Path of the model file to write')
+        parser.add_argument('--max-ngram', type=int, default=3)
+        parser.add_argument('--min-count', type=int, default=2)
+        parser.add_argument('--min-precision', type=float, default=0.5)
+        parser.add_argument('--epochs', type=int, default=10)
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['input'], encoding='utf-8') as input_file:
+                examples = [json.loads(line) for line in input_file if line.strip()]
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Cannot read training data: {e}')
+        if not examples:
+            raise CommandError('No training examples found.')
+
+        model = train_model(
+            examples,
+            max_ngram=options['max_ngram'],
+            min_count=options['min_count'],
+            min_precision=options['min_precision'],
+            epochs=options['epochs']
+        )
+        with open(options['output'], 'w', encoding='utf-8') as output_file:
+            json.dump(model, output_file, ensure_ascii=False, separators=(',', ':'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Trained on {len(examples)} messages: {len(model["lexicon"])} lexicon entries, '
+            f'{len(model["scope"]["weights"])} scope weights, '
+            f'{os.path.getsize(options["output"])} bytes written to {options["output"]}.'
+        ))
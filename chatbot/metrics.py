@@ -0,0 +1,288 @@
+"""
+Métriques du chatbot : compteurs et histogrammes de latence par étape, exposés au
+format texte Prometheus (vue /metrics)
+
+Les métriques sont déclarées une fois pour toutes à l'import du module, avec
+l'ensemble fixe de leurs étiquettes : chaque série occupe une case d'un tableau
+de flottants. Chaque thread écrit dans son propre tableau (alloué à sa première
+mesure), sans verrou ni allocation ; l'exposition additionne les tableaux de tous
+les threads. À la fin d'un thread, son tableau est ajouté à un tableau commun puis
+libéré : la mémoire et le coût de l'exposition dépendent du nombre de threads
+vivants, et non du nombre de threads créés depuis le démarrage (serveurs qui créent
+un thread par requête). Les valeurs sont propres à chaque processus : avec
+plusieurs workers, chaque processus expose ses propres métriques.
+
+Configuration (settings.CHATBOT_METRICS) :
+    ENABLED  Expose la vue /metrics (les mesures sont toujours collectées)
+"""
+import threading
+import time
+import weakref
+from array import array
+from bisect import bisect_left
+from typing import Dict, Sequence
+
+from django.conf import settings
+
+DEFAULTS = {
+    'ENABLED': True,
+}
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Bornes des histogrammes de latence, en secondes (de la milliseconde à l'appel OpenAI lent)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_metrics = []
+_slot_count = 0
+# Tableaux des threads vivants, précédés du tableau commun des threads terminés
+_shards = []
+_local = threading.local()
+# Réentrant : _retire peut s'exécuter pendant une collecte déclenchée sous ce verrou
+_registry_lock = threading.RLock()
+
+
+def get_config() -> Dict:
+    """Retourne la configuration des métriques, complétée par les valeurs par défaut"""
+    return {**DEFAULTS, **getattr(settings, 'CHATBOT_METRICS', {})}
+
+
+def _allocate(count: int) -> int:
+    """Réserve count cases consécutives et retourne l'indice de la première"""
+    global _slot_count
+    if _shards:
+        raise RuntimeError("Metrics must be declared before the first measurement")
+    first = _slot_count
+    _slot_count += count
+    return first
+
+
+class _ThreadSentinel:
+    """Objet propre à chaque thread, libéré avec ses données locales à la fin du thread"""
+
+    __slots__ = ('__weakref__',)
+
+
+def _shard() -> array:
+    """Tableau des valeurs du thread courant (créé et enregistré à sa première mesure)"""
+    try:
+        return _local.shard
+    except AttributeError:
+        shard = _local.shard = array('d', bytes(8 * _slot_count))
+        sentinel = _local.sentinel = _ThreadSentinel()
+        with _registry_lock:
+            if not _shards:
+                _shards.append(array('d', bytes(8 * _slot_count)))
+            _shards.append(shard)
+        weakref.finalize(sentinel, _retire, shard).atexit = False
+        return shard
+
+
+def _retire(shard: array) -> None:
+    """Ajoute les valeurs d'un thread terminé au tableau commun et oublie son tableau"""
+    with _registry_lock:
+        base = _shards[0]
+        for index, value in enumerate(shard):
+            base[index] += value
+        # Comparaison par identité : deux tableaux de mêmes valeurs sont égaux
+        del _shards[next(position for position, item in enumerate(_shards) if item is shard)]
+
+
+def _totals() -> array:
+    """Somme des valeurs de tous les threads"""
+    totals = array('d', bytes(8 * _slot_count))
+    # Sous le verrou : un thread terminé pendant la somme serait compté deux fois
+    with _registry_lock:
+        for shard in _shards:
+            for index, value in enumerate(shard):
+                totals[index] += value
+    return totals
+
+
+def _format_labels(labels: Dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+class _Metric:
+    """
+    Métrique déclarée avec un ensemble fixe de valeurs pour son étiquette
+
+    Args:
+        name (str): Nom de la métrique
+        documentation (str): Description (ligne HELP)
+        label (str, optional): Nom de l'étiquette
+        values (Sequence[str]): Valeurs possibles de l'étiquette
+    """
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, label: str = None, values: Sequence[str] = ("",),
+                 width: int = 1):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.values = tuple(values)
+        self.width = width
+        with _registry_lock:
+            first = _allocate(width * len(self.values))
+            _metrics.append(self)
+        self._offsets = {value: first + position * width for position, value in enumerate(self.values)}
+        self._default = first
+
+    def _offset(self, value: str) -> int:
+        if value is None:
+            return self._default
+        return self._offsets[value]
+
+    def _labels(self, value: str) -> Dict:
+        return {self.label: value} if self.label else {}
+
+    def render(self, totals: array) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for value in self.values:
+            lines.extend(self._samples(totals, self._offsets[value], self._labels(value)))
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Compteur monotone"""
+
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, label: str = None) -> None:
+        """Incrémente la série de l'étiquette donnée (la seule série sans étiquette par défaut)"""
+        _shard()[self._offset(label)] += amount
+
+    def value(self, label: str = None) -> float:
+        """Valeur totale de la série, tous threads confondus"""
+        return _totals()[self._offset(label)]
+
+    def _samples(self, totals: array, offset: int, labels: Dict):
+        yield f"{self.name}{_format_labels(labels)} {_format_value(totals[offset])}"
+
+
+class Histogram(_Metric):
+    """
+    Histogramme à bornes fixes
+
+    Chaque série occupe une case par borne (plus +Inf), la somme et le nombre
+    d'observations ; les cases ne sont cumulées qu'à l'exposition.
+    """
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, label: str = None, values: Sequence[str] = ("",),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, label, values, width=len(self.buckets) + 3)
+
+    def observe(self, amount: float, label: str = None) -> None:
+        """Ajoute une observation à la série de l'étiquette donnée"""
+        offset = self._offset(label)
+        shard = _shard()
+        shard[offset + bisect_left(self.buckets, amount)] += 1
+        shard[offset + self.width - 2] += amount
+        shard[offset + self.width - 1] += 1
+
+    def time(self, label: str = None) -> 'Span':
+        """Mesure la durée d'un bloc with dans la série de l'étiquette donnée"""
+        return Span(self, label)
+
+    def count(self, label: str = None) -> float:
+        """Nombre d'observations de la série, tous threads confondus"""
+        return _totals()[self._offset(label) + self.width - 1]
+
+    def _samples(self, totals: array, offset: int, labels: Dict):
+        cumulative = 0.0
+        for position, bound in enumerate(self.buckets + (float("inf"),)):
+            cumulative += totals[offset + position]
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            yield f"{self.name}_bucket{_format_labels({**labels, 'le': le})} {_format_value(cumulative)}"
+        yield f"{self.name}_sum{_format_labels(labels)} {repr(totals[offset + self.width - 2])}"
+        yield f"{self.name}_count{_format_labels(labels)} {_format_value(totals[offset + self.width - 1])}"
+
+
+class Span:
+    """Chronomètre d'une étape (seule allocation par mesure), voir Histogram.time"""
+
+    __slots__ = ('histogram', 'label', 'start')
+
+    def __init__(self, histogram: Histogram, label: str = None):
+        self.histogram = histogram
+        self.label = label
+
+    def __enter__(self) -> 'Span':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, self.label)
+
+
+def render() -> str:
+    """Toutes les métriques au format texte Prometheus (version 0.0.4)"""
+    totals = _totals()
+    return "\n".join(metric.render(totals) for metric in _metrics) + "\n"
+
+
+def reset() -> None:
+    """Remet toutes les métriques à zéro (tests et benchmarks)"""
+    with _registry_lock:
+        for shard in _shards:
+            for index in range(len(shard)):
+                shard[index] = 0.0
+
+
+# Étapes chronométrées du traitement d'un message
+STAGES = (
+    "keyword_scan",        # Scan local (sujets sensibles, signaux, thématiques)
+    "llm_analysis",        # Appel combiné réponse + analyse (JSON)
+    "llm_reply",           # Appel de réponse seule (backend local ou requête de secours parallèle)
+    "json_parse",          # Décodage de la réponse JSON et corrections
+    "fallback",            # Réponse de secours après une erreur de l'appel combiné
+    "stats_write",         # Écriture des statistiques d'un employé (ou d'un lot du tampon)
+    "conversation_read",   # Lecture de l'historique de la conversation
+    "conversation_write",  # Enregistrement du tour
+    "summary",             # Mise à jour du résumé de la conversation
+)
+
+ROUTES = ("greeting", "thanks", "goodbye", "sensitive_topic", "llm")
+
+STAGE_SECONDS = Histogram(
+    "chatbot_stage_duration_seconds", "Duration of each message processing stage.", "stage", STAGES
+)
+MESSAGES = Counter("chatbot_messages_total", "Messages answered, by route.", "route", ROUTES)
+FALLBACKS = Counter(
+    "chatbot_fallbacks_total",
+    "Replies returned without the model analysis (error: fallback reply, partial: deadline missed).",
+    "kind", ("error", "partial")
+)
+CACHE_REQUESTS = Counter(
+    "chatbot_completion_cache_requests_total", "Completion cache lookups.", "result", ("hit", "miss")
+)
+SCOPE_OVERRIDES = Counter(
+    "chatbot_scope_overrides_total", "Model scopeflags overridden by the workplace or sensitive topic rules."
+)
+VIOLENT_WORDS = Counter("chatbot_violent_words_total", "Violent words detected in answered messages.")
+LLM_ATTEMPTS = Counter("chatbot_llm_attempts_total", "Model API calls, by outcome.", "outcome", ("success", "error"))
+LLM_RETRIES = Counter("chatbot_llm_retries_total", "Model API calls retried after a transient error.")
+LLM_REJECTED = Counter(
+    "chatbot_llm_rejected_total", "Model API calls refused locally (open circuit or local rate limit).",
+    "reason", ("circuit_open", "rate_limited")
+)
+LLM_COALESCED = Counter("chatbot_llm_coalesced_total", "Calls served by an identical in-flight model call.")
+JSON_OUTPUTS = Counter(
+    "chatbot_json_outputs_total",
+    "JSON outputs of the combined model call, by outcome (valid, repaired locally, invalid: fallback needed).",
+    "outcome", ("valid", "repaired", "invalid")
+)
+PROMPT_TOKENS = Counter(
+    "chatbot_prompt_tokens_total", "Estimated input tokens of the model requests built, by part (see chatbot.prompts).",
+    "part", ("instructions", "history", "message")
+)
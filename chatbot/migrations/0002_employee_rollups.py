@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmployeeStatsRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Jour'), ('week', 'Semaine')], max_length=4, verbose_name='Période')),
+                ('period_start', models.DateField(verbose_name='Début de la période')),
+                ('messages_count', models.IntegerField(default=0, verbose_name='Nombre de messages')),
+                ('total_words_count', models.IntegerField(default=0, verbose_name='Nombre de mots total')),
+                ('violent_words_count', models.IntegerField(default=0, verbose_name='Nombre de mots violents')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats_rollups', to='chatbot.employee')),
+            ],
+            options={
+                'verbose_name': 'Agrégat de statistiques',
+                'verbose_name_plural': 'Agrégats de statistiques',
+                'unique_together': {('employee', 'period', 'period_start')},
+            },
+        ),
+        migrations.CreateModel(
+            name='EmployeeThemeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Jour'), ('week', 'Semaine')], max_length=4, verbose_name='Période')),
+                ('period_start', models.DateField(verbose_name='Début de la période')),
+                ('count', models.IntegerField(default=0, verbose_name="Nombre d'occurrences")),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='theme_rollups', to='chatbot.employee')),
+                ('theme', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='chatbot.psychologicaltheme')),
+            ],
+            options={
+                'verbose_name': 'Agrégat de thématique',
+                'verbose_name_plural': 'Agrégats de thématiques',
+                'unique_together': {('employee', 'theme', 'period', 'period_start')},
+            },
+        ),
+    ]
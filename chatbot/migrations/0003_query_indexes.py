@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0002_employee_rollups'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='violentword',
+            name='employee',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='violent_words', to='chatbot.employee'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['first_name', 'last_name'], name='employee_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employeethemerollup',
+            index=models.Index(fields=['employee', 'period', 'period_start'], name='themerollup_emp_period_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='violentword',
+            index=models.Index(fields=['employee', '-timestamp'], name='violentword_emp_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0003_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrganisationStatsRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Jour'), ('week', 'Semaine')], max_length=4, verbose_name='Période')),
+                ('period_start', models.DateField(verbose_name='Début de la période')),
+                ('messages_count', models.IntegerField(default=0, verbose_name='Nombre de messages')),
+                ('total_words_count', models.IntegerField(default=0, verbose_name='Nombre de mots total')),
+                ('violent_words_count', models.IntegerField(default=0, verbose_name='Nombre de mots violents')),
+            ],
+            options={
+                'verbose_name': "Agrégat de l'organisation",
+                'verbose_name_plural': "Agrégats de l'organisation",
+                'unique_together': {('period', 'period_start')},
+            },
+        ),
+        migrations.CreateModel(
+            name='OrganisationThemeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Jour'), ('week', 'Semaine')], max_length=4, verbose_name='Période')),
+                ('period_start', models.DateField(verbose_name='Début de la période')),
+                ('count', models.IntegerField(default=0, verbose_name="Nombre d'occurrences")),
+                ('theme', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='chatbot.psychologicaltheme')),
+            ],
+            options={
+                'verbose_name': "Agrégat de thématique de l'organisation",
+                'verbose_name_plural': "Agrégats de thématiques de l'organisation",
+                'indexes': [models.Index(fields=['period', 'period_start'], name='orgthemerollup_period_idx')],
+                'unique_together': {('theme', 'period', 'period_start')},
+            },
+        ),
+        migrations.AlterField(
+            model_name='employeethemecounter',
+            name='theme',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='chatbot.psychologicaltheme'),
+        ),
+        migrations.AddIndex(
+            model_name='employeethemecounter',
+            index=models.Index(fields=['theme', 'count'], name='themecounter_theme_count_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:36
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0004_organisation_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('summary', models.TextField(blank=True, default='', verbose_name='Résumé des échanges précédents')),
+                ('summary_tokens', models.IntegerField(default=0, verbose_name='Taille estimée du résumé (tokens)')),
+                ('summarized_until', models.BigIntegerField(default=0, verbose_name='Dernier message résumé')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('employee', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='conversations', to='chatbot.employee')),
+            ],
+            options={
+                'verbose_name': 'Conversation',
+                'verbose_name_plural': 'Conversations',
+            },
+        ),
+        migrations.CreateModel(
+            name='Message',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('user', 'Utilisateur'), ('assistant', 'Assistant')], max_length=9, verbose_name='Rôle')),
+                ('content', models.TextField(verbose_name='Contenu')),
+                ('tokens', models.IntegerField(default=0, verbose_name='Taille estimée (tokens)')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('conversation', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='chatbot.conversation')),
+            ],
+            options={
+                'verbose_name': 'Message',
+                'verbose_name_plural': 'Messages',
+                'indexes': [models.Index(fields=['conversation', '-id'], name='message_conv_id_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:52
+
+from django.db import migrations, models
+
+# Synonymes des thématiques par défaut (copie figée de chatbot.themes.DEFAULT_THEMES)
+DEFAULT_SYNONYMS = {
+    "Harcèlement": "harceleur, harcèlement moral, persécuté, persécution",
+    "Dépression": "déprimé, déprime, dépressif, dépressive, idées noires",
+    "Burnout": "burn out, épuisement professionnel",
+    "Stress": "tendu, nerveux",
+    "Anxiété": "anxieux, anxieuse, angoisse, angoissé, inquiet, inquiète",
+    "Conflit": "conflictuel, dispute, désaccord, altercation",
+    "Discrimination": "discriminé, inégalité de traitement",
+    "Surcharge": "débordé, surmenage, trop de travail",
+    "Pression": "sous pression, objectifs intenables",
+    "Isolement": "isolé, mis à l'écart, mise à l'écart, exclu",
+    "Intimidation": "intimidé, menace, menacé",
+    "Épuisement": "épuisé, à bout, exténué",
+    "Mobbing": "harcèlement collectif",
+    "Violence": "violent, agression, agressif, frappé",
+    "Maltraitance": "maltraité, humilié, humiliation",
+}
+
+
+def fill_default_synonyms(apps, schema_editor):
+    """Complète les thématiques par défaut déjà créées, sans écraser une saisie de l'admin"""
+    PsychologicalTheme = apps.get_model('chatbot', 'PsychologicalTheme')
+    themes = list(PsychologicalTheme.objects.filter(name__in=DEFAULT_SYNONYMS, synonyms=''))
+    for theme in themes:
+        theme.synonyms = DEFAULT_SYNONYMS[theme.name]
+    PsychologicalTheme.objects.bulk_update(themes, ['synonyms'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0005_conversations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='psychologicaltheme',
+            name='synonyms',
+            field=models.TextField(blank=True, default='', help_text='Mots ou expressions séparés par des virgules ; les accents et les terminaisons sont ignorés', verbose_name='Synonymes'),
+        ),
+        migrations.RunPython(fill_default_synonyms, migrations.RunPython.noop),
+    ]
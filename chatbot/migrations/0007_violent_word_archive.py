@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0006_theme_synonyms'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ViolentWordArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True, verbose_name='Jour de détection')),
+                ('rows', models.IntegerField(default=0, verbose_name='Nombre de mots archivés')),
+            ],
+            options={
+                'verbose_name': 'Archive de mots violents',
+                'verbose_name_plural': 'Archives de mots violents',
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+from django.db import migrations
+
+# Thématiques par défaut (copie figée de chatbot.themes.DEFAULT_THEMES)
+DEFAULT_THEMES = [
+    ("Harcèlement", "Comportements répétés visant à dégrader les conditions de travail",
+     "harceleur, harcèlement moral, persécuté, persécution"),
+    ("Dépression", "Trouble mental caractérisé par une tristesse persistante",
+     "déprimé, déprime, dépressif, dépressive, idées noires"),
+    ("Burnout", "Syndrome d'épuisement professionnel", "burn out, épuisement professionnel"),
+    ("Stress", "Réaction du corps face à une pression excessive", "tendu, nerveux"),
+    ("Anxiété", "Sentiment d'inquiétude, de nervosité ou de peur",
+     "anxieux, anxieuse, angoisse, angoissé, inquiet, inquiète"),
+    ("Conflit", "Opposition entre personnes ou groupes dans l'entreprise",
+     "conflictuel, dispute, désaccord, altercation"),
+    ("Discrimination", "Traitement inégal basé sur certains critères", "discriminé, inégalité de traitement"),
+    ("Surcharge", "Excès de travail ou de responsabilités", "débordé, surmenage, trop de travail"),
+    ("Pression", "Contraintes imposées pour atteindre des objectifs", "sous pression, objectifs intenables"),
+    ("Isolement", "Sentiment d'être mis à l'écart dans l'environnement professionnel",
+     "isolé, mis à l'écart, mise à l'écart, exclu"),
+    ("Intimidation", "Comportement visant à faire peur ou à dominer", "intimidé, menace, menacé"),
+    ("Épuisement", "État de fatigue extrême, physique ou émotionnelle", "épuisé, à bout, exténué"),
+    ("Mobbing", "Harcèlement moral collectif", "harcèlement collectif"),
+    ("Violence", "Comportements agressifs ou abusifs", "violent, agression, agressif, frappé"),
+    ("Maltraitance", "Mauvais traitements infligés dans le cadre professionnel", "maltraité, humilié, humiliation"),
+]
+
+
+def create_default_themes(apps, schema_editor):
+    """
+    Crée les thématiques par défaut dans une base qui n'en a aucune
+
+    Remplace l'initialisation faite auparavant par la page d'accueil : une base
+    dont les thématiques ont été saisies ou supprimées dans l'admin n'est pas modifiée.
+    """
+    PsychologicalTheme = apps.get_model('chatbot', 'PsychologicalTheme')
+    if PsychologicalTheme.objects.exists():
+        return
+    PsychologicalTheme.objects.bulk_create(
+        PsychologicalTheme(name=name, description=description, synonyms=synonyms)
+        for name, description, synonyms in DEFAULT_THEMES
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0007_violent_word_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_default_themes, migrations.RunPython.noop),
+    ]
@@ -30,13 +30,18 @@ class Employee(models.Model):
     class Meta:
         verbose_name = "Employé"
         verbose_name_plural = "Employés"
+        indexes = [
+            # Recherche de l'employé de démonstration par son nom (identity.demo_employee_id)
+            models.Index(fields=['first_name', 'last_name'], name='employee_name_idx'),
+        ]
 
 
 class ViolentWord(models.Model):
     """
     Modèle pour stocker les occurrences de mots violents utilisés par les employés
     """
-    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='violent_words')
+    # L'index composite ci-dessous sert aussi les recherches par employé seul
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='violent_words', db_index=False)
     word = models.CharField(max_length=100, verbose_name="Mot violent")
     timestamp = models.DateTimeField(default=timezone.now)
     
@@ -46,6 +51,26 @@ class ViolentWord(models.Model):
     class Meta:
         verbose_name = "Mot violent"
         verbose_name_plural = "Mots violents"
+        indexes = [
+            # Mots violents récents d'un employé (views.employee_stats), sans tri temporaire
+            models.Index(fields=['employee', '-timestamp'], name='violentword_emp_ts_idx'),
+        ]
+
+
+class ViolentWordArchive(models.Model):
+    """
+    Modèle pour le registre des mots violents archivés puis supprimés, par jour de
+    détection (voir retention.py)
+    """
+    day = models.DateField(unique=True, verbose_name="Jour de détection")
+    rows = models.IntegerField(default=0, verbose_name="Nombre de mots archivés")
+
+    class Meta:
+        verbose_name = "Archive de mots violents"
+        verbose_name_plural = "Archives de mots violents"
+
+    def __str__(self):
+        return f"{self.day}: {self.rows}"
 
 
 class PsychologicalTheme(models.Model):
@@ -54,6 +79,11 @@ class PsychologicalTheme(models.Model):
     """
     name = models.CharField(max_length=100, unique=True, verbose_name="Nom de la thématique")
     description = models.TextField(blank=True, null=True, verbose_name="Description")
+    # Termes reconnus en plus du nom, aux flexions près (voir theme_index)
+    synonyms = models.TextField(
+        blank=True, default="", verbose_name="Synonymes",
+        help_text="Mots ou expressions séparés par des virgules ; les accents et les terminaisons sont ignorés"
+    )
     
     def __str__(self):
         return self.name
@@ -68,13 +98,167 @@ class EmployeeThemeCounter(models.Model):
     Modèle pour compter les occurrences de thématiques psychologiques par employé
     """
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='theme_counters')
-    theme = models.ForeignKey(PsychologicalTheme, on_delete=models.CASCADE)
+    # L'index composite ci-dessous sert aussi les recherches par thématique seule
+    theme = models.ForeignKey(PsychologicalTheme, on_delete=models.CASCADE, db_index=False)
     count = models.IntegerField(default=0, verbose_name="Nombre d'occurrences")
     
     class Meta:
         unique_together = ('employee', 'theme')
+        indexes = [
+            # Index couvrant des totaux par thématique du tableau de bord (sans lire la table)
+            models.Index(fields=['theme', 'count'], name='themecounter_theme_count_idx'),
+        ]
         verbose_name = "Compteur de thématique"
         verbose_name_plural = "Compteurs de thématiques"
     
     def __str__(self):
         return f"{self.employee} - {self.theme}: {self.count}"
+
+
+class EmployeeStatsRollup(models.Model):
+    """
+    Modèle pour agréger les statistiques d'un employé par jour et par semaine
+
+    Mis à jour à chaque écriture de statistiques, il permet de servir des tendances
+    sur une période sans parcourir les mots violents.
+    """
+    PERIOD_DAY = 'day'
+    PERIOD_WEEK = 'week'
+    PERIOD_CHOICES = [
+        (PERIOD_DAY, 'Jour'),
+        (PERIOD_WEEK, 'Semaine'),
+    ]
+
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='stats_rollups')
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES, verbose_name="Période")
+    period_start = models.DateField(verbose_name="Début de la période")
+    messages_count = models.IntegerField(default=0, verbose_name="Nombre de messages")
+    total_words_count = models.IntegerField(default=0, verbose_name="Nombre de mots total")
+    violent_words_count = models.IntegerField(default=0, verbose_name="Nombre de mots violents")
+
+    class Meta:
+        unique_together = ('employee', 'period', 'period_start')
+        verbose_name = "Agrégat de statistiques"
+        verbose_name_plural = "Agrégats de statistiques"
+
+    def __str__(self):
+        return f"{self.employee} - {self.period} {self.period_start}"
+
+
+class EmployeeThemeRollup(models.Model):
+    """
+    Modèle pour agréger les occurrences de thématiques d'un employé par jour et par semaine
+    """
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='theme_rollups')
+    theme = models.ForeignKey(PsychologicalTheme, on_delete=models.CASCADE)
+    period = models.CharField(max_length=4, choices=EmployeeStatsRollup.PERIOD_CHOICES, verbose_name="Période")
+    period_start = models.DateField(verbose_name="Début de la période")
+    count = models.IntegerField(default=0, verbose_name="Nombre d'occurrences")
+
+    class Meta:
+        unique_together = ('employee', 'theme', 'period', 'period_start')
+        indexes = [
+            # Tendances d'un employé toutes thématiques confondues (rollups.get_employee_trends)
+            models.Index(fields=['employee', 'period', 'period_start'], name='themerollup_emp_period_idx'),
+        ]
+        verbose_name = "Agrégat de thématique"
+        verbose_name_plural = "Agrégats de thématiques"
+
+    def __str__(self):
+        return f"{self.employee} - {self.theme} - {self.period} {self.period_start}: {self.count}"
+
+
+class OrganisationStatsRollup(models.Model):
+    """
+    Modèle pour agréger les statistiques de tous les employés par jour et par semaine
+    (tableau de bord de l'organisation)
+    """
+    period = models.CharField(max_length=4, choices=EmployeeStatsRollup.PERIOD_CHOICES, verbose_name="Période")
+    period_start = models.DateField(verbose_name="Début de la période")
+    messages_count = models.IntegerField(default=0, verbose_name="Nombre de messages")
+    total_words_count = models.IntegerField(default=0, verbose_name="Nombre de mots total")
+    violent_words_count = models.IntegerField(default=0, verbose_name="Nombre de mots violents")
+
+    class Meta:
+        unique_together = ('period', 'period_start')
+        verbose_name = "Agrégat de l'organisation"
+        verbose_name_plural = "Agrégats de l'organisation"
+
+    def __str__(self):
+        return f"{self.period} {self.period_start}"
+
+
+class OrganisationThemeRollup(models.Model):
+    """
+    Modèle pour agréger les occurrences de thématiques de tous les employés par jour et par semaine
+    """
+    theme = models.ForeignKey(PsychologicalTheme, on_delete=models.CASCADE)
+    period = models.CharField(max_length=4, choices=EmployeeStatsRollup.PERIOD_CHOICES, verbose_name="Période")
+    period_start = models.DateField(verbose_name="Début de la période")
+    count = models.IntegerField(default=0, verbose_name="Nombre d'occurrences")
+
+    class Meta:
+        unique_together = ('theme', 'period', 'period_start')
+        indexes = [
+            # Carte des thématiques sur un intervalle (dashboard.get_dashboard)
+            models.Index(fields=['period', 'period_start'], name='orgthemerollup_period_idx'),
+        ]
+        verbose_name = "Agrégat de thématique de l'organisation"
+        verbose_name_plural = "Agrégats de thématiques de l'organisation"
+
+    def __str__(self):
+        return f"{self.theme} - {self.period} {self.period_start}: {self.count}"
+
+
+class Conversation(models.Model):
+    """
+    Modèle pour la mémoire d'une conversation avec le chatbot
+
+    Les messages les plus anciens sont condensés dans un résumé glissant : seuls le
+    résumé et les derniers messages sont renvoyés au modèle (voir conversations).
+    """
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, null=True, blank=True,
+                                 related_name='conversations')
+    summary = models.TextField(blank=True, default="", verbose_name="Résumé des échanges précédents")
+    summary_tokens = models.IntegerField(default=0, verbose_name="Taille estimée du résumé (tokens)")
+    # ID du dernier message intégré au résumé (0 si aucun)
+    summarized_until = models.BigIntegerField(default=0, verbose_name="Dernier message résumé")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Conversation"
+        verbose_name_plural = "Conversations"
+
+    def __str__(self):
+        return f"Conversation {self.id} - {self.employee or 'anonyme'}"
+
+
+class Message(models.Model):
+    """
+    Modèle pour un message d'une conversation (utilisateur ou assistant)
+    """
+    ROLE_USER = 'user'
+    ROLE_ASSISTANT = 'assistant'
+    ROLE_CHOICES = [
+        (ROLE_USER, 'Utilisateur'),
+        (ROLE_ASSISTANT, 'Assistant'),
+    ]
+
+    # L'index composite ci-dessous sert aussi les recherches par conversation seule
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='messages', db_index=False)
+    role = models.CharField(max_length=9, choices=ROLE_CHOICES, verbose_name="Rôle")
+    content = models.TextField(verbose_name="Contenu")
+    # Taille estimée à l'enregistrement : le contexte est construit sans réestimer l'historique
+    tokens = models.IntegerField(default=0, verbose_name="Taille estimée (tokens)")
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Message"
+        verbose_name_plural = "Messages"
+        indexes = [
+            # Derniers messages non résumés d'une conversation (conversations.build_context)
+            models.Index(fields=['conversation', '-id'], name='message_conv_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.conversation_id} - {self.role}: {self.content[:50]}"
@@ -0,0 +1,258 @@
+"""
+Décodage des réponses JSON du modèle (appel combiné réponse + analyse)
+
+Le contenu est validé par le schéma Analysis (pydantic) : "response" est
+obligatoire, "violent_words" est ramené à une liste de chaînes et "scopeflag" à un
+booléen. Une sortie mal formée n'est pas rejetée d'emblée : repair_json supprime le
+texte autour de l'objet (balises de code, texte d'accompagnement), les virgules en trop, et
+referme un objet tronqué en abandonnant le membre interrompu. La requête de secours
+n'est nécessaire que si la réponse elle-même est absente ou coupée.
+
+ResponseStreamParser décode "response" au fil des morceaux d'une complétion
+diffusée, pour transmettre la réponse avant la fermeture de l'objet.
+"""
+import re
+from typing import List, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
+
+from . import metrics
+
+_JSON_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+# Littéral ou nombre en fin de sortie tronquée
+_TRAILING_SCALAR = re.compile(r'[A-Za-z0-9.+\-]+$')
+_COMPLETE_SCALAR = re.compile(r'(true|false|null|-?(0|[1-9]\d*)(\.\d+)?([eE][+-]?\d+)?)$')
+
+
+class ParseError(ValueError):
+    """Sortie du modèle inutilisable, même après réparation"""
+
+
+class Analysis(BaseModel):
+    """Schéma de la réponse JSON de l'appel combiné"""
+
+    model_config = ConfigDict(extra="ignore")
+
+    response: str = Field(min_length=1)
+    violent_words: List[str] = []
+    scopeflag: bool = False
+
+    @field_validator("violent_words", mode="before")
+    @classmethod
+    def _clean_words(cls, value):
+        # Tolère null, une chaîne isolée et les éléments qui ne sont pas des chaînes
+        if value is None:
+            return []
+        if isinstance(value, str):
+            value = [value]
+        if not isinstance(value, list):
+            return value
+        return [word.strip() for word in value if isinstance(word, str) and word.strip()]
+
+    @property
+    def complete(self) -> bool:
+        """Vrai si l'analyse (mots violents et scopeflag) figure dans la sortie"""
+        return {"violent_words", "scopeflag"} <= self.model_fields_set
+
+
+def _drop_member(out: List[str], member_start: int) -> None:
+    """Retire le membre commencé en member_start et la virgule qui le précède"""
+    del out[member_start:]
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ',':
+        out.pop()
+
+
+def repair_json(text: str) -> Optional[str]:
+    """
+    Répare localement un objet JSON mal formé ou tronqué
+
+    Le texte avant la première accolade et après l'objet est ignoré, les virgules
+    précédant une fermeture sont supprimées. Si la sortie s'arrête avant la fin de
+    l'objet, le membre ou l'élément interrompu (chaîne, littéral, clé sans valeur)
+    est abandonné, puis les tableaux et objets ouverts sont refermés.
+
+    Args:
+        text (str): Sortie brute du modèle
+
+    Returns:
+        str | None: Objet JSON réparé, ou None si aucun objet n'a été trouvé ou si
+        les accolades et crochets ne correspondent pas
+    """
+    start = text.find("{")
+    if start < 0:
+        return None
+
+    out: List[str] = []
+    # Pile des conteneurs ouverts : (caractère, position du membre ou élément en cours)
+    stack: List[Tuple[str, int]] = []
+    in_string = escape = False
+    for char in text[start:]:
+        if in_string:
+            out.append(char)
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append((char, len(out) + 1))
+        elif char in '}]':
+            if not stack or stack[-1][0] != ('{' if char == '}' else '['):
+                return None
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ',':
+                out.pop()
+            stack.pop()
+            out.append(char)
+            if not stack:
+                return "".join(out)
+            continue
+        elif char == ',':
+            stack[-1] = (stack[-1][0], len(out) + 1)
+        out.append(char)
+
+    # Sortie tronquée : abandonner le membre ou l'élément interrompu
+    container, member_start = stack[-1]
+    tail = "".join(out[member_start:]).strip()
+    scalar = _TRAILING_SCALAR.search(tail)
+    interrupted = (
+        in_string
+        or (container == '{' and ':' not in tail and tail)
+        or tail.endswith(':')
+        or (scalar is not None and not _COMPLETE_SCALAR.search(scalar.group()))
+    )
+    if interrupted:
+        _drop_member(out, member_start)
+    else:
+        while out and out[-1].isspace():
+            out.pop()
+        if out and out[-1] == ',':
+            out.pop()
+    for container, _ in reversed(stack):
+        out.append('}' if container == '{' else ']')
+    return "".join(out)
+
+
+def parse_analysis(content: str) -> Analysis:
+    """
+    Valide la réponse JSON du modèle, en la réparant localement si nécessaire
+
+    Args:
+        content (str): Contenu renvoyé par le modèle en mode JSON
+
+    Returns:
+        Analysis: Réponse, mots violents et scopeflag (voir Analysis.complete
+        pour savoir si l'analyse a survécu à une troncature)
+
+    Raises:
+        ParseError: Si aucune réponse complète ne peut être extraite
+    """
+    try:
+        analysis = Analysis.model_validate_json(content or "")
+    except ValidationError as error:
+        repaired = repair_json(content or "")
+        if repaired is None:
+            metrics.JSON_OUTPUTS.inc(label="invalid")
+            raise ParseError(f"Malformed model output: {error.errors()[0]['msg']}") from error
+        try:
+            analysis = Analysis.model_validate_json(repaired)
+        except ValidationError as repair_error:
+            metrics.JSON_OUTPUTS.inc(label="invalid")
+            raise ParseError(f"Unusable model output: {repair_error.errors()[0]['msg']}") from error
+        metrics.JSON_OUTPUTS.inc(label="repaired")
+        return analysis
+    metrics.JSON_OUTPUTS.inc(label="valid")
+    return analysis
+
+
+class ResponseStreamParser:
+    """
+    Décode une complétion JSON diffusée par morceaux
+
+    feed retourne au fil de l'eau le texte de la clé "response", pour diffuser la
+    réponse avant la fin de la complétion ; close valide le contenu complet.
+    """
+
+    def __init__(self):
+        self._chunks: List[str] = []
+        self._buffer = ""
+        self._state = "seek"
+
+    @property
+    def content(self) -> str:
+        """Contenu reçu jusqu'ici"""
+        return "".join(self._chunks)
+
+    def feed(self, chunk: str) -> str:
+        """
+        Ajoute un morceau de JSON et retourne le texte de "response" nouvellement décodé
+
+        Args:
+            chunk (str): Morceau de la complétion JSON
+
+        Returns:
+            str: Texte décodé disponible (éventuellement vide)
+        """
+        self._chunks.append(chunk)
+        if self._state == "done":
+            return ""
+        self._buffer += chunk
+        if self._state == "seek":
+            match = re.search(r'"response"\s*:\s*"', self._buffer)
+            if not match:
+                # Conserver la fin du tampon au cas où la clé serait coupée en deux
+                self._buffer = self._buffer[-32:]
+                return ""
+            self._buffer = self._buffer[match.end():]
+            self._state = "value"
+
+        buffer, out, i = self._buffer, [], 0
+        while i < len(buffer):
+            char = buffer[i]
+            if char == '"':
+                self._state = "done"
+                i += 1
+                break
+            if char == '\\':
+                if i + 1 >= len(buffer):
+                    break
+                escape = buffer[i + 1]
+                if escape == 'u':
+                    # Séquence \uXXXX, éventuellement paire de substitution \uD83D\uDE00
+                    if i + 6 > len(buffer):
+                        break
+                    code = int(buffer[i + 2:i + 6], 16)
+                    if 0xD800 <= code < 0xDC00:
+                        if i + 12 > len(buffer):
+                            break
+                        low = int(buffer[i + 8:i + 12], 16)
+                        out.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                        i += 12
+                    else:
+                        out.append(chr(code))
+                        i += 6
+                    continue
+                out.append(_JSON_ESCAPES.get(escape, escape))
+                i += 2
+                continue
+            out.append(char)
+            i += 1
+        self._buffer = "" if self._state == "done" else buffer[i:]
+        return "".join(out)
+
+    def close(self) -> Analysis:
+        """
+        Valide la complétion reçue (voir parse_analysis)
+
+        Raises:
+            ParseError: Si aucune réponse complète ne peut être extraite
+        """
+        return parse_analysis(self.content)
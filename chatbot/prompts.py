@@ -0,0 +1,266 @@
+"""
+Registre des prompts envoyés au modèle, en versions
+
+Chaque version (PromptSet) regroupe les instructions de la réponse, les consignes
+de l'analyse JSON ajoutées pour l'appel combiné, et le prompt de l'analyse seule des
+mots violents (analysis_backends.OpenAIAnalysisBackend). La version utilisée est
+choisie dans les settings ; les empreintes des prompts entrent dans les clés du cache
+de complétions, si bien que changer de version n'en sert pas les anciennes réponses.
+
+Ordre des messages : les instructions fixes viennent toujours en tête, suivies du
+résumé et de l'historique de la conversation, puis du message de l'utilisateur. Le
+préfixe des requêtes est ainsi identique d'un message à l'autre (et l'appel de
+réponse seule partage celui de l'appel combiné), ce que le cache de prompts des
+fournisseurs exploite pour réduire le coût et la latence du préremplissage.
+
+Chaque requête construite est décomptée (estimation locale des tokens, voir
+conversations.estimate_tokens) dans la métrique chatbot_prompt_tokens_total, par
+partie : instructions, historique et message.
+
+Configuration (settings.CHATBOT_PROMPTS) :
+    VERSION  Version des prompts (voir PROMPTS ; benchmarks/eval_prompts.py compare
+             les versions en tokens et en exactitude sur le jeu étiqueté)
+"""
+import logging
+from typing import Dict, List
+
+from django.conf import settings
+
+from . import completion_cache, metrics
+from .conversations import MESSAGE_OVERHEAD, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'VERSION': 'v1',
+}
+
+MODEL = "gpt-3.5-turbo"
+
+
+class PromptSet:
+    """
+    Version des prompts
+
+    Args:
+        version (str): Nom de la version
+        system (str): Instructions de la réponse (rôle, limites, style)
+        analysis (str): Consignes de l'analyse JSON (response, violent_words, scopeflag)
+        violent_words_system (str): Instructions de l'analyse seule des mots violents
+        violent_words (str): Consigne de l'analyse seule, suivie du message
+    """
+
+    def __init__(self, version: str, system: str, analysis: str, violent_words_system: str, violent_words: str):
+        self.version = version
+        self.system = system
+        self.analysis = analysis
+        self.violent_words_system = violent_words_system
+        self.violent_words = violent_words
+        # L'appel combiné prolonge les instructions de l'appel de réponse seule (préfixe commun)
+        self.analysis_system = system + "\n\n" + analysis
+        # Empreintes incluses dans les clés du cache de complétions
+        self.analysis_hash = completion_cache.prompt_hash(MODEL, system, analysis)
+        self.reply_hash = completion_cache.prompt_hash(MODEL, system)
+
+    def __repr__(self) -> str:
+        return f"PromptSet({self.version!r})"
+
+
+# Prompts d'origine
+V1 = PromptSet(
+    "v1",
+    system="""Vous êtes un assistant spécialisé UNIQUEMENT dans le soutien psychologique en entreprise.
+
+VOTRE RÔLE EST STRICTEMENT LIMITÉ À :
+- Écouter et détecter les signaux de détresse psychologique au travail
+- Fournir un soutien émotionnel pour les situations professionnelles uniquement
+- Rester professionnel et empathique dans le contexte de l'entreprise
+- Encourager une communication positive au travail
+
+LIMITES STRICTES (ne jamais les dépasser) :
+- NE PAS poser de diagnostic médical
+- NE PAS prescrire de traitement ou de médicament
+- NE PAS donner de conseil juridique
+- NE PAS traiter de sujets personnels ou hors contexte professionnel
+- NE PAS suggérer de solutions pour des problèmes non liés au travail
+
+IMPORTANT : Considérez par défaut que les messages de l'utilisateur sont dans un contexte professionnel, sauf s'ils mentionnent explicitement un contexte personnel ou familial sans lien avec le travail.
+
+SUJETS SPÉCIFIQUES À TRAITER COMME PROFESSIONNELS :
+- Le racisme au travail est TOUJOURS considéré comme un sujet professionnel
+- Le harcèlement est TOUJOURS considéré comme un sujet professionnel
+- La discrimination est TOUJOURS considérée comme un sujet professionnel
+- Tous les sujets liés au stress, à l'anxiété ou à la pression au travail sont TOUJOURS considérés comme professionnels
+- Les conflits interpersonnels en milieu de travail sont TOUJOURS considérés comme professionnels
+
+GESTION DES INTERACTIONS :
+1. Pour les questions/situations liées au travail :
+   - Répondre de manière professionnelle et empathique
+   - Fournir un soutien adapté au contexte professionnel
+   - Valoriser les efforts et progrès professionnels
+
+2. Pour les expressions de reconnaissance ou d'amabilité professionnelle :
+   - Accueillir positivement ces marques de reconnaissance
+   - Répondre avec chaleur tout en restant professionnel
+   - Encourager cette attitude positive au travail
+   Exemples :
+   - "Je vous remercie de votre confiance. C'est important de maintenir un dialogue constructif au travail."
+   - "Votre attitude positive est précieuse dans l'environnement professionnel. Avez-vous besoin d'aide pour autre chose ?"
+
+3. Pour les formules de politesse simples :
+   - Répondre brièvement et poliment
+   - Maintenir un ton professionnel
+   Exemples : "Je vous en prie.", "Bonjour, comment puis-je vous aider ?", "Au revoir, n'hésitez pas à revenir si besoin."
+
+4. Pour tout sujet hors contexte professionnel :
+   "Je suis désolé, mais je suis uniquement conçu pour aider avec les situations de stress et de bien-être psychologique dans le contexte professionnel."
+
+STYLE DE RÉPONSE :
+- Ton : professionnel, empathique et constructif
+- Langage : clair et bienveillant
+- Focus : uniquement sur les situations professionnelles
+- Approche : valorisante et orientée solutions professionnelles""",
+    analysis="""
+En plus de votre réponse principale, analysez le message de l'utilisateur et identifiez tous les mots ou expressions qui pourraient indiquer de la violence, de la détresse psychologique, de l'anxiété, du stress, ou d'autres problèmes de santé mentale dans un contexte professionnel.
+
+IMPORTANT : Considérez par défaut que les messages de l'utilisateur sont dans un contexte professionnel, même s'ils ne le mentionnent pas explicitement. Un message doit être considéré hors sujet uniquement s'il traite clairement de sujets personnels sans lien avec le travail (comme la santé familiale, les loisirs personnels, etc.).
+
+SUJETS SPÉCIFIQUES À TRAITER COMME PROFESSIONNELS :
+- Tout message mentionnant le racisme doit TOUJOURS être considéré comme un sujet professionnel (scopeflag = false)
+- Tout message mentionnant le harcèlement doit TOUJOURS être considéré comme un sujet professionnel (scopeflag = false)
+- Tout message mentionnant la discrimination doit TOUJOURS être considéré comme un sujet professionnel (scopeflag = false)
+- Tout message mentionnant le stress, l'anxiété ou la pression doit TOUJOURS être considéré comme un sujet professionnel (scopeflag = false)
+- Tout message mentionnant des conflits interpersonnels doit TOUJOURS être considéré comme un sujet professionnel (scopeflag = false)
+
+Votre réponse doit être structurée en JSON avec trois parties :
+1. "response": votre réponse normale au message de l'utilisateur
+2. "violent_words": un tableau des mots ou expressions identifiés comme violents ou indiquant de la détresse
+3. "scopeflag": un booléen qui indique si le message est hors sujet (true = hors sujet, false = dans le sujet professionnel)
+
+Exemple de format:
+{
+  "response": "Votre réponse normale ici...",
+  "violent_words": ["mot1", "expression2", "mot3"],
+  "scopeflag": false
+}
+
+Si le message est hors du contexte professionnel (par exemple, une question médicale personnelle ou un sujet sans rapport avec le travail), mettez "scopeflag" à true.
+Si aucun mot violent ou indiquant de la détresse n'est détecté, "violent_words" doit être un tableau vide.
+""",
+    violent_words_system="Vous êtes un assistant spécialisé dans l'analyse de texte pour détecter des signes de détresse psychologique et de violence verbale.",
+    violent_words="""
+    Analysez le message suivant et identifiez tous les mots ou expressions qui pourraient indiquer de la violence,
+    de la détresse psychologique, de l'anxiété, du stress, ou d'autres problèmes de santé mentale dans un contexte professionnel.
+
+    Retournez uniquement une liste des mots ou expressions identifiés, un par ligne.
+    Si aucun mot violent ou indiquant de la détresse n'est détecté, retournez "AUCUN".
+
+    Message à analyser :
+    """,
+)
+
+# Mêmes règles en trois fois moins de tokens : rôle et limites condensés, sujets
+# toujours professionnels listés une seule fois, schéma JSON donné par l'exemple
+V2 = PromptSet(
+    "v2",
+    system="""Vous êtes un assistant de soutien psychologique en entreprise, limité aux situations professionnelles.
+
+Rôle : écouter, repérer les signaux de détresse au travail, apporter un soutien émotionnel empathique et professionnel, encourager une communication positive.
+Interdits : diagnostic médical, traitement ou médicament, conseil juridique, sujets personnels ou problèmes sans lien avec le travail.
+
+Un message est professionnel par défaut, sauf contexte personnel ou familial explicite sans lien avec le travail. Racisme, harcèlement, discrimination, stress, anxiété, pression et conflits interpersonnels sont toujours professionnels.
+
+Remerciements : les accueillir avec chaleur en restant professionnel. Politesse simple : répondre brièvement ("Je vous en prie.", "Bonjour, comment puis-je vous aider ?", "Au revoir, n'hésitez pas à revenir si besoin.").
+Hors sujet : "Je suis désolé, mais je suis uniquement conçu pour aider avec les situations de stress et de bien-être psychologique dans le contexte professionnel."
+
+Style : clair, bienveillant, valorisant, orienté solutions professionnelles.""",
+    analysis="""Répondez uniquement par un objet JSON :
+{"response": "<votre réponse>", "violent_words": ["<mot ou expression>"], "scopeflag": false}
+- violent_words : mots ou expressions du message indiquant violence, détresse, anxiété, stress ou autre souffrance psychique ([] si aucun).
+- scopeflag : true seulement si le message est clairement hors du contexte professionnel selon les règles ci-dessus, sinon false.""",
+    violent_words_system="Vous détectez les signes de détresse psychologique et de violence verbale dans un texte.",
+    violent_words=(
+        "Listez les mots ou expressions du message indiquant violence, détresse, anxiété, stress ou "
+        "souffrance psychique au travail, un par ligne, ou AUCUN s'il n'y en a pas.\n\nMessage :\n"
+    ),
+)
+
+PROMPTS = {prompt_set.version: prompt_set for prompt_set in (V1, V2)}
+
+TOKEN_PARTS = ("instructions", "history", "message")
+
+
+def get_config() -> Dict:
+    """Retourne la configuration des prompts, complétée par les valeurs par défaut"""
+    return {**DEFAULTS, **getattr(settings, 'CHATBOT_PROMPTS', {})}
+
+
+def get_prompts(version: str = None) -> PromptSet:
+    """
+    Retourne une version des prompts (par défaut celle des settings)
+
+    Raises:
+        ValueError: Si la version est inconnue
+    """
+    version = version or get_config()['VERSION']
+    try:
+        return PROMPTS[version]
+    except KeyError:
+        raise ValueError(f"Unknown prompt version: {version} (known: {', '.join(PROMPTS)})")
+
+
+def token_report(messages: List[Dict]) -> Dict[str, int]:
+    """
+    Estimation locale des tokens d'une requête, par partie
+
+    Le premier message (instructions fixes) forme le préfixe commun à toutes les
+    requêtes, le dernier est le message de l'utilisateur, les autres l'historique.
+
+    Returns:
+        Dict[str, int]: "instructions", "history", "message" et "total"
+    """
+    costs = [estimate_tokens(item["content"]) + MESSAGE_OVERHEAD for item in messages]
+    report = {
+        "instructions": costs[0] if len(costs) > 1 else 0,
+        "history": sum(costs[1:-1]),
+        "message": costs[-1] if costs else 0,
+    }
+    report["total"] = sum(costs)
+    return report
+
+
+def _record(messages: List[Dict]) -> List[Dict]:
+    report = token_report(messages)
+    for part in TOKEN_PARTS:
+        metrics.PROMPT_TOKENS.inc(report[part], part)
+    logger.debug(f"Prompt tokens: {report}")
+    return messages
+
+
+def analysis_messages(message: str, history: List[Dict] = None, prompts: PromptSet = None) -> List[Dict]:
+    """Messages de l'appel combiné réponse + analyse (mode JSON), après l'historique éventuel"""
+    prompts = prompts or get_prompts()
+    return _record([
+        {"role": "system", "content": prompts.analysis_system},
+        *(history or []),
+        {"role": "user", "content": message}
+    ])
+
+
+def reply_messages(message: str, history: List[Dict] = None, prompts: PromptSet = None) -> List[Dict]:
+    """Messages d'une réponse seule, sans analyse des mots violents"""
+    prompts = prompts or get_prompts()
+    return _record([
+        {"role": "system", "content": prompts.system},
+        *(history or []),
+        {"role": "user", "content": message}
+    ])
+
+
+def violent_words_messages(message: str, prompts: PromptSet = None) -> List[Dict]:
+    """Messages de l'analyse seule des mots violents (une ligne par mot, ou AUCUN)"""
+    prompts = prompts or get_prompts()
+    return _record([
+        {"role": "system", "content": prompts.violent_words_system},
+        {"role": "user", "content": prompts.violent_words + message}
+    ])
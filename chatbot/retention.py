@@ -0,0 +1,203 @@
+"""
+Rétention des mots violents : archivage puis suppression par lots des occurrences anciennes
+
+Les occurrences sont comptées dans les agrégats quotidiens et hebdomadaires (voir
+rollups.py) dès leur enregistrement : passé le délai de rétention, les lignes
+ViolentWord ne servent plus qu'au détail des mots. archive_violent_words les lit par
+lots en suivant la clé primaire (mémoire constante), écrit chaque lot dans des
+fichiers JSONL compressés partitionnés par jour de détection, puis supprime le lot
+par une requête DELETE sur l'intervalle de clés, sans charger les lignes.
+
+Chaque fichier est nommé d'après le premier ID du lot : relancer l'archivage après
+une interruption réécrit les mêmes fichiers au lieu de dupliquer les lignes. Le
+registre ViolentWordArchive compte les lignes archivées par jour ; rebuild_rollups
+ne recalcule pas les périodes déjà archivées.
+
+Configuration (settings.CHATBOT_RETENTION) :
+    VIOLENT_WORDS_DAYS  Nombre de jours de mots violents conservés en base
+    ARCHIVE_DIR         Dossier des archives (None pour supprimer sans exporter)
+    BATCH_SIZE          Lignes lues, archivées et supprimées par transaction
+"""
+import gzip
+import json
+import os
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import ViolentWord, ViolentWordArchive
+from .rollups import increment_counters
+
+DEFAULTS = {
+    'VIOLENT_WORDS_DAYS': 365,
+    'ARCHIVE_DIR': None,
+    'BATCH_SIZE': 5000,
+}
+
+
+def get_config() -> Dict:
+    """Retourne la configuration de la rétention, complétée par les valeurs par défaut"""
+    return {**DEFAULTS, **getattr(settings, 'CHATBOT_RETENTION', {})}
+
+
+def raw_delete_range(model, first_id: int, last_id: int, before: datetime = None) -> int:
+    """
+    Supprime les lignes d'un intervalle de clés primaires par une seule requête DELETE
+
+    Contrairement à QuerySet.delete(), aucune ligne n'est chargée ni collectée : à
+    réserver aux modèles sans dépendances (ni clé étrangère entrante, ni signal).
+
+    Args:
+        model: Modèle des lignes à supprimer
+        first_id (int): Première clé de l'intervalle (incluse)
+        last_id (int): Dernière clé de l'intervalle (incluse)
+        before (datetime, optional): Ne supprimer que les lignes dont timestamp est antérieur
+
+    Returns:
+        int: Nombre de lignes supprimées
+    """
+    quote = connection.ops.quote_name
+    pk = quote(model._meta.pk.column)
+    sql = f"DELETE FROM {quote(model._meta.db_table)} WHERE {pk} >= %s AND {pk} <= %s"
+    params = [first_id, last_id]
+    if before is not None:
+        sql += f" AND {quote(model._meta.get_field('timestamp').column)} < %s"
+        params.append(connection.ops.adapt_datetimefield_value(before))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def retention_cutoff(days: int) -> datetime:
+    """Début (heure locale) du plus ancien jour conservé"""
+    first_kept = timezone.localdate() - timedelta(days=days)
+    cutoff = datetime.combine(first_kept, time.min)
+    return timezone.make_aware(cutoff) if settings.USE_TZ else cutoff
+
+
+def _detection_day(timestamp: datetime) -> date:
+    return timezone.localdate(timestamp) if timezone.is_aware(timestamp) else timestamp.date()
+
+
+def iter_batches(cutoff: datetime, batch_size: int) -> Iterator[List[Tuple[int, int, str, datetime]]]:
+    """
+    Lots de mots violents antérieurs à cutoff, dans l'ordre des clés primaires
+
+    Chaque lot est lu après la suppression du précédent, à partir de sa dernière clé :
+    la mémoire utilisée ne dépend que de la taille des lots.
+
+    Yields:
+        List[Tuple[int, int, str, datetime]]: Lignes (id, employee_id, word, timestamp)
+    """
+    last_id = 0
+    while True:
+        rows = list(
+            ViolentWord.objects.filter(id__gt=last_id, timestamp__lt=cutoff)
+            .order_by('id')
+            .values_list('id', 'employee_id', 'word', 'timestamp')[:batch_size]
+        )
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def write_partition(archive_dir: Path, day: date, rows: List[Tuple[int, int, str, datetime]]) -> Path:
+    """
+    Écrit des mots violents d'un même jour dans un fichier JSONL compressé
+
+    Le fichier, nommé d'après la première clé des lignes, est écrit sous un nom
+    temporaire puis renommé : il est complet ou absent.
+
+    Returns:
+        Path: Chemin du fichier (<archive_dir>/day=AAAA-MM-JJ/part-<id>.jsonl.gz)
+    """
+    directory = Path(archive_dir) / f"day={day.isoformat()}"
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"part-{rows[0][0]:012d}.jsonl.gz"
+    temporary = path.with_name(path.name + ".tmp")
+    with gzip.open(temporary, "wt", encoding="utf-8") as archive_file:
+        for word_id, employee_id, word, timestamp in rows:
+            archive_file.write(json.dumps({
+                "id": word_id,
+                "employee_id": employee_id,
+                "word": word,
+                "timestamp": timestamp.isoformat()
+            }, ensure_ascii=False) + "\n")
+    os.replace(temporary, path)
+    return path
+
+
+def archive_violent_words(days: int = None, batch_size: int = None, archive_dir=None, export: bool = True,
+                          progress=None) -> Dict:
+    """
+    Archive puis supprime les mots violents plus anciens que le délai de rétention
+
+    Chaque lot est exporté (si export et un dossier sont configurés), supprimé et
+    ajouté au registre ViolentWordArchive dans une même transaction. Les agrégats ne
+    sont pas modifiés : ils comptent déjà ces mots.
+
+    Args:
+        days (int, optional): Jours conservés (par défaut VIOLENT_WORDS_DAYS)
+        batch_size (int, optional): Lignes par lot (par défaut BATCH_SIZE)
+        archive_dir (optional): Dossier des archives (par défaut ARCHIVE_DIR)
+        export (bool): Écrire les archives (False pour supprimer seulement)
+        progress (Callable[[int], None], optional): Appelée avec le total archivé après chaque lot
+
+    Returns:
+        Dict: "cutoff", "rows" (lignes supprimées), "days" (jours touchés) et "files" (fichiers écrits)
+
+    Raises:
+        ValueError: Si days est négatif ou batch_size n'est pas positif
+    """
+    config = get_config()
+    days = config['VIOLENT_WORDS_DAYS'] if days is None else days
+    batch_size = batch_size or config['BATCH_SIZE']
+    archive_dir = (archive_dir or config['ARCHIVE_DIR']) if export else None
+    if days < 0:
+        raise ValueError("Retention must be zero or more days")
+    if batch_size < 1:
+        raise ValueError("Batch size must be positive")
+
+    cutoff = retention_cutoff(days)
+    archived = 0
+    touched_days = set()
+    files = 0
+    for rows in iter_batches(cutoff, batch_size):
+        partitions: Dict[date, List] = {}
+        for row in rows:
+            partitions.setdefault(_detection_day(row[3]), []).append(row)
+
+        with transaction.atomic():
+            if archive_dir:
+                for day, day_rows in partitions.items():
+                    write_partition(archive_dir, day, day_rows)
+                files += len(partitions)
+            archived += raw_delete_range(ViolentWord, rows[0][0], rows[-1][0], before=cutoff)
+            increment_counters(
+                ViolentWordArchive, {}, ("day",),
+                {(day,): {"rows": len(day_rows)} for day, day_rows in partitions.items()}
+            )
+        touched_days.update(partitions)
+        if progress is not None:
+            progress(archived)
+
+    return {"cutoff": cutoff, "rows": archived, "days": len(touched_days), "files": files}
+
+
+def archived_through() -> date:
+    """Dernier jour dont des mots violents ont été archivés (None si aucun)"""
+    return ViolentWordArchive.objects.aggregate(last=Max('day'))['last']
+
+
+def read_partitions(archive_dir) -> Iterator[Dict]:
+    """Relit les mots violents archivés, jour par jour (restauration ou analyse hors ligne)"""
+    for path in sorted(Path(archive_dir).glob("day=*/part-*.jsonl.gz")):
+        with gzip.open(path, "rt", encoding="utf-8") as archive_file:
+            for line in archive_file:
+                yield json.loads(line)
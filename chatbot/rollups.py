@@ -0,0 +1,279 @@
+"""
+Agrégats quotidiens et hebdomadaires des statistiques des employés
+
+Les agrégats sont incrémentés dans la même transaction que les compteurs de
+l'employé (voir services.write_employee_stats). Les tendances d'une période sont
+lues dans les agrégats : leur coût dépend du nombre de jours ou de semaines
+demandés, pas du nombre de messages ni de mots violents enregistrés.
+"""
+from datetime import date, datetime, timedelta
+from functools import reduce
+from operator import or_
+from typing import Dict, Iterable, List, Tuple
+
+from django.db import transaction
+from django.db.models import Case, Count, DateField, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import TruncDate, TruncWeek
+from django.utils import timezone
+
+from .models import (
+    EmployeeStatsRollup, EmployeeThemeRollup, OrganisationStatsRollup, OrganisationThemeRollup, ViolentWord
+)
+
+PERIODS = (EmployeeStatsRollup.PERIOD_DAY, EmployeeStatsRollup.PERIOD_WEEK)
+
+# Nombre maximal de points d'une série de tendance
+MAX_POINTS = 366
+
+
+def period_start(day: date, period: str) -> date:
+    """Premier jour de la période (jour, ou lundi de la semaine) contenant day"""
+    if period == EmployeeStatsRollup.PERIOD_WEEK:
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def increment_counters(model, scope: Dict, key_fields: Tuple[str, ...], increments: Dict[Tuple, Dict[str, int]]) -> None:
+    """
+    Incrémente des lignes de compteurs en deux requêtes, quel que soit leur nombre
+
+    Les lignes manquantes sont insérées en ignorant les conflits sur la contrainte
+    d'unicité, puis tous les compteurs sont incrémentés par un seul UPDATE (F() +
+    Case/When lorsque les incréments diffèrent d'une ligne à l'autre).
+
+    Args:
+        model: Modèle des compteurs (champs à 0 par défaut)
+        scope (Dict): Filtre commun à toutes les lignes (par exemple employee_id)
+        key_fields (Tuple[str, ...]): Champs identifiant une ligne dans le scope
+        increments (Dict[Tuple, Dict[str, int]]): Incrément de chaque champ, par clé
+    """
+    if not increments:
+        return
+    model.objects.bulk_create(
+        [model(**scope, **dict(zip(key_fields, key))) for key in increments],
+        ignore_conflicts=True
+    )
+
+    fields = {field for values in increments.values() for field in values}
+    updates = {}
+    for field in fields:
+        values = {key: values.get(field, 0) for key, values in increments.items()}
+        distinct = set(values.values())
+        if distinct == {0}:
+            continue
+        if len(distinct) == 1:
+            increment = Value(distinct.pop())
+        else:
+            increment = Case(
+                *[When(**dict(zip(key_fields, key)), then=Value(value)) for key, value in values.items()],
+                default=Value(0),
+                output_field=IntegerField()
+            )
+        updates[field] = F(field) + increment
+
+    if updates:
+        condition = reduce(or_, (Q(**dict(zip(key_fields, key))) for key in increments))
+        model.objects.filter(condition, **scope).update(**updates)
+
+
+def record_rollups(employee_id: int, total_words: int, violent_words: List[Tuple[str, datetime]],
+                   theme_counts: Dict[int, int], messages: int = 1) -> None:
+    """
+    Ajoute un lot de statistiques aux agrégats du jour et de la semaine, de
+    l'employé et de l'organisation
+
+    Les mots et messages sont rattachés à la date courante, les mots violents à la
+    date de leur détection (comme le fait rebuild_rollups).
+
+    Args:
+        employee_id (int): ID de l'employé
+        total_words (int): Nombre de mots à ajouter
+        violent_words (List[Tuple[str, datetime]]): Mots violents et date de détection
+        theme_counts (Dict[int, int]): Incrément à appliquer par ID de thématique
+        messages (int): Nombre de messages du lot
+    """
+    today = timezone.localdate()
+    stats = {}
+    for period in PERIODS:
+        key = (period, period_start(today, period))
+        stats.setdefault(key, {"messages_count": 0, "total_words_count": 0, "violent_words_count": 0})
+        stats[key]["messages_count"] += messages
+        stats[key]["total_words_count"] += total_words
+        for word, timestamp in violent_words:
+            day = timezone.localdate(timestamp) if timezone.is_aware(timestamp) else timestamp.date()
+            word_key = (period, period_start(day, period))
+            stats.setdefault(word_key, {"messages_count": 0, "total_words_count": 0, "violent_words_count": 0})
+            stats[word_key]["violent_words_count"] += 1
+
+    themes = {
+        (theme_id, period, period_start(today, period)): {"count": count}
+        for theme_id, count in theme_counts.items()
+        for period in PERIODS
+    }
+
+    increment_counters(EmployeeStatsRollup, {"employee_id": employee_id}, ("period", "period_start"), stats)
+    increment_counters(EmployeeThemeRollup, {"employee_id": employee_id}, ("theme_id", "period", "period_start"), themes)
+    # Agrégats de l'organisation (tableau de bord), mêmes incréments sans employé
+    increment_counters(OrganisationStatsRollup, {}, ("period", "period_start"), stats)
+    increment_counters(OrganisationThemeRollup, {}, ("theme_id", "period", "period_start"), themes)
+
+
+def iter_periods(start: date, end: date, period: str) -> Iterable[date]:
+    """Débuts des périodes couvrant l'intervalle [start, end]"""
+    step = timedelta(days=7 if period == EmployeeStatsRollup.PERIOD_WEEK else 1)
+    current = period_start(start, period)
+    while current <= end:
+        yield current
+        current += step
+
+
+def period_starts(period: str, start: date, end: date) -> List[date]:
+    """
+    Débuts des périodes d'un intervalle demandé par l'API
+
+    Raises:
+        ValueError: Si la période est inconnue ou l'intervalle invalide ou trop long
+    """
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period: {period}")
+    if end < start:
+        raise ValueError("End date is before start date")
+    starts = list(iter_periods(start, end, period))
+    if len(starts) > MAX_POINTS:
+        raise ValueError(f"Range too long (maximum {MAX_POINTS} {period}s)")
+    return starts
+
+
+def get_employee_trends(employee_id: int, period: str, start: date, end: date) -> Dict:
+    """
+    Tendances d'un employé sur un intervalle, lues dans les agrégats (deux requêtes)
+
+    Args:
+        employee_id (int): ID de l'employé
+        period (str): "day" ou "week"
+        start (date): Premier jour de l'intervalle
+        end (date): Dernier jour de l'intervalle
+
+    Returns:
+        Dict: Totaux de l'intervalle et série complète (périodes sans message à 0)
+
+    Raises:
+        ValueError: Si la période est inconnue ou l'intervalle invalide ou trop long
+    """
+    starts = period_starts(period, start, end)
+    first = starts[0]
+    rows = EmployeeStatsRollup.objects.filter(
+        employee_id=employee_id, period=period, period_start__gte=first, period_start__lte=end
+    ).values_list("period_start", "messages_count", "total_words_count", "violent_words_count")
+    points = {row[0]: row[1:] for row in rows}
+
+    theme_points = {}
+    theme_rows = EmployeeThemeRollup.objects.filter(
+        employee_id=employee_id, period=period, period_start__gte=first, period_start__lte=end
+    ).values_list("period_start", "theme__name", "count")
+    for day, theme_name, count in theme_rows:
+        theme_points.setdefault(day, {})[theme_name] = count
+
+    series = []
+    totals = {"messages": 0, "total_words": 0, "violent_words": 0}
+    theme_totals = {}
+    for day in starts:
+        messages, total_words, violent_words = points.get(day, (0, 0, 0))
+        themes = theme_points.get(day, {})
+        series.append({
+            "period_start": day.isoformat(),
+            "messages": messages,
+            "total_words": total_words,
+            "violent_words": violent_words,
+            "themes": themes
+        })
+        totals["messages"] += messages
+        totals["total_words"] += total_words
+        totals["violent_words"] += violent_words
+        for theme_name, count in themes.items():
+            theme_totals[theme_name] = theme_totals.get(theme_name, 0) + count
+
+    totals["violent_words_ratio"] = (
+        round(totals["violent_words"] / totals["total_words"], 4) if totals["total_words"] else 0
+    )
+    totals["themes"] = theme_totals
+    return {
+        "employee_id": employee_id,
+        "period": period,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "totals": totals,
+        "series": series
+    }
+
+
+def rebuild_rollups(employee_id: int = None) -> int:
+    """
+    Recalcule le nombre de mots violents des agrégats à partir des lignes ViolentWord,
+    puis les agrégats de l'organisation à partir de ceux des employés
+
+    Les nombres de mots et de messages et les thématiques ne sont pas conservés
+    message par message : ils sont laissés tels quels. Les périodes commençant au plus
+    tard le dernier jour archivé (voir retention.py) sont conservées, leurs mots
+    violents n'étant plus en base.
+
+    Args:
+        employee_id (int, optional): Limiter le recalcul des employés à un employé
+
+    Returns:
+        int: Nombre de lignes d'agrégats écrites
+    """
+    from .retention import archived_through
+
+    scope = {"employee_id": employee_id} if employee_id else {}
+    last_archived = archived_through()
+    recent = {"period_start__gt": last_archived} if last_archived else {}
+    written = 0
+    with transaction.atomic():
+        EmployeeStatsRollup.objects.filter(**scope, **recent).update(violent_words_count=0)
+        for period, trunc in ((EmployeeStatsRollup.PERIOD_DAY, TruncDate("timestamp")),
+                              (EmployeeStatsRollup.PERIOD_WEEK, TruncWeek("timestamp", output_field=DateField()))):
+            rows = (
+                ViolentWord.objects.filter(**scope)
+                .annotate(period_start=trunc)
+                .filter(**recent)
+                .values("employee_id", "period_start")
+                .annotate(count=Count("id"))
+            )
+            rollups = [
+                EmployeeStatsRollup(
+                    employee_id=row["employee_id"],
+                    period=period,
+                    period_start=row["period_start"],
+                    violent_words_count=row["count"]
+                )
+                for row in rows
+            ]
+            EmployeeStatsRollup.objects.bulk_create(
+                rollups,
+                update_conflicts=True,
+                unique_fields=["employee", "period", "period_start"],
+                update_fields=["violent_words_count"],
+                batch_size=500
+            )
+            written += len(rollups)
+
+        OrganisationStatsRollup.objects.all().delete()
+        organisation = [
+            OrganisationStatsRollup(**row)
+            for row in EmployeeStatsRollup.objects.values("period", "period_start").annotate(
+                messages_count=Sum("messages_count"),
+                total_words_count=Sum("total_words_count"),
+                violent_words_count=Sum("violent_words_count")
+            )
+        ]
+        OrganisationStatsRollup.objects.bulk_create(organisation, batch_size=500)
+
+        OrganisationThemeRollup.objects.all().delete()
+        organisation_themes = [
+            OrganisationThemeRollup(**row)
+            for row in EmployeeThemeRollup.objects.values("theme_id", "period", "period_start").annotate(count=Sum("count"))
+        ]
+        OrganisationThemeRollup.objects.bulk_create(organisation_themes, batch_size=500)
+        written += len(organisation) + len(organisation_themes)
+    return written
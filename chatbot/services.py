@@ -1,12 +1,20 @@
 """
 Services pour l'analyse des messages et la détection de la détresse psychologique
 """
-from typing import Dict, List
-from openai import OpenAI
-import os
-from dotenv import load_dotenv
-from .models import Employee, ViolentWord, PsychologicalTheme, EmployeeThemeCounter
+import asyncio
+from collections import Counter
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from .models import Employee, ViolentWord, EmployeeThemeCounter
+from .keyword_matcher import KeywordAutomaton
+from .theme_index import ThemeIndex, aget_theme_index, get_theme_index
+from . import completion_cache, conversations, dashboard, llm, metrics, parsing, prompts, rollups, stats_buffer
+from .analysis_backends import get_analysis_backend, log_analysis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
 from django.db.models import F
+from django.utils import timezone
 import re
 import logging
 
@@ -14,12 +22,6 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Charger les variables d'environnement
-load_dotenv()
-
-# Initialiser le client OpenAI
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
 # Liste des signaux de détresse à détecter
 DISTRESS_SIGNALS = [
     "stress", "anxiété", "dépression", "burnout", "épuisement",
@@ -48,86 +50,15 @@ SENSITIVE_WORKPLACE_TOPICS = [
     "pression", "stress", "anxiété", "dépression"
 ]
 
-SYSTEM_PROMPT = """Vous êtes un assistant spécialisé UNIQUEMENT dans le soutien psychologique en entreprise.
-
-VOTRE RÔLE EST STRICTEMENT LIMITÉ À :
-- Écouter et détecter les signaux de détresse psychologique au travail
-- Fournir un soutien émotionnel pour les situations professionnelles uniquement
-- Rester professionnel et empathique dans le contexte de l'entreprise
-- Encourager une communication positive au travail
-
-LIMITES STRICTES (ne jamais les dépasser) :
-- NE PAS poser de diagnostic médical
-- NE PAS prescrire de traitement ou de médicament
-- NE PAS donner de conseil juridique
-- NE PAS traiter de sujets personnels ou hors contexte professionnel
-- NE PAS suggérer de solutions pour des problèmes non liés au travail
-
-IMPORTANT : Considérez par défaut que les messages de l'utilisateur sont dans un contexte professionnel, sauf s'ils mentionnent explicitement un contexte personnel ou familial sans lien avec le travail.
-
-SUJETS SPÉCIFIQUES À TRAITER COMME PROFESSIONNELS :
-- Le racisme au travail est TOUJOURS considéré comme un sujet professionnel
-- Le harcèlement est TOUJOURS considéré comme un sujet professionnel
-- La discrimination est TOUJOURS considérée comme un sujet professionnel
-- Tous les sujets liés au stress, à l'anxiété ou à la pression au travail sont TOUJOURS considérés comme professionnels
-- Les conflits interpersonnels en milieu de travail sont TOUJOURS considérés comme professionnels
-
-GESTION DES INTERACTIONS :
-1. Pour les questions/situations liées au travail :
-   - Répondre de manière professionnelle et empathique
-   - Fournir un soutien adapté au contexte professionnel
-   - Valoriser les efforts et progrès professionnels
-
-2. Pour les expressions de reconnaissance ou d'amabilité professionnelle :
-   - Accueillir positivement ces marques de reconnaissance
-   - Répondre avec chaleur tout en restant professionnel
-   - Encourager cette attitude positive au travail
-   Exemples :
-   - "Je vous remercie de votre confiance. C'est important de maintenir un dialogue constructif au travail."
-   - "Votre attitude positive est précieuse dans l'environnement professionnel. Avez-vous besoin d'aide pour autre chose ?"
-
-3. Pour les formules de politesse simples :
-   - Répondre brièvement et poliment
-   - Maintenir un ton professionnel
-   Exemples : "Je vous en prie.", "Bonjour, comment puis-je vous aider ?", "Au revoir, n'hésitez pas à revenir si besoin."
-
-4. Pour tout sujet hors contexte professionnel :
-   "Je suis désolé, mais je suis uniquement conçu pour aider avec les situations de stress et de bien-être psychologique dans le contexte professionnel."
-
-STYLE DE RÉPONSE :
-- Ton : professionnel, empathique et constructif
-- Langage : clair et bienveillant
-- Focus : uniquement sur les situations professionnelles
-- Approche : valorisante et orientée solutions professionnelles"""
-
-ANALYSIS_PROMPT = """
-En plus de votre réponse principale, analysez le message de l'utilisateur et identifiez tous les mots ou expressions qui pourraient indiquer de la violence, de la détresse psychologique, de l'anxiété, du stress, ou d'autres problèmes de santé mentale dans un contexte professionnel.
-
-IMPORTANT : Considérez par défaut que les messages de l'utilisateur sont dans un contexte professionnel, même s'ils ne le mentionnent pas explicitement. Un message doit être considéré hors sujet uniquement s'il traite clairement de sujets personnels sans lien avec le travail (comme la santé familiale, les loisirs personnels, etc.).
-
-SUJETS SPÉCIFIQUES À TRAITER COMME PROFESSIONNELS :
-- Tout message mentionnant le racisme doit TOUJOURS être considéré comme un sujet professionnel (scopeflag = false)
-- Tout message mentionnant le harcèlement doit TOUJOURS être considéré comme un sujet professionnel (scopeflag = false)
-- Tout message mentionnant la discrimination doit TOUJOURS être considéré comme un sujet professionnel (scopeflag = false)
-- Tout message mentionnant le stress, l'anxiété ou la pression doit TOUJOURS être considéré comme un sujet professionnel (scopeflag = false)
-- Tout message mentionnant des conflits interpersonnels doit TOUJOURS être considéré comme un sujet professionnel (scopeflag = false)
-
-Votre réponse doit être structurée en JSON avec trois parties :
-1. "response": votre réponse normale au message de l'utilisateur
-2. "violent_words": un tableau des mots ou expressions identifiés comme violents ou indiquant de la détresse
-3. "scopeflag": un booléen qui indique si le message est hors sujet (true = hors sujet, false = dans le sujet professionnel)
-
-Exemple de format:
-{
-  "response": "Votre réponse normale ici...",
-  "violent_words": ["mot1", "expression2", "mot3"],
-  "scopeflag": false
+# Mots-clés par catégorie de sujet sensible (voir get_appropriate_response_for_topic)
+TOPIC_KEYWORDS = {
+    "racism": ["racisme", "raciste", "discrimination raciale"],
+    "harassment": ["harcèlement", "harcelé", "harceler"],
+    "discrimination": ["discrimination", "discriminé", "discriminer"],
+    "stress": ["stress", "anxiété", "pression", "burnout", "épuisement"],
+    "conflict": ["conflit", "tension", "dispute", "désaccord"]
 }
 
-Si le message est hors du contexte professionnel (par exemple, une question médicale personnelle ou un sujet sans rapport avec le travail), mettez "scopeflag" à true.
-Si aucun mot violent ou indiquant de la détresse n'est détecté, "violent_words" doit être un tableau vide.
-"""
-
 def preprocess_text(text: str) -> List[str]:
     """
     Prétraite le texte pour l'analyse
@@ -146,37 +77,89 @@ def preprocess_text(text: str) -> List[str]:
 
     return words
 
-def contains_sensitive_topic(message: str) -> Dict:
+def _build_keyword_automaton() -> KeywordAutomaton:
     """
-    Vérifie si le message contient des sujets sensibles liés au milieu professionnel
+    Construit l'automate regroupant toutes les listes de mots-clés
+
+    Les thématiques psychologiques sont détectées par l'index de theme_index.
+
+    Returns:
+        KeywordAutomaton: Automate dont les étiquettes identifient la catégorie de chaque terme
+    """
+    patterns = []
+    for topic, terms in TOPIC_KEYWORDS.items():
+        patterns.extend((term, ("topic", topic)) for term in terms)
+    patterns.extend((term, ("sensitive", term)) for term in SENSITIVE_WORKPLACE_TOPICS)
+    patterns.extend((keyword, ("workplace",)) for keyword in WORKPLACE_KEYWORDS)
+    patterns.extend((signal, ("signal", signal)) for signal in DISTRESS_SIGNALS)
+    return KeywordAutomaton(patterns)
+
+# Les listes de mots-clés étant fixes, l'automate est construit une seule fois
+_keyword_automaton = None
+
+def get_keyword_automaton() -> KeywordAutomaton:
+    """Retourne l'automate des mots-clés, en le construisant à la première analyse"""
+    global _keyword_automaton
+    if _keyword_automaton is None:
+        _keyword_automaton = _build_keyword_automaton()
+    return _keyword_automaton
+
+def scan_message(message: str, automaton: KeywordAutomaton = None, themes: ThemeIndex = None) -> Dict:
+    """
+    Analyse le message en une seule passe : sujets sensibles, signaux de détresse et thématiques
+
+    La comparaison ignore la casse et les accents.
 
     Args:
         message (str): Le message à analyser
+        automaton (KeywordAutomaton, optional): Automate à utiliser (par défaut l'automate des mots-clés)
+        themes (ThemeIndex, optional): Index des thématiques (par défaut l'index courant, chargé si nécessaire)
 
     Returns:
-        Dict: Dictionnaire contenant les résultats de l'analyse
+        Dict: "topic_analysis" (voir contains_sensitive_topic), "detected_signals",
+        "sensitive_terms" et "detected_themes" (couples (id, nom))
     """
-    message_lower = message.lower()
+    with metrics.STAGE_SECONDS.time("keyword_scan"):
+        if themes is None:
+            themes = get_theme_index()
+        return _scan_message(message, automaton or get_keyword_automaton(), themes)
+
+def _scan_message(message: str, automaton: KeywordAutomaton, themes: ThemeIndex) -> Dict:
+    """Corps de scan_message, chronométré par celui-ci"""
+    labels = automaton.search(message)
 
     # Vérifier pour chaque catégorie de sujets sensibles
-    results = {
-        "contains_racism": any(term in message_lower for term in ["racisme", "raciste", "discrimination raciale"]),
-        "contains_harassment": any(term in message_lower for term in ["harcèlement", "harcelé", "harceler"]),
-        "contains_discrimination": any(term in message_lower for term in ["discrimination", "discriminé", "discriminer"]),
-        "contains_stress": any(term in message_lower for term in ["stress", "anxiété", "pression", "burnout", "épuisement"]),
-        "contains_conflict": any(term in message_lower for term in ["conflit", "tension", "dispute", "désaccord"])
+    topic_analysis = {
+        f"contains_{topic}": ("topic", topic) in labels
+        for topic in ("racism", "harassment", "discrimination", "stress", "conflict")
     }
 
-    # Vérifier pour tous les mots-clés sensibles
-    results["contains_any_sensitive"] = any(term in message_lower for term in SENSITIVE_WORKPLACE_TOPICS)
-
-    # Vérifier pour tous les mots-clés du milieu professionnel
-    results["contains_workplace_context"] = any(keyword in message_lower for keyword in WORKPLACE_KEYWORDS)
+    # Vérifier pour tous les mots-clés sensibles et du milieu professionnel
+    sensitive_terms = [term for term in SENSITIVE_WORKPLACE_TOPICS if ("sensitive", term) in labels]
+    topic_analysis["contains_any_sensitive"] = bool(sensitive_terms)
+    topic_analysis["contains_workplace_context"] = ("workplace",) in labels
 
     # Si le message contient des mots sensibles, le considérer automatiquement comme professionnel
-    results["force_professional_context"] = results["contains_any_sensitive"]
+    topic_analysis["force_professional_context"] = topic_analysis["contains_any_sensitive"]
+
+    return {
+        "topic_analysis": topic_analysis,
+        "detected_signals": [signal for signal in DISTRESS_SIGNALS if ("signal", signal) in labels],
+        "sensitive_terms": sensitive_terms,
+        "detected_themes": themes.find(message)
+    }
+
+def contains_sensitive_topic(message: str) -> Dict:
+    """
+    Vérifie si le message contient des sujets sensibles liés au milieu professionnel
+
+    Args:
+        message (str): Le message à analyser
 
-    return results
+    Returns:
+        Dict: Dictionnaire contenant les résultats de l'analyse
+    """
+    return scan_message(message)["topic_analysis"]
 
 def get_appropriate_response_for_topic(topic_type: str) -> str:
     """
@@ -202,153 +185,983 @@ def get_appropriate_response_for_topic(topic_type: str) -> str:
 
     return responses.get(topic_type, "Je comprends que vous faites face à une situation difficile dans votre environnement professionnel. Pouvez-vous me donner plus de détails pour que je puisse vous offrir un soutien adapté ?")
 
-def analyze_message(message: str, employee_id: int = None) -> Dict:
+# Formules de politesse traitées localement, indexées par message normalisé
+# (voir completion_cache.normalize_message : sans casse, accents ni ponctuation)
+POLITENESS_PHRASES = {
+    **dict.fromkeys([
+        "bonjour", "bonsoir", "salut", "hello", "coucou", "bonjour a vous", "bonjour madame",
+        "bonjour monsieur", "bonjour a tous", "rebonjour"
+    ], "greeting"),
+    **dict.fromkeys([
+        "merci", "merci beaucoup", "merci bien", "je vous remercie", "merci pour votre aide",
+        "merci pour tout", "merci beaucoup pour votre aide", "ok merci", "d accord merci", "super merci"
+    ], "thanks"),
+    **dict.fromkeys([
+        "au revoir", "a bientot", "bonne journee", "bonne soiree", "bonne nuit", "a plus",
+        "merci au revoir", "merci et au revoir", "merci bonne journee", "a demain"
+    ], "goodbye"),
+}
+
+# Réponses aux formules de politesse, reprises des exemples des instructions (voir prompts)
+POLITENESS_RESPONSES = {
+    "greeting": "Bonjour, comment puis-je vous aider ?",
+    "thanks": "Je vous en prie.",
+    "goodbye": "Au revoir, n'hésitez pas à revenir si besoin.",
+}
+
+# Mots qui rendent un message sensible ambigu (négation) : il est alors transmis au modèle
+NEGATION_WORDS = {"ne", "n", "pas", "plus", "jamais", "aucun", "aucune", "rien", "sans"}
+
+def get_fast_path_config() -> Dict:
     """
-    Analyse le message pour détecter les signaux de détresse et générer une réponse appropriée
+    Configuration du traitement local (settings.CHATBOT_FAST_PATH)
+
+    ENABLED active le traitement local, ROUTE_SENSITIVE autorise les réponses
+    modèles pour les sujets sensibles évidents de moins de MAX_WORDS mots.
+    """
+    return {
+        'ENABLED': True,
+        'ROUTE_SENSITIVE': True,
+        'MAX_WORDS': 12,
+        **getattr(settings, 'CHATBOT_FAST_PATH', {})
+    }
+
+def get_route_stats() -> Dict:
+    """
+    Statistiques de répartition des messages entre traitement local et OpenAI
+
+    Returns:
+        Dict: Nombre de messages par route et part traitée localement
+    """
+    routes = {route: int(metrics.MESSAGES.value(route)) for route in metrics.ROUTES}
+    routes = {route: count for route, count in routes.items() if count}
+    total = sum(routes.values())
+    local = total - routes.get("llm", 0)
+    return {
+        "routes": routes,
+        "total": total,
+        "local_share": round(local / total, 4) if total else 0
+    }
+
+# Index des mots-clés de chaque catégorie, comparés mot à mot sur leurs lemmes (voir
+# theme_index) : contrairement au scan par sous-chaînes, "l'impression" et "dépression"
+# ne relèvent pas de la catégorie de "pression"
+_topic_index = None
+
+def get_topic_index() -> ThemeIndex:
+    """Retourne l'index des mots-clés par catégorie (identifiant = rang dans TOPIC_KEYWORDS)"""
+    global _topic_index
+    if _topic_index is None:
+        _topic_index = ThemeIndex(
+            (position, terms[0], ", ".join(terms[1:]))
+            for position, terms in enumerate(TOPIC_KEYWORDS.values())
+        )
+    return _topic_index
+
+def _clear_sensitive_topic(normalized: str, message: str, max_words: int):
+    """Retourne le sujet sensible d'un message court et sans ambiguïté, ou None"""
+    words = normalized.split()
+    if not words or len(words) > max_words or "?" in message:
+        return None
+    if NEGATION_WORDS.intersection(words):
+        return None
+    topics = list(TOPIC_KEYWORDS)
+    matches = {position for position, _ in get_topic_index().find(message)}
+    return topics[matches.pop()] if len(matches) == 1 else None
+
+def _local_route(message: str) -> Tuple:
+    """Route et réponse locales d'un message (voir classify_locally), ou None"""
+    config = get_fast_path_config()
+    if not config['ENABLED']:
+        return None
+
+    normalized = completion_cache.normalize_message(message)
+    kind = POLITENESS_PHRASES.get(normalized)
+    if kind is not None:
+        return kind, POLITENESS_RESPONSES[kind]
+    if config['ROUTE_SENSITIVE']:
+        topic = _clear_sensitive_topic(normalized, message, config['MAX_WORDS'])
+        if topic is not None:
+            return "sensitive_topic", get_appropriate_response_for_topic(topic)
+    return None
+
+def _local_result(route: str, response_text: str, scan: Dict, analysis: Dict = None) -> Dict:
+    """
+    Résultat d'une réponse locale, avec l'analyse du backend pour les sujets sensibles
+    (une exception si l'analyse a échoué : le résultat est alors sans analyse)
+    """
+    if isinstance(analysis, Exception):
+        logger.error(f"Error in analysis of a locally answered message: {str(analysis)}")
+        result = _unanalyzed_result(response_text, scan)
+        result["error"] = str(analysis)
+    elif analysis is None:
+        result = {
+            "response": response_text,
+            "detected_signals": scan["detected_signals"],
+            "violent_words": [],
+            "violent_words_count": 0,
+            "scopeflag": False
+        }
+    else:
+        result = _result_from_analysis({**analysis, "response": response_text}, scan)
+    result.update({"cached": False, "route": route})
+    return result
+
+def classify_locally(message: str, scan: Dict):
+    """
+    Pré-classification locale des messages qui ne nécessitent pas de réponse du modèle
+
+    Les formules de politesse (salutations, remerciements, au revoir) reçoivent une
+    réponse modèle, sans mot violent. Un message court, sans négation ni question, dont
+    les mots entiers relèvent d'une seule catégorie de sujet sensible reçoit la réponse
+    de get_appropriate_response_for_topic ; ses mots violents et son scopeflag restent
+    ceux du backend d'analyse (voir analysis_backends), qui interroge le modèle avec
+    OpenAIAnalysisBackend. Tous les autres messages sont transmis à OpenAI.
 
     Args:
-        message (str): Le message de l'utilisateur à analyser
-        employee_id (int, optional): ID de l'employé qui envoie le message
+        message (str): Le message de l'utilisateur
+        scan (Dict): Résultat de scan_message pour ce message
 
     Returns:
-        Dict: Dictionnaire contenant la réponse générée, les signaux détectés et l'analyse des mots
+        Dict | None: Résultat au format de analyze_message, ou None pour transmettre au modèle
     """
-    # Analyser le message pour détecter les sujets sensibles
-    topic_analysis = contains_sensitive_topic(message)
+    local = _local_route(message)
+    if local is None:
+        return None
+    route, response_text = local
+    analysis = None
+    if route == "sensitive_topic":
+        try:
+            analysis = get_analysis_backend().analyze(message)
+        except Exception as e:
+            analysis = e
+    return _local_result(route, response_text, scan, analysis)
+
+async def aclassify_locally(message: str, scan: Dict):
+    """Version asynchrone de classify_locally"""
+    local = _local_route(message)
+    if local is None:
+        return None
+    route, response_text = local
+    analysis = None
+    if route == "sensitive_topic":
+        try:
+            analysis = await get_analysis_backend().aanalyze(message)
+        except Exception as e:
+            analysis = e
+    return _local_result(route, response_text, scan, analysis)
 
-    # Journaliser pour le débogage
-    logger.info(f"Message: {message}")
-    logger.info(f"Topic analysis: {topic_analysis}")
+def _cached_completion(message: str, use_cache: bool, prompts_hash: str) -> Tuple:
+    """
+    Recherche la complétion d'un message dans le cache de complétions
+
+    Returns:
+        Tuple: (cache, clé, contenu) ; cache et clé valent None si le cache est
+        désactivé ou contourné, contenu vaut None en cas d'absence
+    """
+    cache = completion_cache.get_cache() if use_cache else None
+    if cache is None:
+        return None, None, None
+    key = completion_cache.make_key(message, prompts_hash)
+    content = cache.get(key)
+    metrics.CACHE_REQUESTS.inc(label="miss" if content is None else "hit")
+    return cache, key, content
+
+def _build_result(content: str, scan: Dict) -> Dict:
+    """
+    Construit le résultat à partir de la réponse JSON du modèle
+
+    Une sortie tronquée après la réponse est réparée localement (voir parsing) ;
+    si l'analyse y a été perdue, le résultat est marqué "analysis_unavailable" et
+    les statistiques du message ne sont pas enregistrées.
+
+    Args:
+        content (str): Contenu JSON renvoyé par OpenAI
+        scan (Dict): Résultat de scan_message pour le message de l'utilisateur
+
+    Returns:
+        Dict: Réponse, signaux, mots violents et scopeflag
+
+    Raises:
+        parsing.ParseError: Si la sortie ne contient pas de réponse complète
+    """
+    with metrics.STAGE_SECONDS.time("json_parse"):
+        analysis = parsing.parse_analysis(content)
+        result = _result_from_analysis(analysis.model_dump(), scan)
+        if not analysis.complete:
+            result["analysis_unavailable"] = True
+        return result
+
+def _build_local_analysis_result(reply: str, message: str, scan: Dict) -> Dict:
+    """Construit le résultat à partir d'une réponse seule et de l'analyse du backend local"""
+    return _result_from_analysis({"response": reply, **get_analysis_backend().analyze(message)}, scan)
+
+def _result_from_analysis(parsed_response: Dict, scan: Dict) -> Dict:
+    """
+    Applique les corrections liées aux sujets sensibles à une analyse (response,
+    violent_words, scopeflag) et construit le résultat final
+    """
+    topic_analysis = scan["topic_analysis"]
+
+    response_text = parsed_response.get("response", "Je n'ai pas pu analyser votre message correctement.")
+    violent_words = parsed_response.get("violent_words", [])
+    scopeflag = parsed_response.get("scopeflag", False)
+
+    # Surcharger le scopeflag si des mots-clés liés au travail sont détectés
+    # ou si le message concerne spécifiquement un sujet sensible
+    if topic_analysis["contains_workplace_context"] or topic_analysis["force_professional_context"]:
+        if scopeflag:
+            metrics.SCOPE_OVERRIDES.inc()
+        scopeflag = False
+        logger.info("Overriding scopeflag to false due to workplace context or sensitive topic")
+
+    # Si le message contient un sujet sensible mais a été marqué comme hors sujet,
+    # corriger la réponse avec une réponse appropriée
+    if topic_analysis["force_professional_context"] and (scopeflag or "uniquement conçu pour aider" in response_text):
+        logger.info("Message contains sensitive topic but was marked out of scope - correcting")
+        scopeflag = False
+
+        # Déterminer le type de sujet sensible pour générer une réponse appropriée
+        if topic_analysis["contains_racism"]:
+            response_text = get_appropriate_response_for_topic("racism")
+        elif topic_analysis["contains_harassment"]:
+            response_text = get_appropriate_response_for_topic("harassment")
+        elif topic_analysis["contains_discrimination"]:
+            response_text = get_appropriate_response_for_topic("discrimination")
+        elif topic_analysis["contains_stress"]:
+            response_text = get_appropriate_response_for_topic("stress")
+        elif topic_analysis["contains_conflict"]:
+            response_text = get_appropriate_response_for_topic("conflict")
+        else:
+            # Réponse générique pour les autres sujets sensibles
+            response_text = get_appropriate_response_for_topic("")
+
+    return {
+        "response": response_text,
+        "detected_signals": scan["detected_signals"],
+        "violent_words": violent_words,
+        "violent_words_count": len(violent_words),
+        "scopeflag": scopeflag
+    }
+
+def _unanalyzed_result(content: str, scan: Dict) -> Dict:
+    """
+    Résultat dont l'analyse n'est pas disponible (modèle injoignable ou hors délai)
+
+    Le marqueur "analysis_unavailable" empêche l'enregistrement des statistiques du
+    message (voir stats_for_message) : ses mots compteraient sans ses mots violents.
+    """
+    return {
+        "response": content,
+        "detected_signals": scan["detected_signals"],
+        "violent_words": [],
+        "violent_words_count": 0,
+        "scopeflag": False,
+        "analysis_unavailable": True
+    }
+
+def _build_fallback_result(content: str, scan: Dict, error: Exception) -> Dict:
+    """Construit le résultat de secours, sans analyse des mots violents"""
+    metrics.FALLBACKS.inc(label="error")
+    result = _unanalyzed_result(content, scan)
+    result["error"] = str(error)
+    return result
+
+def record_employee_stats(employee_id: int, total_words: int, violent_words: List[str], theme_ids: List[int]) -> bool:
+    """
+    Enregistre en une seule transaction les statistiques d'un message pour un employé
+
+    Args:
+        employee_id (int): ID de l'employé
+        total_words (int): Nombre de mots du message
+        violent_words (List[str]): Mots violents à enregistrer
+        theme_ids (List[int]): IDs des thématiques détectées
+
+    Returns:
+        bool: False si l'employé n'existe pas (rien n'est alors enregistré)
+    """
+    now = timezone.now()
+    return write_employee_stats(
+        employee_id,
+        total_words,
+        [(word, now) for word in violent_words],
+        Counter(theme_ids)
+    )
+
+def write_employee_stats(employee_id: int, total_words: int, violent_words: List[Tuple[str, datetime]],
+                         theme_counts: Dict[int, int], messages: int = 1) -> bool:
+    """
+    Écrit un lot de statistiques pour un employé avec un nombre constant de requêtes
+
+    Mise à jour des compteurs par F() sans charger l'employé, bulk_create des mots
+    violents, puis upsert des compteurs de thématiques et des agrégats quotidiens et
+    hebdomadaires : insertion des lignes manquantes en ignorant les conflits, puis
+    incrément groupé (voir rollups.increment_counters).
+
+    Args:
+        employee_id (int): ID de l'employé
+        total_words (int): Nombre de mots à ajouter
+        violent_words (List[Tuple[str, datetime]]): Mots violents et date de détection
+        theme_counts (Dict[int, int]): Incrément à appliquer par ID de thématique
+        messages (int): Nombre de messages du lot
+
+    Returns:
+        bool: False si l'employé n'existe pas (rien n'est alors enregistré)
+    """
+    with metrics.STAGE_SECONDS.time("stats_write"), transaction.atomic():
+        updated = Employee.objects.filter(id=employee_id).update(
+            total_words_count=F('total_words_count') + total_words,
+            violent_words_count=F('violent_words_count') + len(violent_words),
+            updated_at=timezone.now()
+        )
+        if not updated:
+            return False
+
+        if violent_words:
+            ViolentWord.objects.bulk_create([
+                ViolentWord(employee_id=employee_id, word=word, timestamp=timestamp)
+                for word, timestamp in violent_words
+            ])
+
+        rollups.increment_counters(
+            EmployeeThemeCounter,
+            {"employee_id": employee_id},
+            ("theme_id",),
+            {(theme_id,): {"count": count} for theme_id, count in theme_counts.items()}
+        )
+        rollups.record_rollups(employee_id, total_words, violent_words, theme_counts, messages)
+        transaction.on_commit(dashboard.invalidate_dashboard)
+    return True
+
+def save_employee_stats(employee_id: int, total_words: int, violent_words: List[str], theme_ids: List[int]) -> bool:
+    """
+    Enregistre les statistiques d'un message, via le tampon d'écriture différée s'il est activé
+
+    En écriture différée (voir stats_buffer), les statistiques sont seulement ajoutées
+    au tampon et l'existence de l'employé n'est pas vérifiée.
+
+    Returns:
+        bool: False si l'employé n'existe pas (écriture immédiate uniquement)
+    """
+    if stats_buffer.is_enabled():
+        stats_buffer.get_buffer().add(employee_id, total_words, violent_words, theme_ids)
+        return True
+    return record_employee_stats(employee_id, total_words, violent_words, theme_ids)
+
+async def asave_employee_stats(employee_id: int, total_words: int, violent_words: List[str], theme_ids: List[int]) -> bool:
+    """
+    Version asynchrone de save_employee_stats
+
+    transaction.atomic n'étant pas disponible dans l'ORM asynchrone, l'écriture
+    immédiate s'exécute dans un thread via sync_to_async.
+    """
+    if stats_buffer.is_enabled():
+        stats_buffer.get_buffer().add(employee_id, total_words, violent_words, theme_ids)
+        return True
+    return await sync_to_async(record_employee_stats)(employee_id, total_words, violent_words, theme_ids)
+
+def stats_for_message(result: Dict, message: str, scan: Dict) -> Optional[Tuple[int, List[str], List[int]]]:
+    """
+    Calcule les statistiques à enregistrer pour un message analysé
+
+    Les mots violents et les thématiques ne sont comptés que si le message est
+    dans le sujet (scopeflag = False). Sans analyse (résultat marqué
+    "analysis_unavailable"), rien n'est enregistré : les mots du message
+    dilueraient le ratio de mots violents de l'employé.
+
+    Returns:
+        Optional[Tuple[int, List[str], List[int]]]: Nombre de mots, mots violents, IDs
+        des thématiques, ou None si les statistiques ne doivent pas être enregistrées
+    """
+    if result.get("analysis_unavailable"):
+        return None
+    # Prétraitement du texte pour le comptage total des mots
+    total_words = len(preprocess_text(message))
+    if result.get("scopeflag", False):
+        return total_words, [], []
+    return total_words, result.get("violent_words", []), [theme_id for theme_id, name in scan["detected_themes"]]
+
+def _update_employee_stats(result: Dict, message: str, employee_id: int, scan: Dict) -> None:
+    """
+    Met à jour les statistiques de l'employé et les compteurs de thématiques
+
+    Args:
+        result (Dict): Résultat de l'analyse, complété en place
+        message (str): Le message de l'utilisateur
+        employee_id (int): ID de l'employé qui envoie le message
+        scan (Dict): Résultat de scan_message (thématiques détectées)
+    """
+    stats = stats_for_message(result, message, scan)
+    if stats is None:
+        logger.warning("Analysis unavailable, employee statistics not recorded for this message")
+        return
+    total_words, violent_words, theme_ids = stats
+    if not save_employee_stats(employee_id, total_words, violent_words, theme_ids):
+        result.update({"error": "Employé non trouvé"})
+        return
+
+    # Ajouter les résultats de l'analyse au résultat final
+    result.update({
+        "total_words": total_words,
+        "detected_themes": [name for theme_id, name in scan["detected_themes"]]
+    })
+
+async def _aupdate_employee_stats(result: Dict, message: str, employee_id: int, scan: Dict) -> None:
+    """
+    Version asynchrone de _update_employee_stats
+    """
+    stats = stats_for_message(result, message, scan)
+    if stats is None:
+        logger.warning("Analysis unavailable, employee statistics not recorded for this message")
+        return
+    total_words, violent_words, theme_ids = stats
+    if not await asave_employee_stats(employee_id, total_words, violent_words, theme_ids):
+        result.update({"error": "Employé non trouvé"})
+        return
+
+    result.update({
+        "total_words": total_words,
+        "detected_themes": [name for theme_id, name in scan["detected_themes"]]
+    })
+
+def _local_analysis_llm_result(message: str, scan: Dict, use_cache: bool, history: List[Dict] = None) -> Dict:
+    """
+    Demande au modèle la réponse seule et effectue l'analyse avec le backend local
+
+    Utilisé lorsque le backend d'analyse n'est pas combiné à l'appel au modèle
+    (voir analysis_backends) : le prompt d'analyse JSON n'est alors pas envoyé.
+    """
+    cache, cache_key, reply = _cached_completion(message, use_cache, prompts.get_prompts().reply_hash)
+    cached = reply is not None
+    if not cached:
+        try:
+            with metrics.STAGE_SECONDS.time("llm_reply"):
+                reply = llm.get_gateway().complete(
+                    prompts.reply_messages(message, history),
+                    model="gpt-3.5-turbo",
+                    temperature=0.7
+                )
+        except Exception as e:
+            logger.error(f"Error in OpenAI API call: {str(e)}")
+            return _template_result(scan, ["reply"], e)
+        if cache is not None:
+            cache.set(cache_key, reply)
+
+    result = _build_local_analysis_result(reply, message, scan)
+    result.update({"cached": cached, "route": "llm"})
+    return result
+
+async def _stream_reply(message: str, history: List[Dict] = None) -> AsyncIterator[str]:
+    """
+    Diffuse une réponse seule du modèle (sans analyse), morceau par morceau
+
+    La durée mesurée (étape llm_reply) inclut le temps de transmission au client.
+    """
+    with metrics.STAGE_SECONDS.time("llm_reply"):
+        async for text in llm.get_gateway().astream(
+            prompts.reply_messages(message, history),
+            model="gpt-3.5-turbo",
+            temperature=0.7
+        ):
+            yield text
+
+def _llm_result(message: str, scan: Dict, use_cache: bool, history: List[Dict] = None) -> Dict:
+    """Obtient la réponse et l'analyse des mots violents auprès d'OpenAI (ou du cache)"""
+    if not get_analysis_backend().combined_with_reply:
+        return _local_analysis_llm_result(message, scan, use_cache, history)
+
+    # Les messages fréquents sont servis par le cache de complétions
+    cache, cache_key, cached_content = _cached_completion(message, use_cache, prompts.get_prompts().analysis_hash)
 
     # Analyse OpenAI pour la réponse et l'analyse des mots violents en un seul appel
     try:
-        response = client.chat.completions.create(
+        if cached_content is not None:
+            result = _build_result(cached_content, scan)
+        else:
+            with metrics.STAGE_SECONDS.time("llm_analysis"):
+                content = llm.get_gateway().complete(
+                    prompts.analysis_messages(message, history),
+                    model="gpt-3.5-turbo",
+                    temperature=0.7,
+                    response_format={"type": "json_object"}
+                )
+            result = _build_result(content, scan)
+            log_analysis(message, result["violent_words"], result["scopeflag"])
+            if cache is not None:
+                cache.set(cache_key, content)
+    except Exception as e:
+        # En cas d'erreur, revenir à une réponse simple sans analyse des mots violents,
+        # puis à une réponse modèle si le modèle reste indisponible (disjoncteur ouvert)
+        logger.error(f"Error in OpenAI API call: {str(e)}")
+        try:
+            with metrics.STAGE_SECONDS.time("fallback"):
+                fallback_content = llm.get_gateway().complete(
+                    prompts.reply_messages(message, history),
+                    max_retries=0,
+                    model="gpt-3.5-turbo",
+                    temperature=0.7
+                )
+            result = _build_fallback_result(fallback_content, scan, e)
+        except Exception as fallback_error:
+            logger.error(f"Error in OpenAI fallback call: {str(fallback_error)}")
+            result = _template_result(scan, ["reply", "analysis"], fallback_error)
+
+    result["cached"] = cached_content is not None
+    result["route"] = "llm"
+    return result
+
+def get_pipeline_config() -> Dict:
+    """
+    Délais du pipeline asynchrone (settings.CHATBOT_PIPELINE), en secondes
+
+    HEDGE_DELAY est l'avance laissée à l'appel combiné avant de lancer en parallèle
+    une requête de réponse seule ; REPLY_TIMEOUT et ANALYSIS_TIMEOUT sont les
+    échéances, comptées depuis le début du traitement, de la réponse et de l'analyse.
+    """
+    return {
+        'HEDGE_DELAY': 2.0,
+        'REPLY_TIMEOUT': 15.0,
+        'ANALYSIS_TIMEOUT': 15.0,
+        **getattr(settings, 'CHATBOT_PIPELINE', {})
+    }
+
+async def _acomplete_analysis(message: str, timeout: float, history: List[Dict] = None,
+                              max_retries: int = None) -> str:
+    """Appel combiné réponse + analyse (mode JSON), retourne le contenu brut"""
+    with metrics.STAGE_SECONDS.time("llm_analysis"):
+        return await llm.get_gateway().acomplete(
+            prompts.analysis_messages(message, history),
+            max_retries=max_retries,
             model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT + "\n\n" + ANALYSIS_PROMPT},
-                {"role": "user", "content": message}
-            ],
             temperature=0.7,
-            response_format={"type": "json_object"}
+            response_format={"type": "json_object"},
+            timeout=timeout
         )
 
-        # Extraire la réponse JSON
-        content = response.choices[0].message.content
-        import json
-        parsed_response = json.loads(content)
-
-        response_text = parsed_response.get("response", "Je n'ai pas pu analyser votre message correctement.")
-        violent_words = parsed_response.get("violent_words", [])
-        scopeflag = parsed_response.get("scopeflag", False)
-
-        # Surcharger le scopeflag si des mots-clés liés au travail sont détectés
-        # ou si le message concerne spécifiquement un sujet sensible
-        if topic_analysis["contains_workplace_context"] or topic_analysis["force_professional_context"]:
-            scopeflag = False
-            logger.info("Overriding scopeflag to false due to workplace context or sensitive topic")
-
-        # Si le message contient un sujet sensible mais a été marqué comme hors sujet,
-        # corriger la réponse avec une réponse appropriée
-        if topic_analysis["force_professional_context"] and (scopeflag or "uniquement conçu pour aider" in response_text):
-            logger.info("Message contains sensitive topic but was marked out of scope - correcting")
-            scopeflag = False
-
-            # Déterminer le type de sujet sensible pour générer une réponse appropriée
-            if topic_analysis["contains_racism"]:
-                response_text = get_appropriate_response_for_topic("racism")
-            elif topic_analysis["contains_harassment"]:
-                response_text = get_appropriate_response_for_topic("harassment")
-            elif topic_analysis["contains_discrimination"]:
-                response_text = get_appropriate_response_for_topic("discrimination")
-            elif topic_analysis["contains_stress"]:
-                response_text = get_appropriate_response_for_topic("stress")
-            elif topic_analysis["contains_conflict"]:
-                response_text = get_appropriate_response_for_topic("conflict")
-            else:
-                # Réponse générique pour les autres sujets sensibles
-                response_text = get_appropriate_response_for_topic("")
-
-        result = {
-            "response": response_text,
-            "detected_signals": [signal for signal in DISTRESS_SIGNALS if signal.lower() in message.lower()],
-            "violent_words": violent_words,
-            "violent_words_count": len(violent_words),
-            "scopeflag": scopeflag
-        }
-    except Exception as e:
-        # En cas d'erreur, revenir à une réponse simple sans analyse des mots violents
-        logger.error(f"Error in OpenAI API call: {str(e)}")
-        fallback_response = client.chat.completions.create(
+async def _acomplete_reply(message: str, timeout: float, history: List[Dict] = None,
+                           max_retries: int = None) -> str:
+    """Appel de réponse seule, sans analyse des mots violents"""
+    with metrics.STAGE_SECONDS.time("llm_reply"):
+        return await llm.get_gateway().acomplete(
+            prompts.reply_messages(message, history),
+            max_retries=max_retries,
             model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": message}
-            ],
-            temperature=0.7
+            temperature=0.7,
+            timeout=timeout
         )
 
-        result = {
-            "response": fallback_response.choices[0].message.content,
-            "detected_signals": [signal for signal in DISTRESS_SIGNALS if signal.lower() in message.lower()],
-            "violent_words": [],
-            "violent_words_count": 0,
-            "scopeflag": False,
-            "error": str(e)
-        }
+def _build_partial_result(response_text: str, scan: Dict, timed_out: List[str], error: Exception = None) -> Dict:
+    """
+    Construit un résultat incomplet lorsque l'analyse (ou la réponse) du modèle
+    n'est pas arrivée à temps : le résultat est marqué "analysis_unavailable" et les
+    statistiques du message ne sont pas enregistrées (les termes sensibles du scan
+    local désignent des sujets, pas des mots violents)
+    """
+    result = _result_from_analysis({
+        "response": response_text,
+        "violent_words": [],
+        "scopeflag": False
+    }, scan)
+    result["analysis_unavailable"] = True
+    metrics.FALLBACKS.inc(label="partial")
+    result.update({"partial": True, "timed_out": timed_out})
+    if error is not None:
+        result["error"] = str(error)
+    return result
+
+def _template_result(scan: Dict, timed_out: List[str], error: Exception = None) -> Dict:
+    """Résultat de secours sans le modèle : réponse modèle locale, sans analyse"""
+    result = _build_partial_result(get_appropriate_response_for_topic(""), scan, timed_out, error)
+    result.update({"cached": False, "route": "llm"})
+    return result
+
+def _cached_llm_result(message: str, scan: Dict, use_cache: bool, combined: bool) -> Tuple:
+    """
+    Résultat du modèle présent dans le cache de complétions
+
+    Returns:
+        Tuple: (cache, clé, résultat) ; résultat vaut None en cas d'absence
+    """
+    prompt_set = prompts.get_prompts()
+    cache, cache_key, cached_content = _cached_completion(
+        message, use_cache, prompt_set.analysis_hash if combined else prompt_set.reply_hash
+    )
+    if cached_content is None:
+        return cache, cache_key, None
+    if combined:
+        result = _build_result(cached_content, scan)
+    else:
+        result = _build_local_analysis_result(cached_content, message, scan)
+    result.update({"cached": True, "route": "llm", "partial": False})
+    return cache, cache_key, result
+
+async def complete_llm_result_async(message: str, scan: Dict, use_cache: bool = True) -> Dict:
+    """
+    Résultat complet du modèle pour un message, sans réponse de secours
+
+    Destiné aux traitements par lots (voir chatbot.batch) : les erreurs de l'API
+    sont propagées pour que l'appelant réessaie, au lieu d'enregistrer un résultat
+    partiel. Les statistiques de l'employé ne sont pas mises à jour.
+
+    Args:
+        message (str): Le message de l'utilisateur
+        scan (Dict): Résultat de scan_message pour ce message
+        use_cache (bool): Utiliser le cache de complétions
+
+    Returns:
+        Dict: Résultat au format de analyze_message
+    """
+    combined = get_analysis_backend().combined_with_reply
+    cache, cache_key, result = _cached_llm_result(message, scan, use_cache, combined)
+    if result is not None:
+        return result
+
+    config = get_pipeline_config()
+    # Les réessais sont gérés par l'analyseur de lots (pause commune sur limite de débit)
+    if combined:
+        content = await _acomplete_analysis(message, config['ANALYSIS_TIMEOUT'], max_retries=0)
+        result = _build_result(content, scan)
+        log_analysis(message, result["violent_words"], result["scopeflag"])
+    else:
+        content = await _acomplete_reply(message, config['REPLY_TIMEOUT'], max_retries=0)
+        result = _build_local_analysis_result(content, message, scan)
+    if cache is not None:
+        cache.set(cache_key, content)
+
+    result.update({"cached": False, "route": "llm", "partial": False})
+    return result
+
+async def _allm_result(message: str, scan: Dict, use_cache: bool, history: List[Dict] = None) -> Dict:
+    """
+    Version asynchrone de _llm_result : pipeline concurrent avec échéances
+
+    Avec le backend OpenAI, l'appel combiné (réponse + analyse) est lancé seul ;
+    s'il échoue ou n'a pas répondu après HEDGE_DELAY, une requête de réponse seule
+    est lancée en parallèle au lieu d'attendre l'échec pour la lancer en série. Le
+    premier résultat complet l'emporte ; si seule la réponse arrive, l'analyse est
+    attendue jusqu'à ANALYSIS_TIMEOUT puis abandonnée (aucun mot violent). Sans aucune
+    réponse à REPLY_TIMEOUT, une réponse modèle est renvoyée. Le résultat indique
+    alors "partial" et les étapes hors délai dans "timed_out".
+
+    Avec un backend d'analyse local, seule la réponse est demandée au modèle.
+    """
+    combined = get_analysis_backend().combined_with_reply
+    cache, cache_key, result = _cached_llm_result(message, scan, use_cache, combined)
+    if result is not None:
+        return result
+
+    config = get_pipeline_config()
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    hedge_at = started + config['HEDGE_DELAY']
+    reply_deadline = started + config['REPLY_TIMEOUT']
+    analysis_deadline = started + config['ANALYSIS_TIMEOUT']
+
+    analysis_task = asyncio.create_task(_acomplete_analysis(message, config['ANALYSIS_TIMEOUT'], history)) if combined else None
+    reply_task = None if combined else asyncio.create_task(_acomplete_reply(message, config['REPLY_TIMEOUT'], history))
+    pending = {task for task in (analysis_task, reply_task) if task is not None}
+    result = content = reply = error = None
+
+    try:
+        while True:
+            now = loop.time()
+            if result is not None:
+                break
+            if reply is not None and (analysis_task is None or analysis_task.done() or now >= analysis_deadline):
+                break
+            if reply is None and now >= reply_deadline:
+                break
+            # Requête de secours en parallèle : appel combiné lent ou en échec
+            if reply_task is None and (now >= hedge_at or analysis_task.done()):
+                reply_task = asyncio.create_task(_acomplete_reply(message, max(reply_deadline - now, 0.001), history))
+                pending.add(reply_task)
+            if not pending:
+                break
+
+            wake_at = reply_deadline if reply is None else analysis_deadline
+            if reply_task is None:
+                wake_at = min(wake_at, hedge_at)
+            done, pending = await asyncio.wait(pending, timeout=max(wake_at - now, 0), return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                try:
+                    if task is analysis_task:
+                        content = task.result()
+                        result = _build_result(content, scan)
+                    else:
+                        reply = task.result()
+                except Exception as e:
+                    logger.error(f"Error in OpenAI API call: {str(e)}")
+                    error = e
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if result is not None:
+        log_analysis(message, result["violent_words"], result["scopeflag"])
+        if cache is not None:
+            cache.set(cache_key, content)
+        result["partial"] = False
+    elif reply is not None and not combined:
+        result = _build_local_analysis_result(reply, message, scan)
+        if cache is not None:
+            cache.set(cache_key, reply)
+        result["partial"] = False
+    elif reply is not None:
+        logger.warning("Analysis completion missed its deadline, returning partial result")
+        result = _build_partial_result(reply, scan, ["analysis"], error)
+    else:
+        logger.warning("No completion before the reply deadline, returning template response")
+        result = _template_result(scan, ["reply", "analysis"] if combined else ["reply"], error)
+
+    result.update({"cached": False, "route": "llm"})
+    return result
+
+def _summarize_conversation(context: Dict) -> None:
+    """Intègre au résumé de la conversation les messages sortis de la fenêtre de contexte"""
+    try:
+        with metrics.STAGE_SECONDS.time("summary"):
+            summary = llm.get_gateway().complete(
+                conversations.summary_messages(context),
+                model="gpt-3.5-turbo",
+                temperature=0.3,
+                max_tokens=conversations.get_config()['SUMMARY_MAX_TOKENS']
+            )
+            conversations.save_summary(context, summary)
+    except Exception as e:
+        # Nouvel essai au tour suivant : les messages hors fenêtre restent à résumer
+        logger.error(f"Error while summarizing conversation {context['conversation_id']}: {str(e)}")
+
+async def _asummarize_conversation(context: Dict) -> None:
+    """Version asynchrone de _summarize_conversation"""
+    try:
+        with metrics.STAGE_SECONDS.time("summary"):
+            summary = await llm.get_gateway().acomplete(
+                conversations.summary_messages(context),
+                model="gpt-3.5-turbo",
+                temperature=0.3,
+                max_tokens=conversations.get_config()['SUMMARY_MAX_TOKENS']
+            )
+            await sync_to_async(conversations.save_summary)(context, summary)
+    except Exception as e:
+        logger.error(f"Error while summarizing conversation {context['conversation_id']}: {str(e)}")
+
+def _count_message(result: Dict) -> None:
+    """Compte un message répondu (route et mots violents détectés)"""
+    metrics.MESSAGES.inc(label=result["route"])
+    if result["violent_words_count"]:
+        metrics.VIOLENT_WORDS.inc(result["violent_words_count"])
+
+def analyze_message(message: str, employee_id: int = None, use_cache: bool = True,
+                    conversation_id: int = None) -> Dict:
+    """
+    Analyse le message pour détecter les signaux de détresse et générer une réponse appropriée
+
+    Les messages triviaux (formules de politesse) et les sujets sensibles évidents
+    reçoivent une réponse locale (voir classify_locally) ; les autres sont transmis à OpenAI.
+
+    Args:
+        message (str): Le message de l'utilisateur à analyser
+        employee_id (int, optional): ID de l'employé qui envoie le message
+        use_cache (bool): Utiliser le cache de complétions (False pour forcer un appel à OpenAI)
+        conversation_id (int, optional): Conversation dont l'historique est envoyé au modèle,
+            et à laquelle le tour est ajouté (voir conversations)
+
+    Returns:
+        Dict: Dictionnaire contenant la réponse générée, les signaux détectés et l'analyse des mots
+    """
+    # Analyser le message en une seule passe (sujets sensibles, signaux, thématiques)
+    scan = scan_message(message)
+
+    # Journaliser pour le débogage
+    logger.info(f"Message: {message}")
+    logger.info(f"Topic analysis: {scan['topic_analysis']}")
+
+    context = conversations.build_context(conversation_id) if conversation_id else None
+    history = context["messages"] if context else None
+
+    result = classify_locally(message, scan)
+    if result is None:
+        # Le cache de complétions ignore l'historique : il ne sert qu'en début de conversation
+        result = _llm_result(message, scan, use_cache and not history, history)
+    _count_message(result)
+
+    if context is not None:
+        conversations.record_turn(conversation_id, message, result["response"])
+        result["conversation_id"] = conversation_id
+        if context["summarize"]:
+            _summarize_conversation(context)
 
     # Analyse des thématiques et mise à jour des statistiques si un employé est spécifié
     if employee_id:
-        try:
-            employee = Employee.objects.get(id=employee_id)
-
-            # Prétraitement du texte pour le comptage total des mots
-            words = preprocess_text(message)
-            total_words = len(words)
-
-            # Mise à jour des statistiques de l'employé
-            employee.total_words_count += total_words
-
-            # Seulement incrémenter le compteur de mots violents si le message est dans le sujet (scopeflag = False)
-            if not result.get("scopeflag", False) and violent_words:
-                employee.violent_words_count += len(violent_words)
-
-                # Enregistrement des mots violents seulement si dans le sujet
-                for word in violent_words:
-                    ViolentWord.objects.create(
-                        employee=employee,
-                        word=word
-                    )
-
-            employee.save()
-
-            # Analyse des thématiques
-            themes = PsychologicalTheme.objects.all()
-            detected_themes = []
-
-            # Détection simple des thématiques par présence du nom
-            text_lower = message.lower()
-            for theme in themes:
-                if theme.name.lower() in text_lower:
-                    detected_themes.append(theme)
-
-            # Mise à jour des compteurs de thématiques seulement si dans le sujet
-            if not result.get("scopeflag", False) and detected_themes:
-                for theme in detected_themes:
-                    counter, created = EmployeeThemeCounter.objects.get_or_create(
-                        employee=employee,
-                        theme=theme,
-                        defaults={'count': 0}
-                    )
-                    counter.count = F('count') + 1
-                    counter.save()
-
-            # Ajouter les résultats de l'analyse au résultat final
-            result.update({
-                "total_words": total_words,
-                "detected_themes": [theme.name for theme in detected_themes]
-            })
-
-        except Employee.DoesNotExist:
-            result.update({"error": "Employé non trouvé"})
+        _update_employee_stats(result, message, employee_id, scan)
+
+    return result
+
+async def _arecord_turn(context: Dict, message: str, result: Dict) -> None:
+    """Ajoute le tour à la conversation du contexte, s'il y en a une"""
+    if context is not None:
+        await sync_to_async(conversations.record_turn)(context["conversation_id"], message, result["response"])
+        result["conversation_id"] = context["conversation_id"]
+
+async def analyze_message_async(message: str, employee_id: int = None, use_cache: bool = True,
+                                conversation_id: int = None) -> Dict:
+    """
+    Version asynchrone de analyze_message
+
+    L'appel à OpenAI passe par AsyncOpenAI et les mises à jour des statistiques par
+    l'ORM asynchrone : le worker ASGI reste disponible pendant l'attente du modèle.
+    Le résumé de la conversation, si nécessaire, est mis à jour en parallèle de la
+    réponse (il sert à partir du tour suivant).
+
+    Args:
+        message (str): Le message de l'utilisateur à analyser
+        employee_id (int, optional): ID de l'employé qui envoie le message
+        use_cache (bool): Utiliser le cache de complétions (False pour forcer un appel à OpenAI)
+        conversation_id (int, optional): Conversation dont l'historique est envoyé au modèle
+
+    Returns:
+        Dict: Dictionnaire contenant la réponse générée, les signaux détectés et l'analyse des mots
+    """
+    scan = scan_message(message, themes=await aget_theme_index())
+
+    logger.info(f"Message: {message}")
+    logger.info(f"Topic analysis: {scan['topic_analysis']}")
+
+    context = await sync_to_async(conversations.build_context)(conversation_id) if conversation_id else None
+    history = context["messages"] if context else None
+    summary_task = asyncio.create_task(_asummarize_conversation(context)) if context and context["summarize"] else None
+
+    try:
+        result = await aclassify_locally(message, scan)
+        if result is None:
+            result = await _allm_result(message, scan, use_cache and not history, history)
+        _count_message(result)
+
+        await _arecord_turn(context, message, result)
+    finally:
+        if summary_task is not None:
+            await summary_task
+
+    if employee_id:
+        await _aupdate_employee_stats(result, message, employee_id, scan)
 
     return result
+
+async def stream_message_async(message: str, employee_id: int = None, use_cache: bool = True,
+                               conversation_id: int = None) -> AsyncIterator[Tuple[str, Dict]]:
+    """
+    Version diffusée de analyze_message_async
+
+    Le texte de "response" est transmis au fur et à mesure que les tokens arrivent,
+    puis un dernier événement contient le résultat complet (violent_words, scopeflag...).
+    Le résumé de la conversation, si nécessaire, est mis à jour après cet événement.
+
+    Args:
+        message (str): Le message de l'utilisateur à analyser
+        employee_id (int, optional): ID de l'employé qui envoie le message
+        use_cache (bool): Utiliser le cache de complétions (False pour forcer un appel à OpenAI)
+        conversation_id (int, optional): Conversation dont l'historique est envoyé au modèle
+
+    Yields:
+        Tuple[str, Dict]: ("token", {"text": ...}) puis ("done", résultat)
+    """
+    scan = scan_message(message, themes=await aget_theme_index())
+
+    logger.info(f"Message: {message}")
+    logger.info(f"Topic analysis: {scan['topic_analysis']}")
+
+    context = await sync_to_async(conversations.build_context)(conversation_id) if conversation_id else None
+    history = context["messages"] if context else None
+    use_cache = use_cache and not history
+
+    combined = get_analysis_backend().combined_with_reply
+    prompt_set = prompts.get_prompts()
+    prompts_hash = prompt_set.analysis_hash if combined else prompt_set.reply_hash
+
+    result = await aclassify_locally(message, scan)
+    cache, cache_key, cached_content = (None, None, None) if result else _cached_completion(message, use_cache, prompts_hash)
+    if cached_content is not None:
+        if combined:
+            result = _build_result(cached_content, scan)
+        else:
+            result = _build_local_analysis_result(cached_content, message, scan)
+        result.update({"cached": True, "route": "llm"})
+    if result is not None:
+        # Réponse locale ou en cache : elle est transmise d'un seul bloc
+        _count_message(result)
+        yield "token", {"text": result["response"]}
+        if employee_id:
+            await _aupdate_employee_stats(result, message, employee_id, scan)
+        await _arecord_turn(context, message, result)
+        yield "done", result
+        return
+
+    if not combined:
+        # Analyse locale : seule la réponse est demandée (et diffusée) au modèle
+        reply = ""
+        try:
+            async for text in _stream_reply(message, history):
+                reply += text
+                yield "token", {"text": text}
+            result = _build_local_analysis_result(reply, message, scan)
+            if cache is not None:
+                cache.set(cache_key, reply)
+        except Exception as e:
+            logger.error(f"Error in OpenAI API call: {str(e)}")
+            if reply:
+                # Une partie de la réponse a déjà été diffusée : la conserver sans analyse
+                result = _build_fallback_result(reply, scan, e)
+            else:
+                result = _template_result(scan, ["reply"], e)
+                yield "token", {"text": result["response"]}
+    else:
+        stream = parsing.ResponseStreamParser()
+        streamed_text = ""
+        try:
+            with metrics.STAGE_SECONDS.time("llm_analysis"):
+                async for delta in llm.get_gateway().astream(
+                    prompts.analysis_messages(message, history),
+                    model="gpt-3.5-turbo",
+                    temperature=0.7,
+                    response_format={"type": "json_object"}
+                ):
+                    text = stream.feed(delta)
+                    if text:
+                        streamed_text += text
+                        yield "token", {"text": text}
+            result = _build_result(stream.content, scan)
+            log_analysis(message, result["violent_words"], result["scopeflag"])
+            if cache is not None:
+                cache.set(cache_key, stream.content)
+        except Exception as e:
+            logger.error(f"Error in OpenAI API call: {str(e)}")
+            if streamed_text:
+                # Une partie de la réponse a déjà été diffusée : la conserver sans analyse
+                result = _build_fallback_result(streamed_text, scan, e)
+            else:
+                fallback_text = ""
+                try:
+                    async for text in _stream_reply(message, history):
+                        fallback_text += text
+                        yield "token", {"text": text}
+                    result = _build_fallback_result(fallback_text, scan, e)
+                except Exception as fallback_error:
+                    logger.error(f"Error in OpenAI fallback call: {str(fallback_error)}")
+                    if fallback_text:
+                        result = _build_fallback_result(fallback_text, scan, fallback_error)
+                    else:
+                        result = _template_result(scan, ["reply", "analysis"], fallback_error)
+                        yield "token", {"text": result["response"]}
+
+    result.update({"cached": False, "route": "llm"})
+    _count_message(result)
+
+    if employee_id:
+        await _aupdate_employee_stats(result, message, employee_id, scan)
+    await _arecord_turn(context, message, result)
+
+    yield "done", result
+
+    if context is not None and context["summarize"]:
+        await _asummarize_conversation(context)
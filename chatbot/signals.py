@@ -0,0 +1,21 @@
+"""
+Signaux Django du chatbot
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Employee, PsychologicalTheme
+
+
+@receiver([post_save, post_delete], sender=PsychologicalTheme)
+def invalidate_theme_caches(sender, **kwargs):
+    """Recharge l'index des thématiques lorsque les thématiques changent"""
+    from .theme_index import invalidate_theme_index
+    invalidate_theme_index()
+
+
+@receiver(post_delete, sender=Employee)
+def forget_deleted_employee(sender, instance, **kwargs):
+    """Oublie l'employé de démonstration gardé en mémoire s'il est supprimé"""
+    from .identity import forget_employee
+    forget_employee(instance.id)
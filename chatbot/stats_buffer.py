@@ -0,0 +1,285 @@
+"""
+Tampon d'écriture différée (write-behind) des statistiques des employés
+
+Les statistiques de chaque message sont agrégées en mémoire par employé, puis
+écrites en base par un thread d'arrière-plan lorsque le nombre de messages en
+attente ou le délai configuré est atteint. La requête /chat/ ne prend donc plus
+de verrou d'écriture SQLite.
+
+Configuration (settings.CHATBOT_STATS_BUFFER) :
+    ENABLED        Active l'écriture différée (sinon écriture synchrone)
+    MAX_PENDING    Nombre de messages en attente déclenchant une écriture
+    FLUSH_INTERVAL Délai maximal (secondes) avant écriture
+    MAX_FAILURES   Écritures en échec après lesquelles les statistiques d'un employé
+                   sont abandonnées (journalisées en erreur)
+    TRIGGER_FILE   Fichier dont la modification force une écriture (voir flush_stats)
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'MAX_PENDING': 200,
+    'FLUSH_INTERVAL': 2.0,
+    'MAX_FAILURES': 3,
+    'TRIGGER_FILE': None,
+}
+
+# Intervalle de vérification du fichier de déclenchement et des seuils
+POLL_INTERVAL = 0.5
+
+
+def get_config() -> Dict:
+    """Retourne la configuration du tampon, complétée par les valeurs par défaut"""
+    return {**DEFAULTS, **getattr(settings, 'CHATBOT_STATS_BUFFER', {})}
+
+
+def is_enabled() -> bool:
+    """Indique si l'écriture différée des statistiques est activée"""
+    return get_config()['ENABLED']
+
+
+class _EmployeeDelta:
+    """Statistiques agrégées en attente d'écriture pour un employé"""
+
+    __slots__ = ('total_words', 'violent_words', 'theme_counts', 'messages', 'failures')
+
+    def __init__(self):
+        self.total_words = 0
+        self.violent_words: List[Tuple[str, datetime]] = []
+        self.theme_counts: Counter = Counter()
+        self.messages = 0
+        # Écritures en échec de ces statistiques (voir StatsBuffer.flush)
+        self.failures = 0
+
+    def merge(self, other: '_EmployeeDelta') -> None:
+        self.total_words += other.total_words
+        self.violent_words.extend(other.violent_words)
+        self.theme_counts.update(other.theme_counts)
+        self.messages += other.messages
+
+
+class StatsBuffer:
+    """
+    Agrège les statistiques par employé et les écrit en base en arrière-plan
+
+    Args:
+        max_pending (int): Nombre de messages en attente déclenchant une écriture
+        flush_interval (float): Délai maximal en secondes avant écriture
+        trigger_file (str, optional): Fichier dont la modification force une écriture
+        max_failures (int): Écritures en échec après lesquelles les statistiques d'un
+            employé sont abandonnées
+    """
+
+    def __init__(self, max_pending: int = 200, flush_interval: float = 2.0, trigger_file: str = None,
+                 max_failures: int = 3):
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self.max_failures = max_failures
+        self.trigger_file = str(trigger_file) if trigger_file else None
+        self._pending: Dict[int, _EmployeeDelta] = {}
+        self._pending_messages = 0
+        self._lock = threading.Lock()
+        # Sérialise les écritures entre le thread d'arrière-plan et flush() explicite
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._last_flush = time.monotonic()
+        self._trigger_mtime = self._read_trigger_mtime()
+
+    @property
+    def pending_messages(self) -> int:
+        return self._pending_messages
+
+    def add(self, employee_id: int, total_words: int, violent_words: List[str], theme_ids: List[int]) -> None:
+        """
+        Ajoute les statistiques d'un message au tampon (sans accès à la base)
+
+        Args:
+            employee_id (int): ID de l'employé
+            total_words (int): Nombre de mots du message
+            violent_words (List[str]): Mots violents détectés
+            theme_ids (List[int]): IDs des thématiques détectées
+        """
+        now = timezone.now()
+        with self._lock:
+            delta = self._pending.get(employee_id)
+            if delta is None:
+                delta = self._pending[employee_id] = _EmployeeDelta()
+            delta.total_words += total_words
+            delta.violent_words.extend((word, now) for word in violent_words)
+            delta.theme_counts.update(theme_ids)
+            delta.messages += 1
+            self._pending_messages += 1
+            full = self._pending_messages >= self.max_pending
+
+        if full:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """
+        Écrit en base toutes les statistiques en attente, en une seule transaction
+
+        En cas d'erreur, les statistiques sont réécrites employé par employé, chacun
+        dans sa transaction, pour qu'un employé en échec ne bloque pas les autres. Les
+        statistiques en échec sont remises dans le tampon pour une prochaine tentative,
+        puis abandonnées après max_failures échecs.
+
+        Returns:
+            int: Nombre de messages dont les statistiques ont été écrites
+        """
+        from django.db import transaction
+
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._pending_messages = 0
+            self._last_flush = time.monotonic()
+            if not pending:
+                return 0
+
+            try:
+                with transaction.atomic():
+                    for employee_id, delta in pending.items():
+                        self._write(employee_id, delta)
+                written = pending
+            except Exception as e:
+                logger.error(f"Error while flushing statistics, retrying employee by employee: {str(e)}")
+                written = {}
+                failed = {}
+                for employee_id, delta in pending.items():
+                    try:
+                        with transaction.atomic():
+                            self._write(employee_id, delta)
+                        written[employee_id] = delta
+                    except Exception as error:
+                        delta.failures += 1
+                        if delta.failures < self.max_failures:
+                            failed[employee_id] = delta
+                        else:
+                            logger.error(
+                                f"Statistics of {delta.messages} messages dropped for employee {employee_id} "
+                                f"after {delta.failures} failed flushes: {str(error)}"
+                            )
+                self._requeue(failed)
+
+        messages = sum(delta.messages for delta in written.values())
+        logger.info(f"Flushed statistics for {messages} messages ({len(written)} employees)")
+        return messages
+
+    def _write(self, employee_id: int, delta: _EmployeeDelta) -> None:
+        from .services import write_employee_stats
+
+        written = write_employee_stats(
+            employee_id,
+            delta.total_words,
+            delta.violent_words,
+            delta.theme_counts,
+            delta.messages
+        )
+        if not written:
+            logger.warning(f"Statistics dropped for unknown employee {employee_id}")
+
+    def _requeue(self, pending: Dict[int, _EmployeeDelta]) -> None:
+        with self._lock:
+            for employee_id, delta in pending.items():
+                current = self._pending.get(employee_id)
+                if current is not None:
+                    delta.merge(current)
+                self._pending[employee_id] = delta
+                self._pending_messages += delta.messages
+
+    def _read_trigger_mtime(self) -> float:
+        if not self.trigger_file:
+            return 0.0
+        try:
+            return os.stat(self.trigger_file).st_mtime
+        except OSError:
+            return 0.0
+
+    def _should_flush(self) -> bool:
+        if self._pending_messages >= self.max_pending:
+            return True
+        if self._pending_messages and time.monotonic() - self._last_flush >= self.flush_interval:
+            return True
+        mtime = self._read_trigger_mtime()
+        if mtime != self._trigger_mtime:
+            self._trigger_mtime = mtime
+            return True
+        return False
+
+    def _run(self) -> None:
+        while not self._stopping:
+            self._wake.wait(POLL_INTERVAL)
+            self._wake.clear()
+            if self._should_flush():
+                self.flush()
+                connection.close_if_unusable_or_obsolete()
+        connection.close()
+
+    def start(self) -> None:
+        """Démarre le thread d'écriture et l'écriture finale à l'arrêt du processus"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='stats-buffer', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """Arrête le thread d'écriture puis écrit les statistiques restantes"""
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer(start: bool = True) -> StatsBuffer:
+    """
+    Retourne le tampon du processus, démarré à la première utilisation
+
+    Args:
+        start (bool): Démarrer le thread d'écriture (False pour une écriture
+            ponctuelle, par exemple depuis une commande de gestion)
+    """
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                config = get_config()
+                _buffer = StatsBuffer(
+                    max_pending=config['MAX_PENDING'],
+                    flush_interval=config['FLUSH_INTERVAL'],
+                    trigger_file=config['TRIGGER_FILE'],
+                    max_failures=config['MAX_FAILURES']
+                )
+    if start and _buffer._thread is None:
+        _buffer.start()
+    return _buffer
+
+
+def request_flush() -> None:
+    """Demande à tous les processus utilisant le tampon d'écrire leurs statistiques"""
+    trigger_file = get_config()['TRIGGER_FILE']
+    if trigger_file:
+        with open(trigger_file, 'a'):
+            os.utime(trigger_file, None)
@@ -1,3 +1,1331 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command, CommandError
+from django.db import IntegrityError, connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from openai import AsyncOpenAI, OpenAI
+
+from benchmarks import bench_replay
+from benchmarks.fake_openai import FakeOpenAIServer, is_json_request
+from benchmarks.utils import plan_problems
+from . import (
+    analytics, analysis_backends, batch, completion_cache, conversations, identity, llm, metrics, parsing, prompts,
+    retention, services, stats_buffer, theme_index, themes
+)
+from .stats_buffer import StatsBuffer
+from .models import (
+    Conversation, Employee, EmployeeStatsRollup, EmployeeThemeCounter, Message, OrganisationStatsRollup,
+    PsychologicalTheme, ViolentWord, ViolentWordArchive
+)
+
+
+def setUpModule():
+    # Les tests créent leurs propres thématiques : retirer celles de la migration 0008_default_themes.
+    # Uniquement sur la base de test en mémoire : si seuls des SimpleTestCase sont lancés, la base
+    # de test n'est pas créée et la connexion désigne la base du projet.
+    if connection.is_in_memory_db():
+        PsychologicalTheme.objects.all().delete()
+
+
+@override_settings(CHATBOT_FAST_PATH={'ENABLED': False})
+class FakeOpenAITestCase(TestCase):
+    """Cas de test dont les appels OpenAI sont servis par un serveur local factice"""
+
+    server_options = {}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeOpenAIServer(**cls.server_options).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        theme_index.invalidate_theme_index()
+        completion_cache.get_cache().clear()
+        # Un client par test : le pool de connexions httpx est lié à la boucle d'événements
+        client = AsyncOpenAI(base_url=self.server.base_url, api_key="test", max_retries=0)
+        sync_client = OpenAI(base_url=self.server.base_url, api_key="test", max_retries=0)
+        for name, value in (("get_async_client", client), ("get_client", sync_client)):
+            patcher = mock.patch.object(llm, name, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.close_client, client)
+        self.addCleanup(sync_client.close)
+        # Passerelle neuve (disjoncteur fermé), configurée par les settings du test
+        llm.reset_clients()
+        self.addCleanup(llm.reset_clients)
+
+    @staticmethod
+    def close_client(client):
+        """Ferme le client sans attendre sa collecte, qui échouerait une fois sa boucle fermée"""
+        try:
+            async_to_sync(client.close)()
+        except RuntimeError:
+            # Connexions liées à la boucle du test, déjà fermée : le client est tout de même marqué fermé
+            pass
+
+
+class ParsingTests(SimpleTestCase):
+    def test_decodes_response_across_arbitrary_chunks(self):
+        content = json.dumps({
+            "response": "Ligne 1\n\"cité\" é 😀",
+            "violent_words": [],
+            "scopeflag": False
+        })
+        for size in (1, 2, 3, 7):
+            stream = parsing.ResponseStreamParser()
+            text = "".join(stream.feed(content[i:i + size]) for i in range(0, len(content), size))
+            self.assertEqual(text, "Ligne 1\n\"cité\" é 😀")
+            self.assertEqual(stream.content, content)
+            self.assertTrue(stream.close().complete)
+
+    def test_schema_is_normalised(self):
+        analysis = parsing.parse_analysis('{"response": "Bonjour", "violent_words": "rage", "scopeflag": "true", "x": 1}')
+        self.assertEqual((analysis.violent_words, analysis.scopeflag), (["rage"], True))
+        analysis = parsing.parse_analysis('{"response": "Bonjour", "violent_words": [" rage ", 3, ""]}')
+        self.assertEqual(analysis.violent_words, ["rage"])
+        self.assertFalse(analysis.complete)
+
+    def test_malformed_outputs_are_repaired(self):
+        cases = {
+            '```json\n{"response": "Bonjour", "violent_words": ["rage",], "scopeflag": false,}\n```':
+                {"response": "Bonjour", "violent_words": ["rage"], "scopeflag": False},
+            '{"response": "Bonjour {ok}", "violent_words": ["rage", "men':
+                {"response": "Bonjour {ok}", "violent_words": ["rage"]},
+            '{"response": "Bonjour", "violent_words": [], "scopeflag": tr':
+                {"response": "Bonjour", "violent_words": []},
+            '{"response": "Bonjour", "violent_words": [], "scopeflag": true':
+                {"response": "Bonjour", "violent_words": [], "scopeflag": True},
+            '{"response": "Bonjour", "viol': {"response": "Bonjour"},
+            '{"response": "Bonjour",\n': {"response": "Bonjour"},
+        }
+        for content, expected in cases.items():
+            with self.subTest(content=content):
+                self.assertEqual(json.loads(parsing.repair_json(content)), expected)
+        self.assertIsNone(parsing.repair_json('{"response": "Bonjour"]'))
+
+    def test_cut_or_missing_response_is_an_error(self):
+        before = metrics.JSON_OUTPUTS.value("invalid")
+        for content in ('{"response": "Je compr', '{"violent_words": []}', '"pas un objet"', ""):
+            with self.subTest(content=content), self.assertRaises(parsing.ParseError):
+                parsing.parse_analysis(content)
+        self.assertEqual(metrics.JSON_OUTPUTS.value("invalid") - before, 4)
+
+
+class KeywordScanTests(TestCase):
+    def setUp(self):
+        theme_index.invalidate_theme_index()
+
+    def test_matches_categories_signals_and_themes_in_one_pass(self):
+        theme = PsychologicalTheme.objects.create(name="Épuisement")
+        scan = services.scan_message("Mon MANAGER me harcele, je suis en epuisement total")
+
+        topics = scan["topic_analysis"]
+        self.assertTrue(topics["contains_harassment"])
+        self.assertTrue(topics["contains_stress"])
+        self.assertTrue(topics["contains_workplace_context"])
+        self.assertTrue(topics["force_professional_context"])
+        self.assertFalse(topics["contains_racism"])
+        self.assertEqual(scan["detected_signals"], ["épuisement"])
+        self.assertEqual(scan["detected_themes"], [(theme.id, "Épuisement")])
+
+    def test_overlapping_terms_are_all_reported(self):
+        topics = services.contains_sensitive_topic("C'est de la discrimination raciale")
+        self.assertTrue(topics["contains_racism"])
+        self.assertTrue(topics["contains_discrimination"])
+
+    def test_theme_index_is_reloaded_when_themes_change(self):
+        self.assertEqual(services.scan_message("mobbing")["detected_themes"], [])
+        theme = PsychologicalTheme.objects.create(name="Mobbing")
+        self.assertEqual(services.scan_message("mobbing")["detected_themes"], [(theme.id, "Mobbing")])
+        theme.synonyms = "harcèlement collectif"
+        theme.save()
+        self.assertEqual(services.scan_message("un harcèlement collectif")["detected_themes"], [(theme.id, "Mobbing")])
+        theme.delete()
+        self.assertEqual(services.scan_message("mobbing")["detected_themes"], [])
+
+    def test_theme_index_is_loaded_once(self):
+        PsychologicalTheme.objects.create(name="Stress")
+        with self.assertNumQueries(1):
+            for _ in range(3):
+                services.scan_message("Du stress")
+
+    def test_initialize_themes_creates_missing_themes_once(self):
+        PsychologicalTheme.objects.create(name="Stress", description="Personnalisée")
+        self.assertEqual(services.scan_message("mobbing")["detected_themes"], [])
+
+        with self.assertNumQueries(2):
+            created = themes.initialize_themes()
+        self.assertEqual(created, len(themes.DEFAULT_THEMES) - 1)
+        self.assertEqual(PsychologicalTheme.objects.get(name="Stress").description, "Personnalisée")
+        self.assertEqual([name for _, name in services.scan_message("mobbing")["detected_themes"]], ["Mobbing"])
+
+        with self.assertNumQueries(1):
+            self.assertEqual(themes.initialize_themes(), 0)
+
+
+class ThemeIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = theme_index.ThemeIndex(
+            (theme_id, theme["name"], theme["synonyms"]) for theme_id, theme in enumerate(themes.DEFAULT_THEMES, start=1)
+        )
+
+    def names(self, message):
+        return [name for _, name in self.index.find(message)]
+
+    def test_inflections_and_synonyms_match_their_theme(self):
+        self.assertEqual(self.names("Je suis harcelée par mon chef"), ["Harcèlement"])
+        self.assertEqual(self.names("complètement ÉPUISÉ"), ["Épuisement"])
+        self.assertEqual(self.names("je me sens stressé et anxieux"), ["Stress", "Anxiété"])
+        self.assertEqual(self.names("on m'a mis à l'écart de l'équipe"), ["Isolement"])
+        self.assertEqual(self.names("un burn-out"), ["Burnout"])
+
+    def test_matches_whole_words_only(self):
+        self.assertEqual(self.names("une dépression"), ["Dépression"])
+        self.assertEqual(self.names("une impression de déjà-vu"), [])
+
+    def test_lemmatize_keeps_short_words(self):
+        self.assertEqual(theme_index.lemmatize("harcelement"), "harcel")
+        self.assertEqual(theme_index.lemmatize("stress"), "stress")
+        self.assertEqual(theme_index.lemmatize("pres"), "pres")
+
+
+class StartupTests(TestCase):
+    def test_openai_is_not_imported_until_first_call(self):
+        code = (
+            "import sys, django; django.setup(); "
+            "from django.urls import get_resolver; get_resolver().url_patterns; "
+            "from django.core.management import call_command; call_command('check', verbosity=0); "
+            "assert 'openai' not in sys.modules, 'openai imported at startup'; "
+            "from chatbot import llm; assert llm.get_client() is llm.get_client()"
+        )
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": "wellbeing_chatbot.settings", "OPENAI_API_KEY": "startup-test"}
+        process = subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).resolve().parent.parent,
+                                 env=env, capture_output=True, text=True)
+        self.assertEqual(process.returncode, 0, process.stderr)
+
+
+@override_settings(CHATBOT_STATS_BUFFER={'ENABLED': False})
+class IdentityTests(TestCase):
+    def setUp(self):
+        identity._demo_employees.clear()
+
+    def test_employee_is_resolved_once_per_session(self):
+        response = self.client.get("/")
+        employee = Employee.objects.get(first_name="Utilisateur", last_name="Test")
+        self.assertEqual(response.context["employee_id"], employee.id)
+        self.assertEqual(self.client.session[identity.SESSION_KEY], employee.id)
+
+        # Page suivante : identité lue dans la session, sans rechercher l'employé
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get("/").context["employee_id"], employee.id)
+            # Nouvelle session : l'employé de démonstration est gardé en mémoire
+            self.assertEqual(self.client_class().get("/").context["employee_id"], employee.id)
+        self.assertFalse([query for query in queries if "chatbot_employee" in query["sql"]])
+
+        employee.delete()
+        self.assertNotEqual(self.client_class().get("/").context["employee_id"], employee.id)
+
+    @override_settings(CHATBOT_IDENTITY={'DEMO_EMPLOYEE': None})
+    def test_demo_employee_can_be_disabled(self):
+        response = self.client.get("/")
+        self.assertIsNone(response.context["employee_id"])
+        self.assertNotContains(response, "/employee/")
+        self.assertFalse(Employee.objects.exists())
+
+    def test_chat_uses_the_session_employee(self):
+        self.client.get("/")
+        employee = Employee.objects.get()
+        other = Employee.objects.create(first_name="Autre", last_name="Employé", birth_date="1990-01-01")
+        response = self.client.post("/chat/", {"message": "Bonjour", "employee_id": employee.id})
+        self.assertEqual(response.status_code, 200)
+        # Un autre employé que celui de la session est refusé
+        response = self.client.post("/chat/", {"message": "Bonjour", "employee_id": other.id})
+        self.assertEqual(response.status_code, 403)
+        employee.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((employee.total_words_count, other.total_words_count), (1, 0))
+
+        # Clients sans session (API) : l'employé est celui de la requête
+        self.client_class().post("/chat/", {"message": "Bonjour", "employee_id": other.id})
+        other.refresh_from_db()
+        self.assertEqual(other.total_words_count, 1)
+
+    def test_migration_creates_default_themes_in_an_empty_database(self):
+        migration = importlib.import_module("chatbot.migrations.0008_default_themes")
+        self.assertEqual(
+            [(name, description, synonyms) for name, description, synonyms in migration.DEFAULT_THEMES],
+            [(theme["name"], theme["description"], theme["synonyms"]) for theme in themes.DEFAULT_THEMES]
+        )
+        migration.create_default_themes(apps, None)
+        self.assertEqual(PsychologicalTheme.objects.count(), len(themes.DEFAULT_THEMES))
+
+        PsychologicalTheme.objects.filter(name="Mobbing").delete()
+        migration.create_default_themes(apps, None)
+        self.assertFalse(PsychologicalTheme.objects.filter(name="Mobbing").exists())
+
+
+@override_settings(CHATBOT_STATS_BUFFER={'ENABLED': False})
+class EmployeeStatsWriteTests(TestCase):
+    def setUp(self):
+        theme_index.invalidate_theme_index()
+        self.employee = Employee.objects.create(first_name="Test", last_name="Stats", birth_date="1990-01-01")
+        for name in ("Stress", "Conflit", "Pression", "Surcharge"):
+            PsychologicalTheme.objects.create(name=name)
+
+    def record(self, message, violent_words, scopeflag=False):
+        result = {"violent_words": violent_words, "scopeflag": scopeflag}
+        scan = services.scan_message(message)
+        with CaptureQueriesContext(connection) as queries:
+            services._update_employee_stats(result, message, self.employee.id, scan)
+        return result, len(queries)
+
+    def test_query_count_does_not_depend_on_words_or_themes(self):
+        _, small = self.record("Du stress", ["stress"])
+        result, large = self.record(
+            "Stress, conflit, pression et surcharge",
+            ["stress", "conflit", "pression", "surcharge", "épuisé"]
+        )
+        self.assertEqual(small, large)
+        # Savepoint, compteurs de l'employé, mots violents, compteurs de thématiques
+        # (2 requêtes), agrégats de l'employé et de l'organisation (4 tables, 2 requêtes
+        # par table, voir rollups) et libération du savepoint
+        self.assertEqual(large, 14)
+
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.total_words_count, 2 + 5)
+        self.assertEqual(self.employee.violent_words_count, 6)
+        self.assertEqual(ViolentWord.objects.filter(employee=self.employee).count(), 6)
+        self.assertEqual(
+            dict(EmployeeThemeCounter.objects.values_list("theme__name", "count")),
+            {"Stress": 2, "Conflit": 1, "Pression": 1, "Surcharge": 1}
+        )
+        self.assertEqual(result["detected_themes"], ["Stress", "Conflit", "Pression", "Surcharge"])
+
+    def test_out_of_scope_message_only_counts_words(self):
+        self.record("Du stress", ["stress"], scopeflag=True)
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.total_words_count, 2)
+        self.assertEqual(self.employee.violent_words_count, 0)
+        self.assertFalse(EmployeeThemeCounter.objects.exists())
+
+    def test_unknown_employee(self):
+        result = {"violent_words": ["stress"], "scopeflag": False}
+        services._update_employee_stats(result, "stress", 0, services.scan_message("stress"))
+        self.assertEqual(result["error"], "Employé non trouvé")
+        self.assertFalse(ViolentWord.objects.exists())
+
+
+@override_settings(CHATBOT_STATS_BUFFER={'ENABLED': False})
+class RollupTests(TestCase):
+    def setUp(self):
+        theme_index.invalidate_theme_index()
+        self.employee = Employee.objects.create(first_name="Test", last_name="Rollup", birth_date="1990-01-01")
+        PsychologicalTheme.objects.create(name="Stress")
+
+    def test_stats_json_serves_trends_from_rollups(self):
+        services.record_employee_stats(self.employee.id, 4, ["stress"], [])
+        services.write_employee_stats(
+            self.employee.id, 10, [("épuisé", timezone.now() - timedelta(days=8))],
+            {PsychologicalTheme.objects.get().id: 2}, messages=3
+        )
+        today = timezone.localdate()
+
+        with self.assertNumQueries(3):
+            response = self.client.get(f"/employee/{self.employee.id}/stats.json", {
+                "period": "day",
+                "start": (today - timedelta(days=9)).isoformat(),
+                "end": today.isoformat()
+            })
+        trends = response.json()
+        self.assertEqual(len(trends["series"]), 10)
+        self.assertEqual(trends["totals"]["messages"], 4)
+        self.assertEqual(trends["totals"]["total_words"], 14)
+        self.assertEqual(trends["totals"]["violent_words"], 2)
+        self.assertEqual(trends["totals"]["themes"], {"Stress": 2})
+        self.assertEqual(trends["series"][1]["violent_words"], 1)
+        self.assertEqual(trends["series"][-1]["violent_words"], 1)
+
+        weekly = self.client.get(f"/employee/{self.employee.id}/stats.json", {"period": "week"}).json()
+        self.assertEqual(sum(point["messages"] for point in weekly["series"]), 4)
+
+    def test_invalid_range(self):
+        response = self.client.get(f"/employee/{self.employee.id}/stats.json", {"start": "2020-01-01", "end": "2026-01-01"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get("/employee/0/stats.json").status_code, 404)
+
+    def test_rebuild_recomputes_violent_words_from_raw_rows(self):
+        services.record_employee_stats(self.employee.id, 5, ["stress", "peur"], [])
+        EmployeeStatsRollup.objects.update(violent_words_count=99)
+
+        out = StringIO()
+        call_command("rebuild_rollups", stdout=out)
+        self.assertIn("Rebuilt 4 rollup rows", out.getvalue())
+
+        self.assertEqual(
+            set(EmployeeStatsRollup.objects.values_list("period", "violent_words_count", "total_words_count")),
+            {("day", 2, 5), ("week", 2, 5)}
+        )
+
+
+@override_settings(CHATBOT_STATS_BUFFER={'ENABLED': False})
+class DashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.themes = {name: PsychologicalTheme.objects.create(name=name).id for name in ("Stress", "Conflit")}
+        self.employees = [
+            Employee.objects.create(first_name="Test", last_name=f"Dashboard {i}", birth_date="1990-01-01")
+            for i in range(2)
+        ]
+
+    def write(self, employee, words, violent_words, themes):
+        with self.captureOnCommitCallbacks(execute=True):
+            services.record_employee_stats(employee.id, words, violent_words, [self.themes[name] for name in themes])
+
+    def test_aggregates_all_employees_and_is_invalidated_by_writes(self):
+        self.write(self.employees[0], 10, ["stress"], ["Stress"])
+        self.write(self.employees[1], 10, ["conflit", "peur"], ["Stress", "Conflit"])
+
+        data = self.client.get("/dashboard.json", {"period": "day"}).json()
+        self.assertEqual(data["employees"]["count"], 2)
+        self.assertEqual(data["employees"]["violent_words_ratio"], 0.15)
+        self.assertEqual(data["series"][-1]["violent_words"], 3)
+        heatmap = {theme["name"]: theme["counts"][-1] for theme in data["heatmap"]["themes"]}
+        self.assertEqual(heatmap, {"Conflit": 1, "Stress": 2})
+        self.assertEqual(data["themes"][0], {"name": "Stress", "occurrences": 2, "employees": 2})
+
+        with self.assertNumQueries(0):
+            self.client.get("/dashboard.json", {"period": "day"})
+
+        self.write(self.employees[0], 5, [], ["Conflit"])
+        data = self.client.get("/dashboard.json", {"period": "day"}).json()
+        self.assertEqual(data["series"][-1]["total_words"], 25)
+
+    def test_html_dashboard(self):
+        self.write(self.employees[0], 10, ["stress"], ["Stress"])
+        response = self.client.get("/dashboard/")
+        self.assertContains(response, "Tableau de bord de l'organisation")
+        self.assertContains(response, "rgba(231, 76, 60, 1.0)")
+        self.assertEqual(self.client.get("/dashboard/", {"period": "month"}).status_code, 400)
+
+
+class QueryPlanTests(TestCase):
+    def setUp(self):
+        self.employee = Employee.objects.create(first_name="Test", last_name="Plan", birth_date="1990-01-01")
+        ViolentWord.objects.bulk_create([ViolentWord(employee=self.employee, word=f"mot {i}") for i in range(50)])
+
+    def assertIndexedQueries(self, run, tables):
+        with CaptureQueriesContext(connection) as queries:
+            run()
+        self.assertEqual(plan_problems(connection, queries.captured_queries, tables), [])
+
+    def test_pages_use_indexes(self):
+        self.assertIndexedQueries(lambda: self.client.get("/"), ["chatbot_employee"])
+        self.assertIndexedQueries(
+            lambda: self.client.get(f"/employee/{self.employee.id}/"),
+            ["chatbot_violentword", "chatbot_employeethemecounter", "chatbot_employeestatsrollup"]
+        )
+
+    def test_reset_deletes_by_primary_key_ranges(self):
+        self.assertIndexedQueries(
+            lambda: call_command("reset_violent_stats", "--batch-size", "20", stdout=StringIO()),
+            ["chatbot_violentword"]
+        )
+        self.assertFalse(ViolentWord.objects.exists())
+
+
+@override_settings(CHATBOT_STATS_BUFFER={'ENABLED': False})
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.employee = Employee.objects.create(first_name="Test", last_name="Retention", birth_date="1990-01-01")
+        now = timezone.now()
+        services.write_employee_stats(self.employee.id, 10, [
+            ("colère", now - timedelta(days=40)), ("rage", now - timedelta(days=40)),
+            ("peur", now - timedelta(days=41)), ("stress", now)
+        ], {})
+
+    def archive(self, *args):
+        out = StringIO()
+        call_command("archive_violent_words", "--days", "30", "--batch-size", "2",
+                     "--archive-dir", self.directory.name, *args, stdout=out)
+        return out.getvalue()
+
+    def organisation_violent_words(self):
+        return sum(OrganisationStatsRollup.objects.filter(period="day").values_list("violent_words_count", flat=True))
+
+    def test_archives_old_words_in_batches_and_keeps_rollups(self):
+        self.assertIn("Archived and deleted 3 violent words", self.archive())
+
+        self.assertEqual(list(ViolentWord.objects.values_list("word", flat=True)), ["stress"])
+        archived = list(retention.read_partitions(self.directory.name))
+        self.assertEqual(sorted(row["word"] for row in archived), ["colère", "peur", "rage"])
+        self.assertEqual({row["employee_id"] for row in archived}, {self.employee.id})
+        self.assertEqual(sum(ViolentWordArchive.objects.values_list("rows", flat=True)), 3)
+        self.assertEqual(self.organisation_violent_words(), 4)
+
+        # Les périodes archivées ne sont pas remises à zéro par le recalcul
+        call_command("rebuild_rollups", stdout=StringIO())
+        self.assertEqual(self.organisation_violent_words(), 4)
+
+        self.archive()
+        self.assertEqual(len(list(retention.read_partitions(self.directory.name))), 3)
+
+    def test_delete_only(self):
+        self.archive("--no-export")
+        self.assertEqual(ViolentWord.objects.count(), 1)
+        self.assertEqual(list(Path(self.directory.name).iterdir()), [])
+
+
+@override_settings(CHATBOT_ANALYTICS={**settings.CHATBOT_ANALYTICS, 'PSEUDONYM_KEY': "clé de test"})
+class AnalyticsTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.alice, self.bob, self.carol = (
+            Employee.objects.create(first_name=name, last_name="Analytics", birth_date="1990-01-01",
+                                    total_words_count=total, violent_words_count=violent)
+            for name, total, violent in (("Alice", 100, 2), ("Bob", 50, 1), ("Carol", 0, 0))
+        )
+        stress, conflict, pressure = (
+            PsychologicalTheme.objects.create(name=name) for name in ("Stress", "Conflit", "Pression")
+        )
+        for employee, theme in ((self.alice, stress), (self.alice, conflict), (self.bob, stress),
+                                (self.bob, conflict), (self.bob, pressure)):
+            EmployeeThemeCounter.objects.create(employee=employee, theme=theme, count=1)
+        now = timezone.now()
+        ViolentWord.objects.bulk_create([
+            ViolentWord(employee=self.alice, word="rage", timestamp=now - timedelta(days=2)),
+            ViolentWord(employee=self.alice, word="colère", timestamp=now),
+            ViolentWord(employee=self.bob, word="rage", timestamp=now),
+        ])
+
+    def export(self, *args):
+        out = StringIO()
+        call_command("export_analytics", "--dir", self.directory.name, "--batch-size", "2", *args, stdout=out)
+        return out.getvalue()
+
+    def test_export_is_pseudonymized_and_append_only(self):
+        summary = analytics.export_analytics(self.directory.name, batch_size=2)
+        self.assertEqual((summary["events"], summary["files"]), (3, 3))
+        pseudonymize = analytics.Pseudonymizer()
+        self.assertEqual(pseudonymize(self.alice.id), analytics.Pseudonymizer()(self.alice.id))
+        self.assertNotEqual(pseudonymize(self.alice.id), analytics.Pseudonymizer("autre clé")(self.alice.id))
+
+        ViolentWord.objects.create(employee=self.bob, word="haine")
+        self.assertEqual(analytics.export_analytics(self.directory.name)["events"], 1)
+
+        store = analytics.AnalyticsStore(self.directory.name)
+        with self.assertNumQueries(0):
+            by_employee = store.violent_words_by_employee()
+            today = store.violent_words_by_employee(start=timezone.localdate())
+        self.assertEqual(by_employee, {pseudonymize(self.alice.id): 2, pseudonymize(self.bob.id): 2})
+        self.assertNotIn(self.alice.id, by_employee)
+        self.assertEqual(sum(today.values()), 3)
+        self.assertEqual(store.word_frequencies(limit=1), [("rage", 2)])
+
+    def test_aggregates_read_the_latest_snapshot(self):
+        self.export()
+        Employee.objects.filter(id=self.carol.id).update(total_words_count=10, violent_words_count=1)
+        EmployeeThemeCounter.objects.create(
+            employee=self.carol, theme=PsychologicalTheme.objects.get(name="Stress"), count=2
+        )
+        output = self.export("--report")
+        self.assertIn("Violent word ratio over 3 employees", output)
+
+        store = analytics.AnalyticsStore(self.directory.name)
+        with self.assertNumQueries(0):
+            ratios = store.ratio_distribution(bins=5, upper=0.1)
+            pairs = store.theme_cooccurrence()
+        self.assertEqual(ratios["employees"], 3)
+        self.assertEqual(ratios["mean"], round((0.02 + 0.02 + 0.1) / 3, 4))
+        self.assertEqual([row["employees"] for row in ratios["histogram"]], [0, 2, 0, 0, 1])
+        self.assertEqual(pairs[0], ("Stress", "Conflit", 2))
+        self.assertEqual(len(pairs), 3)
+
+    def test_missing_directory(self):
+        with override_settings(CHATBOT_ANALYTICS={'DIR': None}), self.assertRaises(ValueError):
+            analytics.export_analytics()
+
+    def test_pseudonym_key_is_required(self):
+        with override_settings(CHATBOT_ANALYTICS={'PSEUDONYM_KEY': None}):
+            with self.assertRaises(ImproperlyConfigured):
+                analytics.Pseudonymizer()
+            with self.assertRaisesMessage(CommandError, "PSEUDONYM_KEY"):
+                self.export()
+        self.assertEqual(list(Path(self.directory.name).iterdir()), [])
+
+
+class DatabaseProfileTests(TestCase):
+    def production_connection(self, name):
+        """Connexion configurée avec le profil SQLite de production"""
+        return DatabaseWrapper({**connection.settings_dict, **settings.CHATBOT_SQLITE_PRODUCTION, "NAME": name})
+
+    def test_new_connections_use_wal_and_wait_for_locks(self):
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = self.production_connection(os.path.join(directory, "db.sqlite3"))
+            conn = wrapper.get_new_connection(wrapper.get_connection_params())
+            try:
+                self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+                self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)
+                self.assertEqual(conn.execute("PRAGMA busy_timeout").fetchone()[0], 20000)
+            finally:
+                conn.close()
+
+    def test_transactions_take_the_write_lock_immediately(self):
+        wrapper = self.production_connection(":memory:")
+        wrapper.get_connection_params()
+        self.assertEqual(wrapper.transaction_mode, "IMMEDIATE")
+
+    def test_connections_are_not_persistent(self):
+        # Vues asynchrones servies en ASGI : pas de connexions persistantes
+        self.assertEqual(settings.DATABASES["default"]["CONN_MAX_AGE"], 0)
+
+
+class StatsBufferTests(TestCase):
+    def setUp(self):
+        self.employee = Employee.objects.create(first_name="Test", last_name="Buffer", birth_date="1990-01-01")
+        self.stress = PsychologicalTheme.objects.create(name="Stress")
+        self.conflict = PsychologicalTheme.objects.create(name="Conflit")
+
+    def test_coalesces_messages_until_flush(self):
+        buffer = StatsBuffer(max_pending=100)
+        buffer.add(self.employee.id, 4, ["stress"], [self.stress.id])
+        buffer.add(self.employee.id, 6, ["stress", "conflit"], [self.stress.id, self.conflict.id])
+        buffer.add(self.employee.id, 3, [], [])
+
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.total_words_count, 0)
+        self.assertEqual(buffer.pending_messages, 3)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(buffer.flush(), 3)
+        # Une écriture groupée pour les trois messages (savepoints compris)
+        self.assertLessEqual(len(queries), 16)
+
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.total_words_count, 13)
+        self.assertEqual(self.employee.violent_words_count, 3)
+        self.assertEqual(ViolentWord.objects.filter(employee=self.employee).count(), 3)
+        self.assertEqual(
+            dict(EmployeeThemeCounter.objects.values_list("theme__name", "count")),
+            {"Stress": 2, "Conflit": 1}
+        )
+        self.assertEqual(buffer.flush(), 0)
+
+    def test_unknown_employee_is_dropped(self):
+        buffer = StatsBuffer()
+        buffer.add(0, 4, ["stress"], [self.stress.id])
+        buffer.add(self.employee.id, 2, [], [])
+        self.assertEqual(buffer.flush(), 2)
+        self.assertFalse(ViolentWord.objects.exists())
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.total_words_count, 2)
+
+    def test_failing_employee_is_retried_alone_then_dropped(self):
+        other = Employee.objects.create(first_name="Autre", last_name="Buffer", birth_date="1990-01-01")
+        write_employee_stats = services.write_employee_stats
+
+        def write(employee_id, *args):
+            if employee_id == other.id:
+                raise IntegrityError("bad row")
+            return write_employee_stats(employee_id, *args)
+
+        buffer = StatsBuffer(max_failures=2)
+        with mock.patch.object(services, "write_employee_stats", write):
+            buffer.add(self.employee.id, 4, [], [])
+            buffer.add(other.id, 5, [], [])
+            # L'autre employé n'empêche pas l'écriture du premier
+            self.assertEqual(buffer.flush(), 1)
+            self.assertEqual(buffer.pending_messages, 1)
+            buffer.add(other.id, 1, [], [])
+            # Deuxième échec : ses statistiques sont abandonnées
+            self.assertEqual(buffer.flush(), 0)
+            self.assertEqual(buffer.pending_messages, 0)
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.total_words_count, 4)
+
+    def test_flush_command_does_not_start_a_writer_thread(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch("chatbot.stats_buffer._buffer", None), \
+                override_settings(CHATBOT_STATS_BUFFER={'ENABLED': True, 'TRIGGER_FILE': Path(directory) / "flush"}):
+            out = StringIO()
+            call_command("flush_stats", stdout=out)
+            self.assertIsNone(stats_buffer._buffer._thread)
+        self.assertIn("flushed 0 pending messages", out.getvalue())
+
+
+class CompletionCacheTests(TestCase):
+    def test_near_identical_messages_share_a_key(self):
+        prompts = completion_cache.prompt_hash("a", "b")
+        self.assertEqual(
+            completion_cache.make_key("Je suis stressé !", prompts),
+            completion_cache.make_key("  je suis STRESSE", prompts)
+        )
+        self.assertNotEqual(
+            completion_cache.make_key("je suis stressé", prompts),
+            completion_cache.make_key("je suis stressé", completion_cache.prompt_hash("a", "c"))
+        )
+
+    def check_backend(self, cache):
+        cache.set("a", "1")
+        cache.set("b", "2")
+        self.assertEqual(cache.get("a"), "1")
+        # "b" est l'entrée la moins récemment utilisée
+        cache.set("c", "3")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), "3")
+        self.assertEqual(cache.stats(), {"hits": 2, "misses": 1, "hit_ratio": 0.6667, "size": 2})
+
+        with mock.patch("chatbot.completion_cache.time.time", return_value=time.time() + 120):
+            self.assertIsNone(cache.get("a"))
+
+    def test_memory_backend(self):
+        self.check_backend(completion_cache.MemoryCompletionCache(max_entries=2, ttl=60))
+
+    def test_sqlite_backend(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.check_backend(completion_cache.SQLiteCompletionCache(Path(directory) / "cache.sqlite3", max_entries=2, ttl=60))
+
+
+class PromptTests(SimpleTestCase):
+    def test_version_comes_from_settings(self):
+        self.assertEqual(prompts.get_prompts().version, "v1")
+        with override_settings(CHATBOT_PROMPTS={'VERSION': 'v2'}):
+            self.assertEqual(prompts.get_prompts().version, "v2")
+            self.assertNotEqual(prompts.get_prompts().analysis_hash, prompts.get_prompts("v1").analysis_hash)
+        with self.assertRaises(ValueError):
+            prompts.get_prompts("v0")
+
+    def test_instructions_are_a_shared_prefix(self):
+        history = [{"role": "user", "content": "bonjour"}, {"role": "assistant", "content": "Bonjour !"}]
+        analysis = prompts.analysis_messages("je suis stressé", history)
+        reply = prompts.reply_messages("je suis stressé", history)
+        self.assertEqual(analysis[0]["role"], "system")
+        self.assertTrue(analysis[0]["content"].startswith(reply[0]["content"]))
+        self.assertEqual(analysis[1:], reply[1:])
+        self.assertEqual(analysis[-1], {"role": "user", "content": "je suis stressé"})
+
+    def test_token_report(self):
+        messages = prompts.analysis_messages("je suis stressé", [{"role": "user", "content": "bonjour"}])
+        report = prompts.token_report(messages)
+        self.assertEqual(report["total"], report["instructions"] + report["history"] + report["message"])
+        self.assertGreater(report["history"], 0)
+        compact = prompts.token_report(prompts.analysis_messages("je suis stressé", prompts=prompts.get_prompts("v2")))
+        self.assertLess(compact["instructions"], report["instructions"])
+
+    def test_tokens_are_counted(self):
+        before = metrics.PROMPT_TOKENS.value("instructions")
+        messages = prompts.violent_words_messages("je vais tout casser")
+        self.assertEqual(
+            metrics.PROMPT_TOKENS.value("instructions") - before, prompts.token_report(messages)["instructions"]
+        )
+
+
+@override_settings(CHATBOT_STATS_BUFFER={'ENABLED': False})
+class CachedChatTests(FakeOpenAITestCase):
+    async def test_repeated_message_is_served_from_cache_and_still_counted(self):
+        employee = await Employee.objects.acreate(first_name="Test", last_name="Cache", birth_date="1990-01-01")
+        calls = self.server.request_count
+
+        first = await services.analyze_message_async("Je suis stressé", employee.id)
+        second = await services.analyze_message_async("je suis stresse !", employee.id)
+        bypass = await services.analyze_message_async("Je suis stressé", employee.id, use_cache=False)
+
+        self.assertEqual(self.server.request_count - calls, 2)
+        self.assertEqual([first["cached"], second["cached"], bypass["cached"]], [False, True, False])
+        self.assertEqual(second["response"], first["response"])
+
+        await employee.arefresh_from_db()
+        self.assertEqual(employee.total_words_count, 9)
+        self.assertEqual(employee.violent_words_count, 3)
+
+
+class FastPathTests(FakeOpenAITestCase):
+    async def analyze(self, message):
+        calls = self.server.request_count
+        result = await services.analyze_message_async(message)
+        return result, self.server.request_count - calls
+
+    @override_settings(CHATBOT_FAST_PATH={'ENABLED': True})
+    async def test_politeness_is_answered_locally(self):
+        for message, route in (("Bonjour !", "greeting"), ("merci beaucoup", "thanks"), ("Au revoir.", "goodbye")):
+            result, calls = await self.analyze(message)
+            self.assertEqual((result["route"], calls), (route, 0))
+            self.assertEqual(result["response"], services.POLITENESS_RESPONSES[route])
+
+    @override_settings(CHATBOT_FAST_PATH={'ENABLED': True})
+    async def test_clear_sensitive_topic_uses_topic_template(self):
+        # Réponse locale ; les mots violents restent demandés au modèle (appel court)
+        with mock.patch.object(self.server, "text_content", "harcelé"):
+            result, calls = await self.analyze("Je suis harcelé par mon chef")
+        self.assertEqual((result["route"], calls), ("sensitive_topic", 1))
+        self.assertEqual(result["response"], services.get_appropriate_response_for_topic("harassment"))
+        self.assertEqual(result["violent_words"], ["harcelé"])
+
+    @override_settings(CHATBOT_FAST_PATH={'ENABLED': True})
+    async def test_failed_analysis_keeps_the_local_reply_without_stats(self):
+        employee = await Employee.objects.acreate(first_name="Test", last_name="Local", birth_date="1990-01-01")
+        self.server.fail_next(1, status=400)
+        result = await services.analyze_message_async("Je suis harcelé par mon chef", employee.id)
+        self.assertEqual(result["response"], services.get_appropriate_response_for_topic("harassment"))
+        self.assertTrue(result["analysis_unavailable"])
+        await employee.arefresh_from_db()
+        self.assertEqual(employee.total_words_count, 0)
+
+    @override_settings(CHATBOT_FAST_PATH={'ENABLED': True})
+    async def test_topics_match_whole_words_only(self):
+        for message in ("J'ai l'impression que le projet avance bien", "Je traverse une dépression"):
+            with self.subTest(message=message):
+                result, calls = await self.analyze(message)
+                self.assertEqual((result["route"], calls), ("llm", 1))
+        result, _ = await self.analyze("Trop de pression au bureau")
+        self.assertEqual(result["route"], "sensitive_topic")
+        self.assertEqual(result["response"], services.get_appropriate_response_for_topic("stress"))
+
+    @override_settings(CHATBOT_FAST_PATH={'ENABLED': True})
+    async def test_ambiguous_messages_escalate_to_llm(self):
+        for message in ("Je ne suis pas stressé", "Que faire face au harcèlement ?", "Bonjour, j'ai une question sur mon contrat"):
+            result, calls = await self.analyze(message)
+            self.assertEqual((result["route"], calls), ("llm", 1))
+
+
+FIXTURES = Path(__file__).resolve().parent.parent / "benchmarks" / "fixtures"
+
+
+class LocalAnalysisBackendTests(FakeOpenAITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with open(FIXTURES / "labelled_messages.jsonl", encoding="utf-8") as fixture:
+            examples = [json.loads(line) for line in fixture]
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.model_path = Path(cls.directory.name) / "model.json"
+        cls.model_path.write_text(json.dumps(analysis_backends.train_model(examples)), encoding="utf-8")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        backend = analysis_backends.LexiconAnalysisBackend(self.model_path)
+        patcher = mock.patch.object(analysis_backends, "_backend", backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_detects_violent_expressions_and_scope_offline(self):
+        backend = analysis_backends.get_analysis_backend()
+        analysis = backend.analyze("Hier, mon responsable m'a humilié et j'ai eu des crises d'angoisse.")
+        self.assertEqual(analysis, {"violent_words": ["humilié", "crises d'angoisse"], "scopeflag": False})
+        self.assertTrue(backend.analyze("Une recette de gâteau pour mes vacances ?")["scopeflag"])
+
+    async def test_llm_is_only_asked_for_the_reply(self):
+        calls = self.server.request_count
+        result = await services.analyze_message_async("Je me sens inutile et épuisé au bureau", use_cache=False)
+        self.assertEqual(self.server.request_count - calls, 1)
+        self.assertEqual(result["response"], self.server.text_content)
+        self.assertEqual(result["violent_words"], ["inutile", "épuisé"])
+        self.assertFalse(result["scopeflag"])
+
+    @override_settings(CHATBOT_FAST_PATH={'ENABLED': True, 'ROUTE_SENSITIVE': True})
+    def test_sensitive_message_served_locally_records_its_violent_words(self):
+        employee = Employee.objects.create(first_name="Test", last_name="Local", birth_date="1990-01-01")
+        with open(FIXTURES / "labelled_messages.jsonl", encoding="utf-8") as fixture:
+            labels = {example["message"]: example["violent_words"] for example in map(json.loads, fixture)}
+        calls = self.server.request_count
+        for message in ("Mon manager me harcèle tous les jours devant l'équipe.",
+                        "Je suis épuisé et j'ai peur de perdre mon poste."):
+            result = services.analyze_message(message, employee.id)
+            self.assertEqual(result["route"], "sensitive_topic")
+            self.assertEqual(result["violent_words"], labels[message])
+        self.assertEqual(self.server.request_count, calls)
+        self.assertEqual(
+            sorted(ViolentWord.objects.filter(employee=employee).values_list("word", flat=True)),
+            ["harcèle", "peur", "épuisé"]
+        )
+
+    async def test_streamed_reply_failure_falls_back_to_template(self):
+        self.server.fail_next(1, status=400)
+        events = [event async for event in services.stream_message_async("Je me sens inutile au bureau", use_cache=False)]
+        self.assertEqual(events[0], ("token", {"text": services.get_appropriate_response_for_topic("")}))
+        kind, result = events[-1]
+        self.assertEqual(kind, "done")
+        self.assertTrue(result["partial"])
+        self.assertEqual(result["timed_out"], ["reply"])
+
+
+def slow_analysis(payload):
+    """Latence du serveur factice : appel combiné lent, réponse seule rapide"""
+    return 1.0 if is_json_request(payload) else 0.02
+
+
+GATEWAY = {**llm.DEFAULTS, 'RETRY_BASE_DELAY': 0.01, 'FAILURE_THRESHOLD': 2, 'RESET_TIMEOUT': 60.0}
+TEMPLATE = services.get_appropriate_response_for_topic("")
+
+
+@override_settings(CHATBOT_LLM_GATEWAY=GATEWAY, CHATBOT_FAST_PATH={'ENABLED': False})
+class LLMGatewayTests(FakeOpenAITestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+
+    @override_settings(CHATBOT_LLM_GATEWAY={**GATEWAY, 'FAILURE_THRESHOLD': 5})
+    def test_transient_errors_are_retried(self):
+        calls = self.server.request_count
+        self.server.fail_next(1, status=500)
+        self.server.fail_next(1, status=429, retry_after=0.01)
+
+        content = llm.get_gateway().complete([{"role": "user", "content": "Bonjour"}], model="gpt-3.5-turbo")
+
+        self.assertEqual(content, self.server.text_content)
+        self.assertEqual(self.server.request_count - calls, 3)
+        self.assertEqual(metrics.LLM_RETRIES.value(), 2)
+        self.assertEqual(llm.get_gateway().breaker.state, "closed")
+
+    def test_open_circuit_answers_with_templates_without_calling_the_api(self):
+        # Deux essais de l'appel combiné en échec : le circuit s'ouvre (FAILURE_THRESHOLD = 2)
+        self.server.fail_next(2, status=503)
+        result = services.analyze_message("Mon collègue m'ignore en réunion", use_cache=False)
+        # Appel combiné et réponse de secours en échec : réponse modèle, sans erreur 500
+        self.assertEqual(result["response"], TEMPLATE)
+        self.assertEqual(llm.get_gateway().breaker.state, "open")
+
+        calls = self.server.request_count
+        response = self.client.post("/chat/", {"message": "Mon collègue m'ignore", "cache": "0"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["response"], TEMPLATE)
+        self.assertEqual(self.server.request_count, calls)
+        self.assertGreater(metrics.LLM_REJECTED.value("circuit_open"), 0)
+
+        # Après RESET_TIMEOUT, un appel d'essai réussi referme le circuit
+        with mock.patch.object(llm.get_gateway().breaker, "clock", lambda: time.monotonic() + 61):
+            result = services.analyze_message("Mon collègue m'ignore toujours", use_cache=False)
+        self.assertEqual(result["response"], self.server.json_content["response"])
+        self.assertEqual(llm.get_gateway().breaker.state, "closed")
+
+    async def test_streamed_reply_falls_back_to_template(self):
+        self.server.fail_next(2, status=503)
+        response = await AsyncClient().post("/chat/", {"message": "Mon collègue m'ignore", "stream": "1", "cache": "0"})
+        body = b"".join([chunk async for chunk in response.streaming_content]).decode("utf-8")
+        self.assertIn("event: done", body)
+        self.assertIn(json.dumps(TEMPLATE)[1:-1], body)
+
+    async def test_identical_in_flight_prompts_are_coalesced(self):
+        gateway = llm.get_gateway()
+        messages = [{"role": "user", "content": "Message identique"}]
+        calls = self.server.request_count
+        with mock.patch.object(self.server, "latency", 0.1):
+            contents = await asyncio.gather(*[gateway.acomplete(messages, model="gpt-3.5-turbo") for _ in range(5)])
+        self.assertEqual(contents, [self.server.text_content] * 5)
+        self.assertEqual(self.server.request_count - calls, 1)
+        self.assertEqual(metrics.LLM_COALESCED.value(), 4)
+
+    async def test_abandoned_stream_releases_the_trial_call(self):
+        gateway = llm.get_gateway()
+        gateway.breaker.opened_at = gateway.breaker.clock() - gateway.breaker.reset_timeout
+        messages = [{"role": "user", "content": "Bonjour"}]
+
+        # Client déconnecté après le premier fragment : le générateur est fermé
+        stream = gateway.astream(messages, model="gpt-3.5-turbo")
+        self.assertTrue(await stream.__anext__())
+        await stream.aclose()
+        self.assertEqual(gateway.breaker.state, "half_open")
+
+        # Tâche annulée pendant l'ouverture du flux
+        with mock.patch.object(self.server, "latency", 0.5):
+            task = asyncio.ensure_future(anext(gateway.astream(messages, model="gpt-3.5-turbo")))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        # L'essai n'est pas resté pris : l'appel suivant passe et referme le circuit
+        self.assertEqual(await gateway.acomplete(messages, model="gpt-3.5-turbo"), self.server.text_content)
+        self.assertEqual(gateway.breaker.state, "closed")
+
+    def test_token_bucket_spaces_calls_and_rejects_long_waits(self):
+        now = [0.0]
+        bucket = llm.TokenBucket(rate=10, burst=2, clock=lambda: now[0])
+        self.assertEqual([bucket.reserve(1.0), bucket.reserve(1.0)], [0.0, 0.0])
+        self.assertAlmostEqual(bucket.reserve(1.0), 0.1)
+        with self.assertRaises(llm.RateLimitedError):
+            bucket.reserve(0.15)
+        now[0] = 1.0
+        self.assertEqual(bucket.reserve(0.0), 0.0)
+
+
+@override_settings(CHATBOT_PIPELINE={'HEDGE_DELAY': 0.05, 'REPLY_TIMEOUT': 0.5, 'ANALYSIS_TIMEOUT': 0.3})
+class PipelineTests(FakeOpenAITestCase):
+    server_options = {"latency": slow_analysis}
+
+    async def test_fast_combined_call_is_not_hedged(self):
+        calls = self.server.request_count
+        with mock.patch.object(self.server, "latency", 0), override_settings(CHATBOT_PIPELINE={'HEDGE_DELAY': 2.0}):
+            result = await services.analyze_message_async("Je suis stressé au travail", use_cache=False)
+        self.assertEqual(self.server.request_count - calls, 1)
+        self.assertFalse(result["partial"])
+        self.assertEqual(result["violent_words"], ["stress"])
+
+    async def test_slow_analysis_returns_hedged_reply_at_deadline(self):
+        employee = await Employee.objects.acreate(first_name="Test", last_name="Partiel", birth_date="1990-01-01")
+        start = time.perf_counter()
+        result = await services.analyze_message_async("Je suis stressé au travail", employee.id, use_cache=False)
+        elapsed = time.perf_counter() - start
+
+        self.assertLess(elapsed, 0.8)
+        self.assertTrue(result["partial"])
+        self.assertEqual(result["timed_out"], ["analysis"])
+        self.assertEqual(result["response"], self.server.text_content)
+        # À défaut d'analyse du modèle, les termes du scan local ne sont pas comptés comme violents
+        self.assertEqual(result["violent_words"], [])
+        # et les mots du message ne diluent pas le ratio de l'employé
+        self.assertTrue(result["analysis_unavailable"])
+        await employee.arefresh_from_db()
+        self.assertEqual(employee.total_words_count, 0)
+
+    async def test_invalid_analysis_is_raced_immediately(self):
+        pipeline = {'HEDGE_DELAY': 5.0, 'REPLY_TIMEOUT': 5.0, 'ANALYSIS_TIMEOUT': 5.0}
+        with mock.patch.multiple(self.server, latency=0, json_content="pas un objet"), \
+                override_settings(CHATBOT_PIPELINE=pipeline):
+            start = time.perf_counter()
+            result = await services.analyze_message_async("Mon collègue m'ignore", use_cache=False)
+            elapsed = time.perf_counter() - start
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(result["response"], self.server.text_content)
+        self.assertIn("error", result)
+
+    async def test_template_response_when_no_completion_before_deadline(self):
+        with mock.patch.object(self.server, "latency", 1.0):
+            start = time.perf_counter()
+            result = await services.analyze_message_async("Je suis stressé au travail", use_cache=False)
+            elapsed = time.perf_counter() - start
+        self.assertLess(elapsed, 0.9)
+        self.assertEqual(result["timed_out"], ["reply", "analysis"])
+        self.assertEqual(result["response"], services.get_appropriate_response_for_topic(""))
+
+
+class BatchTests(FakeOpenAITestCase):
+    def write_jsonl(self, items):
+        path = Path(tempfile.mkdtemp()) / "messages.jsonl"
+        path.write_text("".join(json.dumps(item) + "\n" for item in items), encoding="utf-8")
+        return path
+
+    async def test_endpoint_streams_results_and_writes_stats_on_request(self):
+        employee = await Employee.objects.acreate(first_name="Test", last_name="Batch", birth_date="1990-01-01")
+        body = "\n".join([
+            json.dumps({"id": "a", "message": "Je suis stressé au travail", "employee_id": employee.id}),
+            "pas du json",
+            json.dumps({"request_id": "user-001", "title": "Titre", "body": "Mon manager me met la pression"}),
+        ])
+        response = await AsyncClient().post("/chat/batch/", body, content_type="application/x-ndjson")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = [json.loads(line) async for line in response.streaming_content]
+
+        self.assertEqual([entry["line"] for entry in lines], [1, 2, 3])
+        self.assertEqual(lines[0]["result"]["violent_words"], ["stress"])
+        self.assertIn("error", lines[1])
+        self.assertEqual(lines[2]["id"], "user-001")
+        # Ré-analyse : les compteurs déjà enregistrés ne sont pas incrémentés
+        await employee.arefresh_from_db()
+        self.assertEqual(employee.total_words_count, 0)
+
+        response = await AsyncClient().post("/chat/batch/?stats=1", body, content_type="application/x-ndjson")
+        [line async for line in response.streaming_content]
+        await employee.arefresh_from_db()
+        self.assertEqual(employee.total_words_count, 5)
+        self.assertEqual(employee.violent_words_count, 1)
+
+    def test_employee_id_must_be_an_integer(self):
+        for employee_id, expected in ((3, 3), ("12", 12), (None, None), ("", None)):
+            line = json.dumps({"message": "Bonjour", "employee_id": employee_id})
+            self.assertEqual(batch.parse_line(line, 1)["employee_id"], expected)
+        for employee_id in (3.7, "3.7", "abc", True, "²", [3]):
+            with self.subTest(employee_id=employee_id), self.assertRaises(TypeError):
+                batch.parse_line(json.dumps({"message": "Bonjour", "employee_id": employee_id}), 1)
+
+    async def test_rate_limited_calls_are_retried(self):
+        self.server.fail_next(2, status=429, retry_after=0.05)
+        analyzer = batch.BatchAnalyzer(concurrency=2, max_retries=3, retry_base_delay=0.01, use_cache=False)
+        lines = [(number, json.dumps({"message": f"Message de test numéro {number}"})) for number in range(1, 5)]
+
+        entries = await analyzer.analyze_chunk(lines)
+
+        self.assertTrue(all("result" in entry for entry in entries))
+        self.assertEqual(analyzer.retries, 2)
+        self.assertEqual(analyzer.processed, 4)
+
+    def test_command_resumes_from_checkpoint(self):
+        path = self.write_jsonl([{"message": f"Message de test numéro {number}"} for number in range(5)])
+        checkpoint = Path(f"{path}.checkpoint")
+        output = path.with_name("results.jsonl")
+        checkpoint.write_text(json.dumps({"lines": 3, "processed": 3, "failed": 0}))
+
+        calls = self.server.request_count
+        out = StringIO()
+        call_command("analyze_messages", str(path), "--output", str(output), "--chunk-size", "1",
+                     "--no-cache", stdout=out)
+        self.assertIn("Resuming after line 3", out.getvalue())
+
+        self.assertEqual(self.server.request_count - calls, 2)
+        self.assertEqual([json.loads(line)["line"] for line in output.read_text().splitlines()], [4, 5])
+        self.assertEqual(json.loads(checkpoint.read_text()), {"lines": 5, "processed": 5, "failed": 0})
+
+
+class ConversationTests(FakeOpenAITestCase):
+    memory = {'TOKEN_BUDGET': 60, 'SUMMARY_MAX_TOKENS': 20, 'SUMMARY_TRIGGER_TOKENS': 10_000, 'MAX_MESSAGES': 200}
+
+    def setUp(self):
+        super().setUp()
+        self.conversation_id = Conversation.objects.create().id
+
+    def sent_history(self):
+        """Historique du dernier appel au modèle (entre le prompt système et le message)"""
+        return self.server.payloads[-1]["messages"][1:-1]
+
+    def test_estimate_tokens(self):
+        self.assertEqual(conversations.estimate_tokens("Bonjour, je suis épuisé."), 8)
+        self.assertEqual(conversations.truncate_to_tokens("Bonjour, je suis épuisé.", 4), "Bonjour, je")
+
+    async def test_history_stays_within_token_budget(self):
+        with override_settings(CHATBOT_CONVERSATION=self.memory):
+            for turn in range(8):
+                result = await services.analyze_message_async(
+                    f"Mon collègue m'ignore depuis {turn + 1} jours", conversation_id=self.conversation_id
+                )
+                history = self.sent_history()
+                if turn == 0:
+                    self.assertEqual(history, [])
+                tokens = sum(conversations.estimate_tokens(item["content"]) + conversations.MESSAGE_OVERHEAD
+                             for item in history)
+                self.assertLessEqual(tokens, self.memory['TOKEN_BUDGET'])
+
+        self.assertEqual(result["conversation_id"], self.conversation_id)
+        self.assertEqual(history[-1], {"role": "assistant", "content": self.server.text_content})
+        self.assertIn("depuis 7 jours", history[-2]["content"])
+        self.assertEqual(await Message.objects.filter(conversation_id=self.conversation_id).acount(), 16)
+
+    async def test_messages_out_of_window_are_summarized_once(self):
+        with override_settings(CHATBOT_CONVERSATION={**self.memory, 'SUMMARY_TRIGGER_TOKENS': 1}):
+            for turn in range(4):
+                await services.analyze_message_async(f"Mon collègue m'ignore ({turn})", conversation_id=self.conversation_id)
+            conversation = await Conversation.objects.aget(id=self.conversation_id)
+            self.assertGreater(conversation.summarized_until, 0)
+            self.assertEqual(conversation.summary, conversations.truncate_to_tokens(self.server.text_content, 20))
+
+            summary_calls = [payload for payload in self.server.payloads
+                             if payload["messages"][0]["content"].startswith("Vous tenez à jour le résumé")]
+            summarized = [payload["messages"][1]["content"] for payload in summary_calls]
+            # Chaque message n'est transmis qu'à un seul appel de résumé
+            self.assertEqual(sum(text.count("Employé : Mon collègue m'ignore (0)") for text in summarized), 1)
+
+            context = await sync_to_async(conversations.build_context)(self.conversation_id)
+            self.assertTrue(context["messages"][0]["content"].startswith("Résumé des échanges précédents"))
+
+    def test_older_messages_are_summarized_in_order(self):
+        for turn in range(6):
+            conversations.record_turn(self.conversation_id, f"Message {turn}", f"Réponse {turn}")
+        first_id = Message.objects.filter(conversation_id=self.conversation_id).order_by("id").first().id
+
+        with override_settings(CHATBOT_CONVERSATION={**self.memory, 'TOKEN_BUDGET': 20, 'MAX_MESSAGES': 4}):
+            context = conversations.build_context(self.conversation_id)
+            # Les messages hors de la fenêtre lue sont résumés en premier
+            self.assertEqual(context["overflow"][0]["id"], first_id)
+            self.assertEqual([item["content"] for item in context["overflow"]],
+                             ["Message 0", "Réponse 0", "Message 1", "Réponse 1"])
+            self.assertEqual(context["messages"][-1]["content"], "Réponse 5")
+
+            conversations.save_summary(context, "Résumé")
+            context = conversations.build_context(self.conversation_id)
+            self.assertEqual(context["overflow"][0]["content"], "Message 2")
+
+    def test_chat_view_starts_and_validates_conversations(self):
+        # Sans employé identifié, la mémoire des conversations n'est pas disponible
+        self.assertEqual(self.client.post("/chat/", {"message": "Bonjour", "conversation_id": "new"}).status_code, 400)
+
+        self.client.get("/")
+        response = self.client.post("/chat/", {"message": "Mon collègue m'ignore", "conversation_id": "new"})
+        conversation_id = response.json()["conversation_id"]
+        self.assertTrue(Conversation.objects.filter(id=conversation_id, employee_id=identity.demo_employee_id()).exists())
+        response = self.client.post("/chat/", {"message": "Toujours", "conversation_id": str(conversation_id)})
+        self.assertEqual(response.json()["conversation_id"], conversation_id)
+
+        self.assertEqual(self.client.post("/chat/", {"message": "Bonjour", "conversation_id": "abc"}).status_code, 400)
+        self.assertEqual(self.client.post("/chat/", {"message": "Bonjour", "conversation_id": "999999"}).status_code, 404)
+        # La conversation d'un autre employé est traitée comme inexistante
+        other = Employee.objects.create(first_name="Autre", last_name="Employé", birth_date="1990-01-01")
+        other_conversation = Conversation.objects.create(employee=other).id
+        response = self.client.post("/chat/", {"message": "Bonjour", "conversation_id": str(other_conversation)})
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Message.objects.filter(conversation_id=other_conversation).exists())
+        # Sans conversation_id : aucun historique n'est enregistré
+        self.assertNotIn("conversation_id", self.client.post("/chat/", {"message": "Bonjour"}).json())
+
+
+class StreamingChatTests(FakeOpenAITestCase):
+    server_options = {"latency": 0.05, "token_delay": 0.02, "chunk_size": 4}
+
+    async def read_events(self, response):
+        """Lit le flux SSE et retourne les événements avec leur instant de réception"""
+        events, buffer = [], ""
+        async for chunk in response.streaming_content:
+            buffer += chunk.decode("utf-8")
+            while "\n\n" in buffer:
+                raw, buffer = buffer.split("\n\n", 1)
+                lines = dict(line.split(": ", 1) for line in raw.split("\n"))
+                events.append((time.perf_counter(), lines["event"], json.loads(lines["data"])))
+        return events
+
+    async def test_tokens_arrive_before_completion_ends(self):
+        client = AsyncClient()
+        start = time.perf_counter()
+        response = await client.post("/chat/", {"message": "Je suis stressé au travail", "stream": "1"})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = await self.read_events(response)
+
+        token_events = [event for event in events if event[1] == "token"]
+        first_token_at = token_events[0][0] - start
+        done_at = events[-1][0] - start
+
+        self.assertEqual(events[-1][1], "done")
+        self.assertGreater(len(token_events), 1)
+        # Le premier token doit arriver bien avant la fin de la complétion
+        self.assertLess(first_token_at, done_at / 3)
+
+        final = events[-1][2]
+        self.assertEqual("".join(event[2]["text"] for event in token_events), final["response"])
+        self.assertEqual(final["violent_words"], ["stress"])
+        self.assertFalse(final["scopeflag"])
+
+
+class MetricsTests(FakeOpenAITestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+
+    async def test_stages_and_counters_are_exposed(self):
+        await services.analyze_message_async("Je suis stressé au travail")
+        await services.analyze_message_async("je suis stresse au travail !")
+        with mock.patch.object(self.server, "json_content", "pas un objet"):
+            partial = await services.analyze_message_async("Mon collègue m'ignore", use_cache=False)
+        self.assertTrue(partial["partial"])
+
+        self.assertEqual(metrics.STAGE_SECONDS.count("keyword_scan"), 3)
+        self.assertEqual(metrics.STAGE_SECONDS.count("llm_analysis"), 2)
+        # Réponse du cache, réponse du modèle et réponse invalide
+        self.assertEqual(metrics.STAGE_SECONDS.count("json_parse"), 3)
+        self.assertEqual(metrics.CACHE_REQUESTS.value("miss"), 1)
+        self.assertEqual(metrics.CACHE_REQUESTS.value("hit"), 1)
+        self.assertEqual(metrics.FALLBACKS.value("partial"), 1)
+        self.assertEqual(metrics.MESSAGES.value("llm"), 3)
+        self.assertEqual(services.get_route_stats()["routes"], {"llm": 3})
+
+        response = await AsyncClient().get("/metrics")
+        self.assertEqual(response["Content-Type"], metrics.CONTENT_TYPE)
+        body = response.content.decode()
+        self.assertIn("# TYPE chatbot_stage_duration_seconds histogram", body)
+        self.assertIn('chatbot_stage_duration_seconds_count{stage="keyword_scan"} 3', body)
+        self.assertIn('chatbot_stage_duration_seconds_bucket{stage="llm_analysis",le="+Inf"} 2', body)
+        self.assertIn('chatbot_completion_cache_requests_total{result="hit"} 1', body)
+        self.assertIn('chatbot_fallbacks_total{kind="partial"} 1', body)
+
+    def test_threads_write_their_own_slots(self):
+        def work():
+            for _ in range(1000):
+                metrics.SCOPE_OVERRIDES.inc()
+                metrics.STAGE_SECONDS.observe(0.003, "stats_write")
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(metrics.SCOPE_OVERRIDES.value(), 8000)
+        body = metrics.render()
+        self.assertIn('chatbot_stage_duration_seconds_bucket{stage="stats_write",le="0.0025"} 0', body)
+        self.assertIn('chatbot_stage_duration_seconds_bucket{stage="stats_write",le="0.005"} 8000', body)
+
+    def test_finished_threads_are_folded_into_a_shared_array(self):
+        shards = len(metrics._shards)
+        for _ in range(50):
+            thread = threading.Thread(target=metrics.SCOPE_OVERRIDES.inc)
+            thread.start()
+            thread.join()
+        # Les tableaux des threads terminés sont libérés, mais leurs valeurs restent comptées
+        self.assertLessEqual(len(metrics._shards), shards + 1)
+        self.assertEqual(metrics.SCOPE_OVERRIDES.value(), 50)
+
+    @override_settings(CHATBOT_METRICS={'ENABLED': False})
+    def test_endpoint_can_be_disabled(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+
+@override_settings(CHATBOT_STATS_BUFFER={'ENABLED': False})
+class ReplayTests(FakeOpenAITestCase):
+    def test_replays_trace_and_reports_per_message_costs(self):
+        path = Path(tempfile.mkdtemp()) / "trace.jsonl"
+        path.write_text("\n".join(json.dumps(entry, ensure_ascii=False) for entry in [
+            {"message": "Je suis stressé au travail", "employee": "a", "conversation": "c"},
+            {"body": "Mon manager me met la pression", "employee": "a", "conversation": "c"},
+            {"message": "Mon collègue m'ignore en réunion"},
+        ]), encoding="utf-8")
+        items = bench_replay.load_trace(path, repeat=2)
+        self.assertEqual(len(items), 6)
+
+        report = bench_replay.replay_in_process(items, rps=100, server=self.server)
+
+        self.assertEqual(report["messages"], 6)
+        self.assertEqual(report["error_rate"], 0)
+        self.assertGreater(report["db_queries_per_message"], 0)
+        self.assertGreater(report["llm_calls_per_message"], 0)
+        # Une conversation par libellé et par passage, les deux tours dans la même
+        self.assertEqual(Conversation.objects.count(), 2)
+        self.assertEqual(Message.objects.count(), 8)
+
+        regressions = bench_replay.compare(report, {**report, "p95_ms": report["p95_ms"] / 2}, tolerance=0.25)
+        self.assertEqual([row[0] for row in regressions if row[3]], ["p95_ms"])
+
+    def test_truncated_output_is_repaired_without_a_fallback_call(self):
+        content = {"response": "Bonjour", "violent_words": ["stress", "menace", "harcèlement", "rage"], "scopeflag": False}
+        # Le serveur coupe la sortie au milieu de la liste des mots violents
+        calls = self.server.request_count
+        with mock.patch.multiple(self.server, json_content=content, invalid_json_rate=1.0):
+            result = services.analyze_message("Je suis stressé au travail", use_cache=False)
+        self.assertEqual(self.server.request_count - calls, 1)
+        self.assertEqual(result["response"], "Bonjour")
+        self.assertNotIn("error", result)
+        self.assertEqual(result["violent_words"], ["stress"])
+
+    def test_fake_server_can_truncate_json_outputs(self):
+        payload = {"response_format": {"type": "json_object"}}
+        with mock.patch.object(self.server, "invalid_json_rate", 1.0):
+            with self.assertRaises(json.JSONDecodeError):
+                json.loads(self.server.completion_content(payload))
+        json.loads(self.server.completion_content(payload))
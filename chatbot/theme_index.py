@@ -0,0 +1,170 @@
+"""
+Index en mémoire des thématiques psychologiques, avec lemmes et synonymes
+
+Le nom et les synonymes de chaque thématique sont découpés en mots normalisés
+(sans casse ni accents) puis réduits à un lemme approché par suppression des
+suffixes flexionnels et dérivationnels courants du français : "harcelé",
+"harceler" et "Harcèlement" donnent tous "harcel". La recherche découpe le message
+de la même façon et cherche dans un dictionnaire, à partir de chaque mot, les suites
+de lemmes de la longueur des expressions qui commencent par ce mot : le coût par mot
+du message est constant, quel que soit le nombre de thématiques et de synonymes. Les
+correspondances se font mot à mot : "dépression" ne déclenche plus "Pression".
+
+L'index est chargé à la première analyse puis réutilisé ; il est invalidé par les
+signaux de PsychologicalTheme (voir signals.py) lorsque les thématiques changent.
+"""
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Set, Tuple
+
+from .keyword_matcher import fold_text
+from .models import PsychologicalTheme
+
+_WORD = re.compile(r'\w+')
+
+# Suffixes retirés (sur le texte normalisé), du plus long au plus court
+SUFFIXES = (
+    "issements", "issement", "ements", "ement", "ations", "ation", "ances", "ance",
+    "antes", "ante", "ants", "ant", "euses", "euse", "eurs", "eur", "eux",
+    "ees", "ee", "es", "er", "ez", "e", "s",
+)
+
+# Longueur minimale du lemme : les mots courts sont conservés tels quels
+MIN_STEM_LENGTH = 4
+
+
+def lemmatize(word: str) -> str:
+    """
+    Lemme approché d'un mot normalisé (voir fold_text)
+
+    Args:
+        word (str): Mot en minuscules et sans accents
+
+    Returns:
+        str: Le mot privé de son suffixe ("harcelement" -> "harcel")
+    """
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM_LENGTH:
+            # "stress" reste "stress" (et non "stres") pour correspondre à "stressé"
+            if suffix == "s" and word.endswith("ss"):
+                return word
+            return word[:-len(suffix)]
+    return word
+
+
+@lru_cache(maxsize=65536)
+def _chunk_lemmas(chunk: str) -> Tuple[str, ...]:
+    """Lemmes d'un fragment du texte entre deux espaces ("l'écart," -> ("l", "ecart"))"""
+    return tuple(lemmatize(word) for word in _WORD.findall(fold_text(chunk)))
+
+
+def lemma_tokens(text: str) -> List[str]:
+    """
+    Lemmes des mots d'un texte, dans l'ordre
+
+    Le texte est découpé sur les espaces et chaque fragment est normalisé une seule
+    fois par processus (cache) : un message ne coûte qu'une recherche par fragment.
+    """
+    tokens = []
+    for chunk in text.split():
+        tokens.extend(_chunk_lemmas(chunk))
+    return tokens
+
+
+def split_synonyms(synonyms: str) -> List[str]:
+    """Synonymes et expressions d'une thématique, séparés par des virgules ou des retours à la ligne"""
+    return [term.strip() for term in re.split(r'[,\n]', synonyms or "") if term.strip()]
+
+
+class ThemeIndex:
+    """
+    Dictionnaire des expressions (suites de lemmes) vers les thématiques
+
+    Args:
+        themes (Iterable[Tuple[int, str, str]]): Triplets (id, nom, synonymes) des thématiques
+    """
+
+    def __init__(self, themes: Iterable[Tuple[int, str, str]]):
+        phrases: Dict[Tuple[str, ...], Set[Tuple[int, str]]] = {}
+        for theme_id, name, synonyms in themes:
+            for term in (name, *split_synonyms(synonyms)):
+                key = tuple(lemma_tokens(term))
+                if key:
+                    phrases.setdefault(key, set()).add((theme_id, name))
+        self._phrases: Dict[Tuple[str, ...], FrozenSet[Tuple[int, str]]] = {
+            key: frozenset(matches) for key, matches in phrases.items()
+        }
+        # Longueurs des expressions commençant par chaque lemme : seuls ces n-grammes sont cherchés
+        lengths: Dict[str, Set[int]] = {}
+        for key in phrases:
+            lengths.setdefault(key[0], set()).add(len(key))
+        self._lengths: Dict[str, Tuple[int, ...]] = {lemma: tuple(sorted(sizes)) for lemma, sizes in lengths.items()}
+
+    def __len__(self) -> int:
+        return len(self._phrases)
+
+    def find(self, text: str) -> List[Tuple[int, str]]:
+        """
+        Thématiques évoquées dans un texte
+
+        Args:
+            text (str): Texte à analyser
+
+        Returns:
+            List[Tuple[int, str]]: Couples (id, nom) triés par id
+        """
+        tokens = lemma_tokens(text)
+        phrases = self._phrases
+        lengths = self._lengths
+        found = set()
+        for start, lemma in enumerate(tokens):
+            sizes = lengths.get(lemma)
+            if sizes is None:
+                continue
+            for size in sizes:
+                matches = phrases.get(tuple(tokens[start:start + size]))
+                if matches:
+                    found |= matches
+        return sorted(found)
+
+
+_theme_index = None
+_theme_index_generation = 0
+
+
+def invalidate_theme_index() -> None:
+    """Force le rechargement de l'index lors de la prochaine analyse"""
+    global _theme_index, _theme_index_generation
+    _theme_index_generation += 1
+    _theme_index = None
+
+
+def _store_theme_index(themes: List[Tuple[int, str, str]], generation: int) -> ThemeIndex:
+    global _theme_index
+    index = ThemeIndex(themes)
+    # Ne pas conserver un index construit avant une invalidation concurrente
+    if generation == _theme_index_generation:
+        _theme_index = index
+    return index
+
+
+def _themes_query():
+    return PsychologicalTheme.objects.order_by('id').values_list('id', 'name', 'synonyms')
+
+
+def get_theme_index() -> ThemeIndex:
+    """Retourne l'index courant, en le chargeant si nécessaire"""
+    index = _theme_index
+    if index is None:
+        generation = _theme_index_generation
+        index = _store_theme_index(list(_themes_query()), generation)
+    return index
+
+
+async def aget_theme_index() -> ThemeIndex:
+    """Version asynchrone de get_theme_index"""
+    index = _theme_index
+    if index is None:
+        generation = _theme_index_generation
+        index = _store_theme_index([theme async for theme in _themes_query()], generation)
+    return index
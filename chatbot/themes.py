@@ -0,0 +1,60 @@
+"""
+Thématiques psychologiques suivies par défaut (avec leurs synonymes, voir theme_index)
+et leur initialisation en base
+"""
+from .models import PsychologicalTheme
+
+DEFAULT_THEMES = [
+    {"name": "Harcèlement", "description": "Comportements répétés visant à dégrader les conditions de travail",
+     "synonyms": "harceleur, harcèlement moral, persécuté, persécution"},
+    {"name": "Dépression", "description": "Trouble mental caractérisé par une tristesse persistante",
+     "synonyms": "déprimé, déprime, dépressif, dépressive, idées noires"},
+    {"name": "Burnout", "description": "Syndrome d'épuisement professionnel",
+     "synonyms": "burn out, épuisement professionnel"},
+    {"name": "Stress", "description": "Réaction du corps face à une pression excessive",
+     "synonyms": "tendu, nerveux"},
+    {"name": "Anxiété", "description": "Sentiment d'inquiétude, de nervosité ou de peur",
+     "synonyms": "anxieux, anxieuse, angoisse, angoissé, inquiet, inquiète"},
+    {"name": "Conflit", "description": "Opposition entre personnes ou groupes dans l'entreprise",
+     "synonyms": "conflictuel, dispute, désaccord, altercation"},
+    {"name": "Discrimination", "description": "Traitement inégal basé sur certains critères",
+     "synonyms": "discriminé, inégalité de traitement"},
+    {"name": "Surcharge", "description": "Excès de travail ou de responsabilités",
+     "synonyms": "débordé, surmenage, trop de travail"},
+    {"name": "Pression", "description": "Contraintes imposées pour atteindre des objectifs",
+     "synonyms": "sous pression, objectifs intenables"},
+    {"name": "Isolement", "description": "Sentiment d'être mis à l'écart dans l'environnement professionnel",
+     "synonyms": "isolé, mis à l'écart, mise à l'écart, exclu"},
+    {"name": "Intimidation", "description": "Comportement visant à faire peur ou à dominer",
+     "synonyms": "intimidé, menace, menacé"},
+    {"name": "Épuisement", "description": "État de fatigue extrême, physique ou émotionnelle",
+     "synonyms": "épuisé, à bout, exténué"},
+    {"name": "Mobbing", "description": "Harcèlement moral collectif",
+     "synonyms": "harcèlement collectif"},
+    {"name": "Violence", "description": "Comportements agressifs ou abusifs",
+     "synonyms": "violent, agression, agressif, frappé"},
+    {"name": "Maltraitance", "description": "Mauvais traitements infligés dans le cadre professionnel",
+     "synonyms": "maltraité, humilié, humiliation"},
+]
+
+
+def initialize_themes() -> int:
+    """
+    Initialise les thématiques psychologiques dans la base de données
+
+    Seules les thématiques absentes sont créées, en une requête ; les thématiques
+    existantes (éventuellement modifiées dans l'admin) sont conservées.
+
+    Returns:
+        int: Nombre de thématiques créées
+    """
+    existing = set(PsychologicalTheme.objects.filter(
+        name__in=[theme["name"] for theme in DEFAULT_THEMES]
+    ).values_list("name", flat=True))
+    missing = [PsychologicalTheme(**theme) for theme in DEFAULT_THEMES if theme["name"] not in existing]
+    if missing:
+        PsychologicalTheme.objects.bulk_create(missing, ignore_conflicts=True)
+        # bulk_create n'envoie pas post_save : invalider l'index comme signals.py
+        from .theme_index import invalidate_theme_index
+        invalidate_theme_index()
+    return len(missing)
@@ -4,5 +4,10 @@ from . import views
 urlpatterns = [
     path('', views.index, name='index'),
     path('chat/', views.chat, name='chat'),
+    path('chat/batch/', views.chat_batch, name='chat_batch'),
+    path('dashboard/', views.organisation_dashboard, name='organisation_dashboard'),
+    path('dashboard.json', views.organisation_dashboard_json, name='organisation_dashboard_json'),
     path('employee/<int:employee_id>/', views.employee_stats, name='employee_stats'),
+    path('employee/<int:employee_id>/stats.json', views.employee_stats_json, name='employee_stats_json'),
+    path('metrics', views.metrics_view, name='metrics'),
 ]
@@ -1,84 +1,141 @@
 """
 Vues Django pour le chatbot de soutien psychologique
 """
+from datetime import date, timedelta
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
+from django.utils import timezone
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from .services import analyze_message
-from .models import Employee, PsychologicalTheme
+from .services import analyze_message_async, stream_message_async
+from . import batch, conversations, dashboard, identity, metrics, rollups
+from .models import Conversation, Employee
 import json
 
-def initialize_themes():
+def index(request):
     """
-    Initialise les thématiques psychologiques dans la base de données
+    Vue pour la page d'accueil du chatbot
+
+    L'employé est celui de la session (voir identity) : il n'est recherché en base
+    qu'à la première visite. Les thématiques par défaut sont créées par la migration
+    0008_default_themes, et non plus au chargement de la page.
     """
-    themes = [
-        {"name": "Harcèlement", "description": "Comportements répétés visant à dégrader les conditions de travail"},
-        {"name": "Dépression", "description": "Trouble mental caractérisé par une tristesse persistante"},
-        {"name": "Burnout", "description": "Syndrome d'épuisement professionnel"},
-        {"name": "Stress", "description": "Réaction du corps face à une pression excessive"},
-        {"name": "Anxiété", "description": "Sentiment d'inquiétude, de nervosité ou de peur"},
-        {"name": "Conflit", "description": "Opposition entre personnes ou groupes dans l'entreprise"},
-        {"name": "Discrimination", "description": "Traitement inégal basé sur certains critères"},
-        {"name": "Surcharge", "description": "Excès de travail ou de responsabilités"},
-        {"name": "Pression", "description": "Contraintes imposées pour atteindre des objectifs"},
-        {"name": "Isolement", "description": "Sentiment d'être mis à l'écart dans l'environnement professionnel"},
-        {"name": "Intimidation", "description": "Comportement visant à faire peur ou à dominer"},
-        {"name": "Épuisement", "description": "État de fatigue extrême, physique ou émotionnelle"},
-        {"name": "Mobbing", "description": "Harcèlement moral collectif"},
-        {"name": "Violence", "description": "Comportements agressifs ou abusifs"},
-        {"name": "Maltraitance", "description": "Mauvais traitements infligés dans le cadre professionnel"},
-    ]
-    
-    for theme_data in themes:
-        PsychologicalTheme.objects.get_or_create(
-            name=theme_data["name"],
-            defaults={"description": theme_data["description"]}
-        )
+    return render(request, 'chat.html', {'employee_id': identity.session_employee_id(request)})
 
-def index(request):
-    """Vue pour la page d'accueil du chatbot"""
-    # Initialiser les thématiques si nécessaire
-    if PsychologicalTheme.objects.count() == 0:
-        initialize_themes()
-    
-    # Récupérer ou créer un employé pour la démonstration
-    # Dans une application réelle, vous utiliseriez l'authentification
-    employee, created = Employee.objects.get_or_create(
-        first_name="Utilisateur",
-        last_name="Test",
-        defaults={
-            'birth_date': '1990-01-01'
-        }
-    )
-    
-    return render(request, 'chat.html', {'employee_id': employee.id})
+async def _sse_events(message, employee_id, use_cache, conversation_id):
+    """Convertit les événements de stream_message_async au format Server-Sent Events"""
+    try:
+        async for event, data in stream_message_async(message, employee_id, use_cache, conversation_id):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    except Exception as e:
+        yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
 
 @csrf_exempt
-def chat(request):
+async def chat(request):
     """
     API pour le traitement des messages du chatbot
     
+    Vue asynchrone : servie par wellbeing_chatbot.asgi, elle libère la boucle
+    d'événements pendant l'appel à OpenAI au lieu de bloquer un worker.
+    
     Cette vue est exemptée de la protection CSRF pour permettre les requêtes AJAX
     depuis le frontend. Dans un environnement de production, il faudrait implémenter
     une meilleure gestion de la sécurité.
+    
+    L'employé est celui de la session ouverte par la page d'accueil (voir identity) ;
+    le paramètre employee_id n'est utilisé que par les clients sans session, et une
+    requête dont l'employee_id diffère de celui de la session est refusée (403).
+    
+    Le paramètre cache=0 contourne le cache de complétions pour ce message.
+    
+    Avec le paramètre conversation_id ("new" pour en démarrer une, puis l'ID
+    renvoyé dans la réponse), les échanges précédents sont transmis au modèle
+    dans la limite du budget de tokens (voir conversations). Seul l'employé qui a
+    démarré une conversation peut la reprendre.
+    
+    Avec le paramètre stream=1, la réponse est diffusée en Server-Sent Events :
+    des événements "token" au fil de la génération, puis un événement "done"
+    contenant violent_words et scopeflag.
     """
     if request.method == 'POST':
         try:
             message = request.POST.get('message', '')
-            employee_id = request.POST.get('employee_id')
+            use_cache = request.POST.get('cache') != '0'
+            posted_id = request.POST.get('employee_id')
+            posted_id = int(posted_id) if posted_id and posted_id.isdigit() else None
+            employee_id = await identity.asession_employee_id(request)
+            if employee_id is None:
+                employee_id = posted_id
+            elif posted_id is not None and posted_id != employee_id:
+                return JsonResponse({"error": "employee_id does not match the session employee"}, status=403)
+            
+            try:
+                conversation_id = await sync_to_async(conversations.resolve_conversation)(
+                    request.POST.get('conversation_id'), employee_id
+                )
+            except ValueError as e:
+                return JsonResponse({"error": str(e)}, status=400)
+            except Conversation.DoesNotExist as e:
+                return JsonResponse({"error": str(e)}, status=404)
+            
+            if request.POST.get('stream') == '1':
+                response = StreamingHttpResponse(
+                    _sse_events(message, employee_id, use_cache, conversation_id),
+                    content_type='text/event-stream'
+                )
+                response['Cache-Control'] = 'no-cache'
+                response['X-Accel-Buffering'] = 'no'
+                return response
             
             # Analyser le message avec l'ID de l'employé si disponible
-            if employee_id and employee_id.isdigit():
-                analysis = analyze_message(message, int(employee_id))
-            else:
-                analysis = analyze_message(message)
+            analysis = await analyze_message_async(
+                message, employee_id, use_cache=use_cache, conversation_id=conversation_id
+            )
             
             return JsonResponse(analysis)
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=500)
     return JsonResponse({"error": "Method not allowed"}, status=405)
 
+@csrf_exempt
+async def chat_batch(request):
+    """
+    API d'analyse par lots (re-calcul des scores des conversations historiques)
+
+    Le corps de la requête est au format JSONL : un objet par ligne avec "message"
+    (ou "body"), et optionnellement "employee_id" et "id". La réponse, en JSONL
+    également, est diffusée tranche par tranche dans l'ordre des lignes.
+
+    Le paramètre d'URL cache=0 contourne le cache de complétions. Avec stats=1, les
+    statistiques des messages sont ajoutées aux compteurs des employés à la fin de
+    chaque tranche (à ne pas utiliser pour ré-analyser des messages déjà comptés).
+    """
+    if request.method != 'POST':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    config = batch.get_config()
+    try:
+        lines = request.body.decode('utf-8').splitlines()
+    except UnicodeDecodeError:
+        return JsonResponse({"error": "Request body must be UTF-8 encoded JSONL"}, status=400)
+    if sum(1 for line in lines if line.strip()) > config['MAX_ITEMS']:
+        return JsonResponse({"error": f"Too many messages (maximum {config['MAX_ITEMS']})"}, status=413)
+
+    analyzer = batch.BatchAnalyzer.from_settings(
+        use_cache=request.GET.get('cache') != '0',
+        write_stats=request.GET.get('stats') == '1'
+    )
+
+    async def results():
+        try:
+            async for entries, consumed in batch.analyze_lines(lines, analyzer, config['CHUNK_SIZE']):
+                for entry in entries:
+                    yield json.dumps(entry) + "\n"
+        except Exception as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+
+    return StreamingHttpResponse(results(), content_type='application/x-ndjson')
+
 def employee_stats(request, employee_id):
     """Vue pour afficher les statistiques d'un employé"""
     employee = get_object_or_404(Employee, id=employee_id)
@@ -89,11 +146,87 @@ def employee_stats(request, employee_id):
     # Récupérer les compteurs de thématiques
     theme_counters = employee.theme_counters.select_related('theme').all()
     
+    # Tendance des huit dernières semaines, lue dans les agrégats
+    today = timezone.localdate()
+    weekly_trend = rollups.get_employee_trends(employee.id, 'week', today - timedelta(weeks=7), today)['series']
+    
     context = {
         'employee': employee,
         'violent_words_ratio': employee.violent_words_ratio * 100,  # Convert to percentage
         'recent_violent_words': recent_violent_words,
         'theme_counters': theme_counters,
+        'weekly_trend': weekly_trend,
     }
     
     return render(request, 'employee_stats.html', context)
+
+def _dashboard_range(request, default_period):
+    """Période et intervalle demandés (les 12 dernières semaines par défaut)"""
+    end = date.fromisoformat(request.GET['end']) if request.GET.get('end') else timezone.localdate()
+    start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else end - timedelta(weeks=12)
+    return request.GET.get('period', default_period), start, end
+
+def organisation_dashboard(request):
+    """Vue du tableau de bord de l'organisation (thématiques et mots violents, tous employés confondus)"""
+    try:
+        data = dashboard.get_dashboard(*_dashboard_range(request, 'week'))
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    
+    # Intensité de chaque case de la carte, relative au maximum de la période
+    highest = max((count for theme in data['heatmap']['themes'] for count in theme['counts']), default=0)
+    heatmap_rows = [
+        {
+            'name': theme['name'],
+            'cells': [{'count': count, 'intensity': round(count / highest, 2) if highest else 0} for count in theme['counts']]
+        }
+        for theme in data['heatmap']['themes']
+    ]
+    
+    context = {
+        'dashboard': data,
+        'violent_words_ratio': data['employees']['violent_words_ratio'] * 100,  # Convert to percentage
+        'heatmap_rows': heatmap_rows,
+    }
+    
+    return render(request, 'dashboard.html', context)
+
+def organisation_dashboard_json(request):
+    """
+    API du tableau de bord de l'organisation
+
+    Paramètres d'URL : period (day ou week, week par défaut), start et end (dates
+    ISO, les 12 dernières semaines par défaut).
+    """
+    try:
+        return JsonResponse(dashboard.get_dashboard(*_dashboard_range(request, 'week')))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+def employee_stats_json(request, employee_id):
+    """
+    API des tendances d'un employé, servies depuis les agrégats quotidiens et hebdomadaires
+
+    Paramètres d'URL : period (day ou week, day par défaut), start et end (dates
+    ISO, les 30 derniers jours par défaut).
+    """
+    if not Employee.objects.filter(id=employee_id).exists():
+        return JsonResponse({"error": "Employee not found"}, status=404)
+
+    try:
+        end = date.fromisoformat(request.GET['end']) if request.GET.get('end') else timezone.localdate()
+        start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else end - timedelta(days=29)
+        trends = rollups.get_employee_trends(employee_id, request.GET.get('period', 'day'), start, end)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    
+    return JsonResponse(trends)
+
+def metrics_view(request):
+    """
+    Métriques du processus au format texte Prometheus (latence par étape, replis,
+    cache, corrections du scopeflag, mots violents)
+    """
+    if not metrics.get_config()['ENABLED']:
+        raise Http404("Metrics are disabled")
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
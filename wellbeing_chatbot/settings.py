@@ -75,14 +75,179 @@ WSGI_APPLICATION = 'wellbeing_chatbot.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Profil SQLite de production, pour les écritures concurrentes de /chat/, appliqué
+# avec la variable d'environnement CHATBOT_DB_PROFILE=production :
+# - journal WAL : les lectures ne bloquent plus les écritures (et inversement) ;
+# - synchronous=NORMAL : sans risque de corruption en WAL, une synchronisation
+#   disque par point de contrôle plutôt que par transaction ;
+# - timeout : attente (secondes) d'un verrou avant l'erreur "database is locked" ;
+# - transactions IMMEDIATE : le verrou d'écriture est pris dès le début de
+#   transaction.atomic (écriture des statistiques). En mode DEFERRED, une
+#   transaction qui passe de la lecture à l'écriture échoue aussitôt, sans
+#   attendre le timeout, si une autre écriture est en cours.
+# Les connexions ne sont pas conservées entre les requêtes (CONN_MAX_AGE = 0) : les
+# vues asynchrones servies en ASGI exécutent l'ORM dans des threads qui ne ferment pas
+# leurs connexions persistantes. Ouvrir une connexion SQLite reste peu coûteux, et le
+# mode WAL est enregistré dans le fichier de la base.
+CHATBOT_SQLITE_PRODUCTION = {
+    'OPTIONS': {
+        'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': 20,
+    },
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 0,
+        **(CHATBOT_SQLITE_PRODUCTION if os.environ.get('CHATBOT_DB_PROFILE') == 'production' else {}),
     }
 }
 
 
+# Identité de l'employé conservée dans la session (voir chatbot/identity.py), en base avec
+# le moteur de session par défaut : le cookie ne porte que la clé de session, l'ID de
+# l'employé ne peut donc pas être modifié par le navigateur. Sans authentification,
+# chaque nouvelle session reçoit l'employé de démonstration.
+
+CHATBOT_IDENTITY = {
+    'DEMO_EMPLOYEE': {'first_name': 'Utilisateur', 'last_name': 'Test', 'birth_date': '1990-01-01'},
+}
+
+# Mémoire des conversations (voir chatbot/conversations.py) : taille maximale,
+# en tokens estimés, de l'historique envoyé au modèle (résumé compris), du résumé,
+# et des messages sortis de l'historique déclenchant la mise à jour du résumé
+
+CHATBOT_CONVERSATION = {
+    'TOKEN_BUDGET': 1200,
+    'SUMMARY_MAX_TOKENS': 250,
+    'SUMMARY_TRIGGER_TOKENS': 300,
+    'MAX_MESSAGES': 200,
+}
+
+
+# Écriture différée des statistiques des employés (voir chatbot/stats_buffer.py), désactivée
+# par défaut : en écriture différée, l'existence de l'employé n'est pas vérifiée et les
+# statistiques d'un employé inconnu sont ignorées lors de l'écriture en arrière-plan
+
+CHATBOT_STATS_BUFFER = {
+    'ENABLED': False,
+    'MAX_PENDING': 200,
+    'FLUSH_INTERVAL': 2.0,
+    'MAX_FAILURES': 3,
+    'TRIGGER_FILE': BASE_DIR / '.stats_flush',
+}
+
+# Cache des complétions OpenAI pour les messages fréquents (voir chatbot/completion_cache.py)
+
+CHATBOT_COMPLETION_CACHE = {
+    'BACKEND': 'chatbot.completion_cache.MemoryCompletionCache',
+    'OPTIONS': {
+        'max_entries': 1000,
+        'ttl': 3600,
+    },
+}
+
+# Réponses locales aux messages triviaux et aux sujets sensibles évidents (voir
+# chatbot.services.classify_locally). Les mots violents des sujets sensibles restent extraits
+# par le backend d'analyse : avec OpenAIAnalysisBackend, un appel court au modèle (mots
+# violents seuls) remplace l'appel combiné.
+
+CHATBOT_FAST_PATH = {
+    'ENABLED': True,
+    'ROUTE_SENSITIVE': True,
+    'MAX_WORDS': 12,
+}
+
+# Extraction des mots violents et du scopeflag (voir chatbot/analysis_backends.py).
+# Pour une analyse hors ligne, entraîner un modèle avec train_analysis_model puis utiliser :
+#     'BACKEND': 'chatbot.analysis_backends.LexiconAnalysisBackend',
+#     'OPTIONS': {'path': BASE_DIR / 'analysis_model.json'},
+
+CHATBOT_ANALYSIS_BACKEND = {
+    'BACKEND': 'chatbot.analysis_backends.OpenAIAnalysisBackend',
+    'OPTIONS': {},
+    'LOG': None,
+}
+
+# Version des prompts envoyés au modèle (voir chatbot/prompts.py). Comparer les versions
+# avec benchmarks/eval_prompts.py --live avant d'en changer.
+
+CHATBOT_PROMPTS = {
+    'VERSION': 'v1',
+}
+
+# Passerelle d'accès au modèle (voir chatbot/llm.py) : réessais, disjoncteur qui bascule
+# sur les réponses modèles locales, limitation de débit (RATE_LIMIT en appels par seconde,
+# None pour ne pas limiter) et regroupement des appels identiques simultanés
+
+CHATBOT_LLM_GATEWAY = {
+    'MAX_RETRIES': 2,
+    'RETRY_BASE_DELAY': 0.5,
+    'RETRY_MAX_DELAY': 8.0,
+    'FAILURE_THRESHOLD': 5,
+    'RESET_TIMEOUT': 30.0,
+    'RATE_LIMIT': None,
+    'RATE_BURST': 20,
+    'MAX_RATE_WAIT': 5.0,
+    'COALESCE': True,
+}
+
+# Échéances du pipeline asynchrone (secondes, voir chatbot.services.get_pipeline_config)
+
+CHATBOT_PIPELINE = {
+    'HEDGE_DELAY': 2.0,
+    'REPLY_TIMEOUT': 15.0,
+    'ANALYSIS_TIMEOUT': 15.0,
+}
+
+# Rétention des mots violents (voir chatbot/retention.py et la commande archive_violent_words) :
+# les occurrences plus anciennes sont exportées en JSONL compressé par jour puis supprimées
+
+CHATBOT_RETENTION = {
+    'VIOLENT_WORDS_DAYS': 365,
+    'ARCHIVE_DIR': BASE_DIR / 'archives' / 'violent_words',
+    'BATCH_SIZE': 5000,
+}
+
+# Entrepôt analytique pseudonymisé (voir chatbot/analytics.py et la commande export_analytics) :
+# colonnes en ajout seul, partitionnées par jour, lues par les analyses RH à la place des tables.
+# Lancer l'export avant archive_violent_words. La clé des pseudonymes est obligatoire (variable
+# d'environnement CHATBOT_PSEUDONYM_KEY) ; en changer impose de reconstruire l'entrepôt.
+
+CHATBOT_ANALYTICS = {
+    'DIR': BASE_DIR / 'analytics',
+    'PSEUDONYM_KEY': os.environ.get('CHATBOT_PSEUDONYM_KEY'),
+    'BATCH_SIZE': 50000,
+}
+
+# Tableau de bord de l'organisation (voir chatbot/dashboard.py). Le cache par défaut est
+# propre à chaque processus : avec plusieurs workers, configurer un cache partagé (CACHES).
+
+CHATBOT_DASHBOARD = {
+    'CACHE_TIMEOUT': 300,
+}
+
+# Analyse par lots : /chat/batch/ et commande analyze_messages (voir chatbot/batch.py)
+
+CHATBOT_BATCH = {
+    'CONCURRENCY': 8,
+    'MAX_RETRIES': 4,
+    'RETRY_BASE_DELAY': 1.0,
+    'CHUNK_SIZE': 200,
+    'MAX_ITEMS': 1000,
+}
+
+# Métriques Prometheus exposées sur /metrics (voir chatbot/metrics.py). Les valeurs sont
+# propres à chaque processus : avec plusieurs workers, interroger chacun d'eux.
+
+CHATBOT_METRICS = {
+    'ENABLED': True,
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 